@@ -0,0 +1,49 @@
+import banco
+import movimentacoes
+from exportacao import ExportadorPlanilha
+
+# Acesso aos dados pelas telas
+# As telas chamam sempre as mesmas operações, num objeto de acesso escolhido ao abrir o aplicativo:
+# AcessoLocal (este módulo) usa o banco deste computador; cliente.ClienteEstoque usa o serviço de
+# estoque (servico.py) de outra estação. Os dois têm os mesmos métodos e devolvem os mesmos tipos
+# (banco.Insumo, banco.Movimentacao, ...).
+
+class AcessoLocal:
+    remoto = False
+    descricao = "banco local"
+
+    def __init__(self):
+        # Exportação da planilha em segundo plano, agrupando alterações seguidas numa única gravação
+        self.exportador = ExportadorPlanilha()
+
+    # Fontes paginadas da tela de monitoramento
+    FonteInsumos = banco.FonteInsumos
+    FonteBuscaInsumos = banco.FonteBuscaInsumos
+
+    listar_codigos_nomes = staticmethod(banco.listar_codigos_nomes)
+    obter_insumo = staticmethod(banco.obter_insumo)
+    inserir_insumo = staticmethod(banco.inserir_insumo)
+    atualizar_insumo = staticmethod(banco.atualizar_insumo)
+    excluir_insumo = staticmethod(banco.excluir_insumo)
+    listar_historico = staticmethod(banco.listar_historico)
+    buscar_alertas_validade = staticmethod(banco.buscar_alertas_validade)
+    listar_estoque_baixo = staticmethod(banco.listar_estoque_baixo)
+    listar_lotes = staticmethod(banco.listar_lotes)
+    listar_previsao_reposicao = staticmethod(banco.listar_previsao_reposicao)
+    aplicar_movimentacoes = staticmethod(movimentacoes.aplicar_movimentacoes)
+    listar_codigos_barras = staticmethod(banco.listar_codigos_barras)
+    associar_codigo_barras = staticmethod(banco.associar_codigo_barras)
+
+    @staticmethod
+    def atualizar_previsao():
+        import previsao  # pandas só quando a previsão é calculada
+        return previsao.atualizar_previsao()
+
+    # Chamado após cada alteração feita pelas telas
+    def agendar_exportacao(self):
+        self.exportador.agendar()
+
+    # Ao fechar o aplicativo: garante que a última alteração chegue à planilha
+    def encerrar(self):
+        self.exportador.descarregar()
+        banco.fechar_conexao()
@@ -0,0 +1,154 @@
+import sqlite3
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import banco
+from instrumentacao import medido
+
+# Arquivamento do histórico e manutenção do banco
+# As movimentações anteriores a um corte (por padrão, os últimos 24 meses ficam no banco
+# principal) vão para o banco de arquivo ao lado do principal (banco.caminho_arquivo), em lotes:
+# cada lote é copiado numa transação e excluído do principal em outra, sem segurar o banco por
+# muito tempo. As consultas do histórico (banco.listar_historico, relatórios, exportações) leem
+# o arquivo só quando o período pedido chega antes do corte.
+#
+# O consumo diário (consumo_diario) continua com os dias arquivados: o gatilho de exclusão não
+# desconta as movimentações removidas pelo arquivamento (banco.criar_arquivamento).
+#
+# A manutenção completa (arquivar, ANALYZE, VACUUM) é feita por "python main.py manutencao",
+# para o agendador do sistema rodar de madrugada. A interface faz a manutenção leve (arquivar e
+# ANALYZE, sem VACUUM) em segundo plano ao abrir, se a última tiver mais de uma semana.
+
+MESES_HISTORICO_ATIVO = 24
+TAMANHO_LOTE_ARQUIVAMENTO = 5000
+INTERVALO_MANUTENCAO = timedelta(days=7)
+# VACUUM só compensa quando boa parte do arquivo é espaço livre (páginas da freelist)
+PROPORCAO_LIVRE_VACUUM = 0.2
+
+# Resultado da manutenção: linhas arquivadas e o que foi feito (lista de textos)
+ResultadoManutencao = namedtuple("ResultadoManutencao", "arquivadas etapas")
+
+# Primeiro dia do mês, `meses` meses antes de hoje (movimentações antes dele são arquivadas)
+def data_corte(meses=MESES_HISTORICO_ATIVO, hoje=None):
+    hoje = hoje or datetime.now().date()
+    mes = hoje.year * 12 + hoje.month - 1 - meses
+    return f"{mes // 12:04d}-{mes % 12 + 1:02d}-01"
+
+# Função para arquivar as movimentações anteriores a `antes_de` (data ISO), em lotes
+# progresso(arquivadas) e cancelado (threading.Event) são opcionais
+# Retorna quantas movimentações foram arquivadas
+@medido("Manutenção", "arquivamento do histórico")
+def arquivar_historico(antes_de, tamanho_lote=TAMANHO_LOTE_ARQUIVAMENTO, progresso=None, cancelado=None, conexao=None):
+    conexao = conexao or banco.obter_conexao()
+    pendente = conexao.execute("SELECT 1 FROM historico WHERE data < ? LIMIT 1", (antes_de,)).fetchone()
+    if pendente is None:
+        return 0
+    banco.anexar_arquivo(conexao, criar=True)
+
+    arquivadas = 0
+    while cancelado is None or not cancelado.is_set():
+        # Fim do lote: a tamanho_lote-ésima movimentação mais antiga antes do corte
+        fim = conexao.execute('''
+            SELECT data, id FROM (
+                SELECT data, id FROM main.historico WHERE data < ? ORDER BY data, id LIMIT ?
+            ) ORDER BY data DESC, id DESC LIMIT 1
+        ''', (antes_de, tamanho_lote)).fetchone()
+        if fim is None:
+            break
+
+        # 1) Cópia: repetir um lote já copiado não duplica nada (mesmo id)
+        with banco.transacao(conexao):
+            conexao.execute('''
+                INSERT OR IGNORE INTO arquivo.historico (id, insumo_codigo, tipo, quantidade, data, lote)
+                SELECT id, insumo_codigo, tipo, quantidade, data, lote FROM main.historico
+                WHERE (data, id) <= (?, ?) AND data < ?
+            ''', (*fim, antes_de))
+
+        # 2) Exclusão e marca, juntas no banco principal
+        with banco.transacao(conexao):
+            conexao.execute("INSERT INTO historico_arquivando (ativo) VALUES (1)")
+            excluidas = conexao.execute(
+                "DELETE FROM main.historico WHERE (data, id) <= (?, ?) AND data < ?", (*fim, antes_de)).rowcount
+            conexao.execute("DELETE FROM historico_arquivando")
+            conexao.execute('''
+                INSERT INTO historico_arquivado (id, ate_data, ate_id, linhas, arquivado_em) VALUES (1, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    ate_data = MAX(ate_data, excluded.ate_data),
+                    ate_id = CASE WHEN (excluded.ate_data, excluded.ate_id) > (ate_data, ate_id)
+                                  THEN excluded.ate_id ELSE ate_id END,
+                    linhas = linhas + excluded.linhas,
+                    arquivado_em = excluded.arquivado_em
+            ''', (*fim, excluidas, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+        arquivadas += excluidas
+        if progresso is not None:
+            progresso(arquivadas)
+    return arquivadas
+
+# Proporção do arquivo ocupada por páginas livres (dados excluídos ainda não devolvidos ao disco)
+def proporcao_livre(conexao, banco_nome="main"):
+    paginas = conexao.execute(f"PRAGMA {banco_nome}.page_count").fetchone()[0]
+    livres = conexao.execute(f"PRAGMA {banco_nome}.freelist_count").fetchone()[0]
+    return livres / paginas if paginas else 0
+
+def _registrar(conexao, tarefa):
+    conexao.execute('''
+        INSERT INTO manutencao (tarefa, executada_em) VALUES (?, ?)
+        ON CONFLICT (tarefa) DO UPDATE SET executada_em = excluded.executada_em
+    ''', (tarefa, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+def ultima_manutencao(tarefa="manutencao", conexao=None):
+    linhas = banco.consultar("SELECT executada_em FROM manutencao WHERE tarefa = ?", (tarefa,), conexao=conexao)
+    return datetime.fromisoformat(linhas[0][0]) if linhas else None
+
+# VACUUM de um dos bancos; False se outra conexão estiver usando o banco
+# Sem INTEGER PRIMARY KEY, os rowids dos insumos podem mudar: o índice de busca textual é
+# reconstruído e a versão da lista de itens muda (os clientes do serviço baixam a lista de novo)
+def _vacuum(conexao, banco_nome):
+    try:
+        conexao.execute(f"VACUUM {banco_nome}")
+    except sqlite3.OperationalError as e:
+        print(f"VACUUM de {banco_nome} adiado: {e}")
+        return False
+    if banco_nome == "main":
+        with banco.transacao(conexao):
+            banco.reconstruir_busca_textual(conexao)
+            conexao.execute("UPDATE versao_dados SET versao = versao + 1 WHERE tabela = 'insumos'")
+    conexao.execute(f"PRAGMA {banco_nome}.wal_checkpoint(TRUNCATE)")
+    return True
+
+# Função para a manutenção do banco
+# meses: histórico mantido no banco principal (None = não arquivar)
+# vacuum: "auto" só quando vale a pena (PROPORCAO_LIVRE_VACUUM), True sempre, False nunca
+@medido("Manutenção")
+def manutencao(meses=MESES_HISTORICO_ATIVO, vacuum="auto", conexao=None):
+    conexao = conexao or banco.obter_conexao()
+    etapas = []
+    arquivadas = 0
+    if meses is not None:
+        corte = data_corte(meses)
+        arquivadas = arquivar_historico(corte, conexao=conexao)
+        etapas.append(f"{arquivadas} movimentações anteriores a {corte} arquivadas")
+
+    conexao.execute("ANALYZE")
+    conexao.execute("PRAGMA optimize")
+    etapas.append("estatísticas atualizadas (ANALYZE)")
+
+    bancos = ["main"] + (["arquivo"] if banco.anexar_arquivo(conexao) else [])
+    for banco_nome in bancos:
+        livre = proporcao_livre(conexao, banco_nome)
+        if vacuum is True or (vacuum == "auto" and livre >= PROPORCAO_LIVRE_VACUUM):
+            if _vacuum(conexao, banco_nome):
+                etapas.append(f"VACUUM de {banco_nome} ({livre:.0%} livre)")
+
+    with banco.transacao(conexao):
+        _registrar(conexao, "manutencao")
+    return ResultadoManutencao(arquivadas, etapas)
+
+# Manutenção leve para a interface: arquivar e ANALYZE, no máximo uma vez por INTERVALO_MANUTENCAO
+# (sem VACUUM, que troca os rowids dos itens com as telas abertas). Retorna None se não precisou.
+def manutencao_periodica(conexao=None):
+    ultima = ultima_manutencao(conexao=conexao)
+    if ultima is not None and datetime.now() - ultima < INTERVALO_MANUTENCAO:
+        return None
+    return manutencao(vacuum=False, conexao=conexao)
@@ -0,0 +1,292 @@
+import bisect
+import difflib
+import re
+import threading
+import unicodedata
+from functools import wraps
+
+import tkinter as tk
+import ttkbootstrap as ttk
+
+# Seletor de insumo com autocompletar
+# O índice fica em memória: listas ordenadas de códigos e de palavras do nome (minúsculas e sem
+# acentos), consultadas por busca binária a cada tecla. Cada item alterado entra ou sai do
+# índice individualmente (adicionar/remover/sincronizar), sem reconstruir a lista inteira.
+# Se nenhuma palavra começa com o que foi digitado, procura palavras parecidas (erros de digitação).
+
+LIMITE_SUGESTOES = 50
+SEMELHANCA_MINIMA = 0.75  # difflib: 0 a 1
+
+# Função para dobrar um texto para comparação: minúsculo e sem acentos
+def dobrar(texto):
+    texto = (texto or "").lower()
+    if texto.isascii():
+        return texto
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(letra for letra in texto if not unicodedata.combining(letra))
+
+def palavras(texto_dobrado):
+    return re.findall(r"\w+", texto_dobrado)
+
+# Acima deste número de itens alterados de uma vez, as listas são reordenadas inteiras
+# (uma ordenação só sai mais barata que milhares de inserções ordenadas)
+LIMITE_ALTERACOES_INDIVIDUAIS = 500
+
+# Métodos que leem ou alteram as listas rodam sob a trava do índice: a sincronização pode ser
+# feita numa thread de trabalho enquanto a interface consulta
+def _com_trava(metodo):
+    @wraps(metodo)
+    def travado(self, *args, **kwargs):
+        with self._trava:
+            return metodo(self, *args, **kwargs)
+    return travado
+
+class IndiceInsumos:
+    def __init__(self, pares=()):
+        self._trava = threading.RLock()
+        self._itens = {}  # codigo -> (nome, palavras do nome, " palavra1 palavra2 ...", nome dobrado)
+        self._codigos = []  # (codigo dobrado, codigo), ordenada
+        self._palavras = []  # (palavra, nome dobrado, codigo), ordenada
+        self._vocabulario = {}  # palavra -> número de itens que a usam
+        self._termos = []  # palavras distintas, ordenada (para a busca aproximada)
+        self.sincronizar(pares)
+
+    def __len__(self):
+        return len(self._itens)
+
+    def __contains__(self, codigo):
+        return codigo in self._itens
+
+    def nome(self, codigo):
+        item = self._itens.get(codigo)
+        return item[0] if item else None
+
+    @staticmethod
+    def _item(nome):
+        nome_dobrado = dobrar(nome)
+        termos = tuple(dict.fromkeys(palavras(nome_dobrado)))
+        return nome, termos, " " + " ".join(termos), nome_dobrado
+
+    @staticmethod
+    def _chaves(codigo, item):
+        _, termos, _, nome_dobrado = item
+        return [(termo, nome_dobrado, codigo) for termo in termos]
+
+    @_com_trava
+    def adicionar(self, codigo, nome):
+        if codigo is None:
+            return  # itens sem código não podem ser movimentados
+        if codigo in self._itens:
+            if self._itens[codigo][0] == nome:
+                return
+            self.remover(codigo)
+        self._itens[codigo] = self._item(nome)
+        termos = self._itens[codigo][1]
+        bisect.insort(self._codigos, (dobrar(codigo), codigo))
+        for chave in self._chaves(codigo, self._itens[codigo]):
+            bisect.insort(self._palavras, chave)
+        for termo in termos:
+            if termo not in self._vocabulario:
+                bisect.insort(self._termos, termo)
+            self._vocabulario[termo] = self._vocabulario.get(termo, 0) + 1
+
+    @_com_trava
+    def remover(self, codigo):
+        item = self._itens.pop(codigo, None)
+        if item is None:
+            return
+        termos = item[1]
+        self._remover_chave(self._codigos, (dobrar(codigo), codigo))
+        for chave in self._chaves(codigo, item):
+            self._remover_chave(self._palavras, chave)
+        for termo in termos:
+            self._vocabulario[termo] -= 1
+            if not self._vocabulario[termo]:
+                del self._vocabulario[termo]
+                self._remover_chave(self._termos, termo)
+
+    @staticmethod
+    def _remover_chave(lista, chave):
+        posicao = bisect.bisect_left(lista, chave)
+        if posicao < len(lista) and lista[posicao] == chave:
+            del lista[posicao]
+
+    # Reconstrói as listas ordenadas a partir de self._itens (carga inicial, muitas alterações)
+    def _reordenar(self):
+        self._codigos = sorted((dobrar(codigo), codigo) for codigo in self._itens)
+        self._palavras = sorted(chave for codigo, item in self._itens.items() for chave in self._chaves(codigo, item))
+        self._vocabulario = {}
+        for item in self._itens.values():
+            for termo in item[1]:
+                self._vocabulario[termo] = self._vocabulario.get(termo, 0) + 1
+        self._termos = sorted(self._vocabulario)
+
+    # Função para alinhar o índice com a lista atual de (codigo, nome): só as diferenças são aplicadas
+    # Retorna quantos itens mudaram
+    @_com_trava
+    def sincronizar(self, pares):
+        atuais = {codigo: nome for codigo, nome in pares if codigo is not None}
+        removidos = [codigo for codigo in self._itens if codigo not in atuais]
+        alterados = [(codigo, nome) for codigo, nome in atuais.items() if self.nome(codigo) != nome]
+        if len(removidos) + len(alterados) <= LIMITE_ALTERACOES_INDIVIDUAIS:
+            for codigo in removidos:
+                self.remover(codigo)
+            for codigo, nome in alterados:
+                self.adicionar(codigo, nome)
+        else:
+            for codigo in removidos:
+                del self._itens[codigo]
+            for codigo, nome in alterados:
+                self._itens[codigo] = self._item(nome)
+            self._reordenar()
+        return len(removidos) + len(alterados)
+
+    @staticmethod
+    def _limites(lista, prefixo):
+        inicio = bisect.bisect_left(lista, (prefixo,))
+        return inicio, bisect.bisect_left(lista, (prefixo + "\uffff",), inicio)
+
+    # Cada palavra digitada é início de alguma palavra do nome (" " + busca dentro do texto do item)
+    def _atende(self, codigo, prefixos):
+        texto = self._itens[codigo][2]
+        for prefixo in prefixos:
+            if prefixo not in texto:
+                return False
+        return True
+
+    # Função para buscar os itens que correspondem ao texto digitado
+    # Primeiro os códigos que começam com o texto; depois os itens em que cada palavra digitada é
+    # início de alguma palavra do nome; sem nenhum, corrige as palavras digitadas pelas mais
+    # parecidas do vocabulário e busca de novo. Retorna até `limite` pares (codigo, nome).
+    @_com_trava
+    def buscar(self, texto, limite=LIMITE_SUGESTOES):
+        texto_dobrado = dobrar(texto).strip()
+        if not texto_dobrado:
+            return self._pares(codigo for _, codigo in self._codigos[:limite])
+
+        encontrados = {}
+        inicio, fim = self._limites(self._codigos, texto_dobrado)
+        for _, codigo in self._codigos[inicio:min(fim, inicio + limite)]:
+            encontrados[codigo] = None
+
+        termos_busca = palavras(texto_dobrado)
+        if termos_busca and len(encontrados) < limite:
+            self._buscar_palavras(termos_busca, encontrados, limite)
+            if not encontrados:
+                corrigidos = self._corrigir(termos_busca)
+                if corrigidos:
+                    self._buscar_palavras(corrigidos, encontrados, limite)
+        return self._pares(encontrados)
+
+    # Percorre a faixa da palavra digitada com menos itens, conferindo as demais em cada item
+    def _buscar_palavras(self, termos_busca, encontrados, limite):
+        inicio, fim = min((self._limites(self._palavras, termo) for termo in termos_busca),
+                          key=lambda faixa: faixa[1] - faixa[0])
+        prefixos = [" " + termo for termo in termos_busca]
+        for posicao in range(inicio, fim):
+            codigo = self._palavras[posicao][2]
+            if codigo not in encontrados and self._atende(codigo, prefixos):
+                encontrados[codigo] = None
+                if len(encontrados) >= limite:
+                    return
+
+    # Troca cada palavra que não é início de nenhuma palavra conhecida pela mais parecida
+    # Para ficar rápida, só compara com palavras de mesma inicial e tamanho próximo
+    def _corrigir(self, termos_busca):
+        corrigidos = []
+        for busca in termos_busca:
+            inicio = bisect.bisect_left(self._termos, busca)
+            if inicio < len(self._termos) and self._termos[inicio].startswith(busca):
+                corrigidos.append(busca)
+                continue
+            inicio = bisect.bisect_left(self._termos, busca[0])
+            fim = bisect.bisect_left(self._termos, busca[0] + "\uffff", inicio)
+            vocabulario = [termo for termo in self._termos[inicio:fim] if abs(len(termo) - len(busca)) <= 2]
+            parecidos = difflib.get_close_matches(busca, vocabulario, n=1, cutoff=SEMELHANCA_MINIMA)
+            if not parecidos:
+                return None
+            corrigidos.append(parecidos[0])
+        return corrigidos
+
+    def _pares(self, codigos):
+        return [(codigo, self._itens[codigo][0]) for codigo in codigos]
+
+# Campo de texto com lista de sugestões para escolher um insumo
+# selecionado() devolve (codigo, nome) ou None. As sugestões vêm de um IndiceInsumos compartilhado.
+class SeletorInsumo(ttk.Frame):
+    def __init__(self, master, indice, largura=40, linhas=8, ao_selecionar=None):
+        super().__init__(master)
+        self.indice = indice
+        self.ao_selecionar = ao_selecionar
+        self._selecionado = None
+        self._sugestoes = []
+
+        self.entrada = ttk.Entry(self, width=largura)
+        self.entrada.pack(fill=tk.X)
+        self.lista = tk.Listbox(self, height=linhas, activestyle="dotbox", exportselection=False)
+
+        self.entrada.bind("<KeyRelease>", self._ao_digitar)
+        self.entrada.bind("<Down>", lambda e: self._mover(1))
+        self.entrada.bind("<Up>", lambda e: self._mover(-1))
+        self.entrada.bind("<Return>", lambda e: self._escolher())
+        self.entrada.bind("<Escape>", lambda e: self._esconder())
+        self.entrada.bind("<FocusIn>", lambda e: self.atualizar_sugestoes())
+        self.lista.bind("<ButtonRelease-1>", lambda e: self._escolher())
+        self.lista.bind("<Return>", lambda e: self._escolher())
+
+    def selecionado(self):
+        # O item escolhido pode ter sido excluído ou renomeado depois
+        if self._selecionado and self._selecionado[0] in self.indice:
+            return self._selecionado[0], self.indice.nome(self._selecionado[0])
+        return None
+
+    def limpar(self):
+        self._selecionado = None
+        self.entrada.delete(0, tk.END)
+        self._esconder()
+
+    def _ao_digitar(self, event):
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        self._selecionado = None
+        self.atualizar_sugestoes()
+
+    def atualizar_sugestoes(self):
+        if self._selecionado is not None:
+            return
+        self._sugestoes = self.indice.buscar(self.entrada.get())
+        self.lista.delete(0, tk.END)
+        for codigo, nome in self._sugestoes:
+            self.lista.insert(tk.END, f"{codigo} - {nome}")
+        if self._sugestoes:
+            self.lista.selection_set(0)
+            self.lista.activate(0)
+            self.lista.pack(fill=tk.X)
+        else:
+            self._esconder()
+
+    def _esconder(self):
+        self.lista.pack_forget()
+
+    def _mover(self, passos):
+        if not self._sugestoes:
+            return "break"
+        atual = self.lista.curselection()
+        posicao = min(max((atual[0] if atual else -1) + passos, 0), len(self._sugestoes) - 1)
+        self.lista.selection_clear(0, tk.END)
+        self.lista.selection_set(posicao)
+        self.lista.activate(posicao)
+        self.lista.see(posicao)
+        return "break"
+
+    def _escolher(self):
+        atual = self.lista.curselection()
+        if not self._sugestoes or not atual:
+            return "break"
+        self._selecionado = self._sugestoes[atual[0]]
+        self.entrada.delete(0, tk.END)
+        self.entrada.insert(0, f"{self._selecionado[0]} - {self._selecionado[1]}")
+        self._esconder()
+        if self.ao_selecionar is not None:
+            self.ao_selecionar(self._selecionado)
+        return "break"
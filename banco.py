@@ -0,0 +1,1132 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import eventos
+import instrumentacao
+from validade import normalizar_validade
+
+# Camada de acesso a dados
+# Todas as telas passam por este módulo. Cada thread usa uma única conexão já configurada
+# (obter_conexao), em vez de abrir e fechar uma conexão a cada clique.
+
+# Caminho do banco de dados local
+CAMINHO_BANCO = "estoque_dental.db"
+
+# Configuração aplicada a toda conexão aberta pelo aplicativo
+PRAGMAS_CONEXAO = [
+    "PRAGMA journal_mode = WAL",  # leitores não bloqueiam quem grava (e vice-versa)
+    "PRAGMA synchronous = NORMAL",  # seguro com WAL e bem mais rápido que FULL
+    "PRAGMA cache_size = -20000",  # ~20 MB de cache de páginas
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+]
+TEMPO_ESPERA_BLOQUEIO = 10  # segundos esperando outra conexão liberar o banco
+COMANDOS_EM_CACHE = 256  # comandos SQL preparados mantidos por conexão
+
+# Linhas tipadas devolvidas pelas consultas
+# situacao: faixa do estoque (ESTOQUE_BAIXO, ESTOQUE_ATENCAO ou ESTOQUE_OK), calculada no banco
+Insumo = namedtuple("Insumo", "rowid codigo nome quantidade validade localizacao observacao estoque_minimo estoque_alvo situacao")
+Movimentacao = namedtuple("Movimentacao", "id insumo_codigo nome tipo quantidade data lote", defaults=(None,))
+Lote = namedtuple("Lote", "id insumo_codigo lote validade quantidade")
+# Estoque de uma filial, como veio na última planilha consolidada (consolidacao.py)
+EstoqueFilial = namedtuple("EstoqueFilial", "filial codigo nome quantidade validade localizacao observacao")
+Filial = namedtuple("Filial", "filial arquivo itens importado_em")
+# Alerta de validade: um lote (ou o estoque sem lote do item, lote None) com os dados do item
+AlertaValidade = namedtuple("AlertaValidade", "rowid codigo nome quantidade validade localizacao observacao lote")
+ConsumoPeriodo = namedtuple("ConsumoPeriodo", "insumo_codigo periodo entradas saidas")
+PrevisaoReposicao = namedtuple("PrevisaoReposicao", "insumo_codigo nome quantidade media_diaria media_ponderada dias_restantes data_ruptura reposicao_sugerida")
+DivergenciaConsumo = namedtuple("DivergenciaConsumo", "insumo_codigo dia entradas saidas entradas_gravadas saidas_gravadas")
+
+_local = threading.local()
+
+# Função para abrir uma nova conexão configurada com o banco de dados
+# Em modo autocommit: as transações são abertas explicitamente com transacao()
+def conectar(caminho=CAMINHO_BANCO):
+    conexao = sqlite3.connect(
+        caminho,
+        timeout=TEMPO_ESPERA_BLOQUEIO,
+        isolation_level=None,
+        cached_statements=COMANDOS_EM_CACHE,
+        factory=instrumentacao.fabrica_conexao(),  # tempo de cada comando (veja instrumentacao.py)
+    )
+    for pragma in PRAGMAS_CONEXAO:
+        conexao.execute(pragma)
+    return conexao
+
+# Função para obter a conexão da thread atual (criada na primeira chamada)
+def obter_conexao():
+    conexao = getattr(_local, "conexao", None)
+    if conexao is None or _local.caminho != CAMINHO_BANCO:
+        if conexao is not None:
+            conexao.close()
+        conexao = conectar(CAMINHO_BANCO)
+        _local.conexao = conexao
+        _local.caminho = CAMINHO_BANCO
+    return conexao
+
+# Função para fechar a conexão da thread atual (ao encerrar o aplicativo ou uma thread de trabalho)
+# PRAGMA optimize antes de fechar atualiza as estatísticas que as consultas da sessão indicaram
+def fechar_conexao():
+    conexao = getattr(_local, "conexao", None)
+    if conexao is not None:
+        try:
+            conexao.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass  # banco ocupado: fica para a próxima vez
+        conexao.close()
+        _local.conexao = None
+
+# Eventos (eventos.py) das alterações feitas na transação em andamento, por conexão da thread
+def _eventos_pendentes(conexao):
+    pendentes = getattr(_local, "eventos", None)
+    if pendentes is None:
+        pendentes = _local.eventos = {}
+    return pendentes.setdefault(id(conexao), [])
+
+# Função para avisar as telas de uma alteração: o evento só é publicado quando a transação em
+# que ela foi feita é confirmada, e é descartado se a transação voltar atrás
+def notificar(evento, conexao=None):
+    if not eventos.tem_assinantes():
+        return
+    conexao = conexao or obter_conexao()
+    if conexao.in_transaction:
+        _eventos_pendentes(conexao).append(evento)
+    else:
+        eventos.publicar(evento)
+
+# Gerenciador de contexto de transação
+# BEGIN IMMEDIATE reserva a escrita logo no início, evitando "database is locked" no meio da
+# transação. Dentro de outra transação vira um SAVEPOINT, então pode ser aninhado.
+@contextmanager
+def transacao(conexao=None):
+    conexao = conexao or obter_conexao()
+    pendentes = _eventos_pendentes(conexao)
+    if conexao.in_transaction:
+        anteriores = len(pendentes)
+        conexao.execute("SAVEPOINT aninhada")
+        try:
+            yield conexao
+        except BaseException:
+            conexao.execute("ROLLBACK TO aninhada")
+            conexao.execute("RELEASE aninhada")
+            del pendentes[anteriores:]
+            raise
+        conexao.execute("RELEASE aninhada")
+        return
+
+    pendentes.clear()
+    conexao.execute("BEGIN IMMEDIATE")
+    try:
+        yield conexao
+    except BaseException:
+        conexao.execute("ROLLBACK")
+        pendentes.clear()
+        raise
+    conexao.execute("COMMIT")
+    for evento in pendentes:
+        eventos.publicar(evento)
+    pendentes.clear()
+
+# Função para executar uma consulta e devolver as linhas já como namedtuple
+def consultar(sql, parametros=(), tipo=None, conexao=None):
+    cursor = (conexao or obter_conexao()).cursor()
+    if tipo is not None:
+        cursor.row_factory = lambda _, linha: tipo._make(linha)
+    cursor.execute(sql, parametros)
+    return cursor.fetchall()
+
+# Consultas e gravações de insumos
+
+# Níveis de estoque de cada item: até o mínimo o estoque está baixo; abaixo do alvo, pede atenção.
+# Itens sem níveis definidos (cadastro, planilha) ficam com os padrões.
+ESTOQUE_MINIMO_PADRAO = 10
+ESTOQUE_ALVO_PADRAO = 20
+
+ESTOQUE_BAIXO = "baixo"
+ESTOQUE_ATENCAO = "atencao"
+ESTOQUE_OK = "ok"
+
+# Situação do estoque calculada na própria consulta ({0}: prefixo da tabela, se houver)
+SITUACAO_ESTOQUE = (f"CASE WHEN {{0}}quantidade <= {{0}}estoque_minimo THEN '{ESTOQUE_BAIXO}' "
+                    f"WHEN {{0}}quantidade < {{0}}estoque_alvo THEN '{ESTOQUE_ATENCAO}' ELSE '{ESTOQUE_OK}' END")
+CAMPOS_INSUMO = ("rowid", "codigo", "nome", "quantidade", "validade", "localizacao", "observacao",
+                 "estoque_minimo", "estoque_alvo")
+
+# Colunas do SELECT de um Insumo (tabela: nome ou apelido da tabela, nas consultas com junção)
+def colunas_insumo(tabela=None):
+    prefixo = f"{tabela}." if tabela else ""
+    return ", ".join(prefixo + campo for campo in CAMPOS_INSUMO) + ", " + SITUACAO_ESTOQUE.format(prefixo)
+
+def listar_insumos(conexao=None):
+    return consultar(f"SELECT {colunas_insumo()} FROM insumos", tipo=Insumo, conexao=conexao)
+
+def obter_insumo(rowid, conexao=None):
+    linhas = consultar(f"SELECT {colunas_insumo()} FROM insumos WHERE rowid = ?", (rowid,), Insumo, conexao)
+    return linhas[0] if linhas else None
+
+# Itens abaixo do estoque alvo, do mais crítico (mais abaixo do mínimo) para o menos crítico
+# A condição e a ordenação são as do índice parcial idx_insumos_abaixo_alvo: a consulta lê só as
+# entradas desse índice, já na ordem, sem percorrer a tabela de insumos
+def listar_estoque_baixo(conexao=None):
+    return consultar(f'''
+        SELECT {colunas_insumo()} FROM insumos
+        WHERE quantidade < estoque_alvo
+        ORDER BY quantidade - estoque_minimo, rowid
+    ''', tipo=Insumo, conexao=conexao)
+
+# Pares (codigo, nome) para as listas de seleção
+def listar_codigos_nomes(conexao=None):
+    return consultar("SELECT codigo, nome FROM insumos ORDER BY COALESCE(codigo, '')", conexao=conexao)
+
+# Retorna o rowid do item cadastrado
+# estoque_minimo/estoque_alvo: None = padrão (ESTOQUE_MINIMO_PADRAO, ESTOQUE_ALVO_PADRAO)
+def inserir_insumo(codigo, nome, quantidade, validade, localizacao, observacao,
+                   estoque_minimo=None, estoque_alvo=None, conexao=None):
+    with transacao(conexao) as conexao:
+        rowid = conexao.execute('''
+            INSERT INTO insumos (codigo, nome, quantidade, validade, localizacao, observacao, estoque_minimo, estoque_alvo)
+            VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, ?), COALESCE(?, ?))
+        ''', (codigo, nome, quantidade, validade, localizacao, observacao,
+              estoque_minimo, ESTOQUE_MINIMO_PADRAO, estoque_alvo, ESTOQUE_ALVO_PADRAO)).lastrowid
+        # O item do evento é lido de volta: a situação do estoque vem do banco
+        if eventos.tem_assinantes():
+            notificar(eventos.InsumoAlterado(eventos.INSUMO_INSERIDO, rowid, None, obter_insumo(rowid, conexao)), conexao)
+    return rowid
+
+# Código atual de um item (para os eventos de alteração e exclusão)
+def _codigo_atual(rowid, conexao):
+    linha = conexao.execute("SELECT codigo FROM insumos WHERE rowid = ?", (rowid,)).fetchone()
+    return linha[0] if linha else None
+
+# estoque_minimo/estoque_alvo: None = mantém os níveis atuais do item
+def atualizar_insumo(rowid, codigo, nome, quantidade, validade, localizacao, observacao,
+                     estoque_minimo=None, estoque_alvo=None, conexao=None):
+    conexao = conexao or obter_conexao()
+    arquivo = anexar_arquivo(conexao)
+    with transacao(conexao):
+        anterior = _codigo_atual(rowid, conexao) if eventos.tem_assinantes() or arquivo else None
+        alteradas = conexao.execute('''
+            UPDATE insumos
+            SET codigo = ?, nome = ?, quantidade = ?, validade = ?, localizacao = ?, observacao = ?,
+                estoque_minimo = COALESCE(?, estoque_minimo), estoque_alvo = COALESCE(?, estoque_alvo)
+            WHERE rowid = ?
+        ''', (codigo, nome, quantidade, validade, localizacao, observacao, estoque_minimo, estoque_alvo, rowid)).rowcount
+        if alteradas:
+            if arquivo and anterior != codigo:
+                _renomear_no_arquivo(anterior, codigo, conexao)
+            limitar_lotes(codigo, conexao)
+            if eventos.tem_assinantes():
+                notificar(eventos.InsumoAlterado(eventos.INSUMO_ALTERADO, rowid, anterior,
+                                                 obter_insumo(rowid, conexao)), conexao)
+
+# O ON UPDATE CASCADE não chega ao arquivo: as movimentações arquivadas do item passam para o
+# código novo aqui, e o consumo diário dos dias arquivados (o que sobrou no código antigo depois
+# do gatilho das movimentações do banco principal) vai junto
+def _renomear_no_arquivo(anterior, codigo, conexao):
+    conexao.execute("UPDATE arquivo.historico SET insumo_codigo = ? WHERE insumo_codigo = ?", (codigo, anterior))
+    conexao.execute('''
+        INSERT INTO consumo_diario (insumo_codigo, dia, entradas, saidas)
+        SELECT ?, dia, entradas, saidas FROM consumo_diario WHERE insumo_codigo = ?
+        ON CONFLICT (insumo_codigo, dia) DO UPDATE SET
+            entradas = entradas + excluded.entradas,
+            saidas = saidas + excluded.saidas
+    ''', (codigo, anterior))
+    conexao.execute("DELETE FROM consumo_diario WHERE insumo_codigo = ?", (anterior,))
+
+def excluir_insumo(rowid, conexao=None):
+    with transacao(conexao) as conexao:
+        anterior = _codigo_atual(rowid, conexao) if eventos.tem_assinantes() else None
+        if conexao.execute("DELETE FROM insumos WHERE rowid = ?", (rowid,)).rowcount:
+            notificar(eventos.InsumoAlterado(eventos.INSUMO_EXCLUIDO, rowid, anterior, None), conexao)
+
+# Banco de arquivo do histórico (arquivamento.py): as movimentações antigas saem do banco
+# principal para um arquivo ao lado dele ("estoque_dental_arquivo.db"), anexado às conexões
+# como "arquivo" (ATTACH) quando existe. As consultas do histórico abaixo leem as duas tabelas
+# só quando o período pedido começa antes do que já foi arquivado.
+def caminho_arquivo(caminho_banco=None):
+    base, extensao = os.path.splitext(caminho_banco or CAMINHO_BANCO)
+    return f"{base}_arquivo{extensao or '.db'}"
+
+# Função para anexar o banco de arquivo à conexão (criar=True cria o arquivo e a tabela)
+# Retorna True se o arquivo está anexado. O ATTACH não pode ser feito dentro de uma transação:
+# nesse caso, só informa se ele já estava anexado.
+def anexar_arquivo(conexao=None, criar=False):
+    conexao = conexao or obter_conexao()
+    bancos = {linha[1]: linha[2] for linha in conexao.execute("PRAGMA database_list")}
+    if "arquivo" in bancos:
+        return True
+    if not bancos.get("main") or conexao.in_transaction:
+        return False
+    caminho = caminho_arquivo(bancos["main"])
+    if not criar and not os.path.exists(caminho):
+        return False
+    conexao.execute("ATTACH DATABASE ? AS arquivo", (caminho,))
+    conexao.execute("PRAGMA arquivo.journal_mode = WAL")
+    conexao.execute("PRAGMA arquivo.synchronous = NORMAL")
+    if criar:
+        # Mesmas colunas do histórico, sem chave estrangeira (não existe entre arquivos diferentes)
+        conexao.execute('''
+            CREATE TABLE IF NOT EXISTS arquivo.historico (
+                id INTEGER PRIMARY KEY,
+                insumo_codigo TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                quantidade INTEGER NOT NULL,
+                data datetime NOT NULL,
+                lote TEXT
+            )
+        ''')
+        conexao.execute("CREATE INDEX IF NOT EXISTS arquivo.idx_historico_data ON historico (data, id)")
+        conexao.execute("CREATE INDEX IF NOT EXISTS arquivo.idx_historico_insumo_data ON historico (insumo_codigo, data, id)")
+        conexao.execute("CREATE INDEX IF NOT EXISTS arquivo.idx_historico_tipo_data ON historico (tipo, data, id)")
+    return True
+
+# Controle do arquivamento, no banco principal
+# historico_arquivado: (data, id) da última movimentação arquivada. A cópia para o arquivo e a
+# exclusão no banco principal são transações separadas (com WAL, uma transação em dois arquivos
+# não é atômica); a marca só avança junto com a exclusão, e as consultas leem do arquivo só o
+# que está até a marca, então um lote copiado e ainda não excluído não aparece duas vezes.
+# historico_arquivando: tem uma linha só durante a exclusão de um lote arquivado, para o
+# gatilho do consumo diário não descontar movimentações que continuam valendo (no arquivo).
+# manutencao: quando cada tarefa de manutenção rodou pela última vez.
+def criar_arquivamento(conexao):
+    cursor = conexao.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS historico_arquivado (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            ate_data TEXT NOT NULL,
+            ate_id INTEGER NOT NULL,
+            linhas INTEGER NOT NULL,
+            arquivado_em TEXT NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE TABLE IF NOT EXISTS historico_arquivando (ativo INTEGER NOT NULL)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS manutencao (
+            tarefa TEXT PRIMARY KEY,
+            executada_em TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+# (data, id) da última movimentação arquivada, ou None se nada foi arquivado
+def limite_arquivado(conexao=None):
+    linhas = consultar("SELECT ate_data, ate_id FROM historico_arquivado", conexao=conexao)
+    return tuple(linhas[0]) if linhas else None
+
+# Tabelas do histórico que um período com este início precisa ler, e a marca do arquivo
+def _tabelas_historico(inicio, conexao):
+    conexao = conexao or obter_conexao()
+    limite = limite_arquivado(conexao)
+    if limite is None or (inicio and inicio > limite[0]) or not anexar_arquivo(conexao):
+        return ["historico"], None
+    return ["main.historico", "arquivo.historico"], limite
+
+# Monta `selecao` (com {tabela} e {onde}) uma vez por tabela do histórico, com o mesmo filtro;
+# com o arquivo, as partes são unidas por UNION ALL (o ORDER BY de quem chama vale para a união
+# e o SQLite intercala as partes já ordenadas pelos índices (data, id) de cada arquivo)
+def _selecionar_historico(selecao, condicoes, parametros, inicio, conexao):
+    tabelas, limite = _tabelas_historico(inicio, conexao)
+    partes, todos = [], []
+    for tabela in tabelas:
+        condicoes_tabela, parametros_tabela = list(condicoes), list(parametros)
+        if tabela == "arquivo.historico":
+            condicoes_tabela.append("(historico.data, historico.id) <= (?, ?)")
+            parametros_tabela += limite
+        onde = f"WHERE {' AND '.join(condicoes_tabela)}" if condicoes_tabela else ""
+        partes.append(selecao.format(tabela=tabela, onde=onde))
+        todos += parametros_tabela
+    return " UNION ALL ".join(partes), todos
+
+SELECAO_HISTORICO = '''
+    SELECT historico.id, historico.insumo_codigo, insumos.nome, historico.tipo, historico.quantidade, historico.data,
+           historico.lote
+    FROM {tabela} AS historico
+    LEFT JOIN insumos ON historico.insumo_codigo = insumos.codigo
+    {onde}
+'''
+
+# Função para montar o filtro do histórico: período (datas ISO, inclusive), item e tipo
+def filtro_historico(inicio=None, fim=None, codigo=None, tipo=None):
+    condicoes, parametros = [], []
+    if inicio:
+        condicoes.append("historico.data >= ?")
+        parametros.append(inicio)
+    if fim:
+        # Até o fim do dia informado
+        condicoes.append("historico.data < ?")
+        parametros.append((datetime.strptime(fim, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d"))
+    if codigo:
+        condicoes.append("historico.insumo_codigo = ?")
+        parametros.append(codigo)
+    if tipo:
+        condicoes.append("historico.tipo = ?")
+        parametros.append(tipo)
+    return condicoes, parametros
+
+# Histórico de movimentações, da mais recente para a mais antiga
+# Paginação por chave: `apos` é a última Movimentacao já carregada; a próxima página começa
+# logo depois dela, pelos índices (data, id), sem OFFSET
+def listar_historico(inicio=None, fim=None, codigo=None, tipo=None, apos=None, limite=None, conexao=None):
+    condicoes, parametros = filtro_historico(inicio, fim, codigo, tipo)
+    if apos is not None:
+        condicoes += ["historico.data <= ?", "(historico.data, historico.id) < (?, ?)"]
+        parametros += [apos.data, apos.data, apos.id]
+    sql, parametros = _selecionar_historico(SELECAO_HISTORICO, condicoes, parametros, inicio, conexao)
+    if limite is not None:
+        parametros.append(limite)
+    return consultar(f'''
+        {sql}
+        ORDER BY data DESC, id DESC
+        {"LIMIT ?" if limite is not None else ""}
+    ''', parametros, Movimentacao, conexao)
+
+# Quantidade de movimentações que atendem ao filtro
+def contar_historico(inicio=None, fim=None, codigo=None, tipo=None, conexao=None):
+    condicoes, parametros = filtro_historico(inicio, fim, codigo, tipo)
+    sql, parametros = _selecionar_historico("SELECT COUNT(*) AS total FROM {tabela} AS historico {onde}",
+                                            condicoes, parametros, inicio, conexao)
+    return consultar(f"SELECT SUM(total) FROM ({sql})", parametros, conexao=conexao)[0][0]
+
+# Gerador de uma consulta em lotes de linhas (fetchmany), sem carregar o resultado inteiro
+# Para relatórios e exportações longos: a memória usada não depende do tamanho da tabela
+def consultar_em_lotes(sql, parametros=(), tipo=None, tamanho_lote=500, conexao=None):
+    cursor = (conexao or obter_conexao()).cursor()
+    if tipo is not None:
+        cursor.row_factory = lambda _, linha: tipo._make(linha)
+    cursor.execute(sql, parametros)
+    try:
+        while True:
+            lote = cursor.fetchmany(tamanho_lote)
+            if not lote:
+                return
+            yield lote
+    finally:
+        cursor.close()
+
+# Lotes do histórico em ordem cronológica
+def lotes_historico(inicio=None, fim=None, codigo=None, tipo=None, tamanho_lote=500, conexao=None):
+    condicoes, parametros = filtro_historico(inicio, fim, codigo, tipo)
+    sql, parametros = _selecionar_historico(SELECAO_HISTORICO, condicoes, parametros, inicio, conexao)
+    return consultar_em_lotes(f"{sql} ORDER BY data, id", parametros, Movimentacao, tamanho_lote, conexao)
+
+# Gerador do histórico em ordem cronológica, linha a linha
+def iterar_historico(inicio=None, fim=None, codigo=None, tipo=None, tamanho_lote=500, conexao=None):
+    for lote in lotes_historico(inicio, fim, codigo, tipo, tamanho_lote, conexao):
+        yield from lote
+
+# Lotes da tabela de insumos, na ordem do código
+def lotes_insumos(tamanho_lote=500, conexao=None):
+    return consultar_em_lotes(
+        f"SELECT {colunas_insumo()} FROM insumos ORDER BY COALESCE(codigo, '')",
+        (), Insumo, tamanho_lote, conexao)
+
+# Função para criar as tabelas do aplicativo (caso ainda não existam)
+def criar_tabelas(conexao=None):
+    conexao = conexao or obter_conexao()
+    cursor = conexao.cursor()
+
+    # Tabela de insumos
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS insumos (
+            codigo TEXT PRIMARY KEY,
+            nome TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            validade TEXT,
+            localizacao TEXT,
+            observacao TEXT,
+            estoque_minimo INTEGER NOT NULL DEFAULT {ESTOQUE_MINIMO_PADRAO} CHECK (estoque_minimo >= 0),
+            estoque_alvo INTEGER NOT NULL DEFAULT {ESTOQUE_ALVO_PADRAO} CHECK (estoque_alvo >= 0)
+        )
+    ''')
+
+    # Tabela de histórico de movimentações
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS historico (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            insumo_codigo TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            data datetime NOT NULL,
+            FOREIGN KEY (insumo_codigo) REFERENCES insumos (codigo) ON UPDATE CASCADE
+        )
+    ''')
+
+    # Impressão digital de cada planilha já importada (para pular arquivos inalterados)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS planilha_importacoes (
+            caminho TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            tamanho INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            importado_em TEXT NOT NULL
+        )
+    ''')
+
+    # Hash de cada linha da planilha na última importação (para detectar linhas alteradas)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS planilha_linhas (
+            codigo TEXT PRIMARY KEY,
+            hash INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+    aplicar_migracoes(conexao)
+    criar_indices(conexao)
+    criar_busca_textual(conexao)
+    criar_arquivamento(conexao)
+    criar_consumo_diario(conexao)
+    criar_previsao_reposicao(conexao)
+    criar_versao_insumos(conexao)
+    criar_codigos_barras(conexao)
+    criar_lotes(conexao)
+    criar_estoque_filiais(conexao)
+
+# Migração 1: validade em formato ISO (AAAA-MM-DD), NULL quando indeterminada
+# Antes a coluna misturava "AAAA-MM-DD HH:MM:SS" (planilha), "DD/MM/AAAA" (formulários),
+# "INDETERMINADO", "X" e "MM/AA".
+def migrar_validade_iso(conexao):
+    conexao.create_function("normalizar_validade", 1, normalizar_validade, deterministic=True)
+    conexao.execute("UPDATE insumos SET validade = normalizar_validade(validade)")
+
+# Migração 2: alterar o código de um insumo leva junto o seu histórico (ON UPDATE CASCADE)
+# Necessária desde que as chaves estrangeiras passaram a ser verificadas (foreign_keys = ON)
+def migrar_historico_cascata(conexao):
+    sql = conexao.execute("SELECT sql FROM sqlite_master WHERE name = 'historico'").fetchone()[0]
+    if "ON UPDATE CASCADE" in sql:
+        return
+    conexao.execute('''
+        CREATE TABLE historico_nova (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            insumo_codigo TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            data datetime NOT NULL,
+            FOREIGN KEY (insumo_codigo) REFERENCES insumos (codigo) ON UPDATE CASCADE
+        )
+    ''')
+    conexao.execute("INSERT INTO historico_nova SELECT id, insumo_codigo, tipo, quantidade, data FROM historico")
+    conexao.execute("DROP TABLE historico")
+    conexao.execute("ALTER TABLE historico_nova RENAME TO historico")
+
+# Migração 3: cada movimentação registra o lote de onde saiu ou para onde entrou (NULL = sem lote)
+def migrar_historico_lote(conexao):
+    colunas = [linha[1] for linha in conexao.execute("PRAGMA table_info(historico)")]
+    if "lote" not in colunas:
+        conexao.execute("ALTER TABLE historico ADD COLUMN lote TEXT")
+
+# Migração 4: o gatilho de exclusão do consumo diário passa a ignorar o arquivamento
+# (criar_consumo_diario recria o gatilho com a condição nova)
+def migrar_consumo_arquivamento(conexao):
+    conexao.execute("DROP TRIGGER IF EXISTS historico_consumo_excluir")
+
+# Migração 5: níveis de estoque por item (antes, 10 e 20 unidades para todos os itens)
+def migrar_niveis_estoque(conexao):
+    colunas = [linha[1] for linha in conexao.execute("PRAGMA table_info(insumos)")]
+    if "estoque_minimo" not in colunas:
+        conexao.execute(f"ALTER TABLE insumos ADD COLUMN estoque_minimo INTEGER NOT NULL "
+                        f"DEFAULT {ESTOQUE_MINIMO_PADRAO} CHECK (estoque_minimo >= 0)")
+    if "estoque_alvo" not in colunas:
+        conexao.execute(f"ALTER TABLE insumos ADD COLUMN estoque_alvo INTEGER NOT NULL "
+                        f"DEFAULT {ESTOQUE_ALVO_PADRAO} CHECK (estoque_alvo >= 0)")
+
+# Migração 6: gatilhos da previsão que não falham quando a importação atualiza um item já
+# pendente (criar_previsao_reposicao recria os gatilhos)
+def migrar_gatilhos_previsao(conexao):
+    for nome in ("inserir", "excluir", "atualizar"):
+        conexao.execute(f"DROP TRIGGER IF EXISTS insumos_previsao_{nome}")
+
+# Migrações do esquema, aplicadas em ordem conforme o PRAGMA user_version do banco
+MIGRACOES = [
+    migrar_validade_iso,
+    migrar_historico_cascata,
+    migrar_historico_lote,
+    migrar_consumo_arquivamento,
+    migrar_niveis_estoque,
+    migrar_gatilhos_previsao,
+]
+
+# Função para aplicar as migrações pendentes (cada uma na sua transação)
+# As chaves estrangeiras ficam desligadas durante as migrações para permitir recriar tabelas
+def aplicar_migracoes(conexao):
+    versao = conexao.execute("PRAGMA user_version").fetchone()[0]
+    if versao >= len(MIGRACOES):
+        return
+    conexao.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for numero, migracao in enumerate(MIGRACOES[versao:], start=versao + 1):
+            with transacao(conexao):
+                migracao(conexao)
+                conexao.execute(f"PRAGMA user_version = {numero}")
+    finally:
+        conexao.execute("PRAGMA foreign_keys = ON")
+
+# Expressões de ordenação da tela de monitoramento, na ordem das colunas exibidas
+# (None = coluna sem ordenação). Cada expressão tem um índice próprio em criar_indices().
+ORDENACAO_INSUMOS = [
+    "COALESCE(codigo, '')",
+    "nome",
+    "quantidade",
+    "COALESCE(validade, '')",
+    "COALESCE(localizacao, '')",
+    None,
+    None,
+    None,
+]
+
+# Função para criar os índices usados na ordenação e na paginação da tabela de insumos
+def criar_indices(conexao):
+    cursor = conexao.cursor()
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_insumos_codigo_ordem ON insumos (COALESCE(codigo, ''))")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_insumos_nome ON insumos (nome)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_insumos_quantidade ON insumos (quantidade)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_insumos_validade_ordem ON insumos (COALESCE(validade, ''))")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_insumos_localizacao_ordem ON insumos (COALESCE(localizacao, ''))")
+    # Alertas de validade: consulta por intervalo só sobre itens com validade definida
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_insumos_validade ON insumos (validade) WHERE validade IS NOT NULL")
+    # Estoque baixo: só os itens abaixo do alvo, na ordem de quanto estão abaixo do mínimo
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_insumos_abaixo_alvo ON insumos (quantidade - estoque_minimo)
+        WHERE quantidade < estoque_alvo
+    ''')
+    # Histórico: ordenado por data e filtrado por item ou tipo, sempre com (data, id) no fim
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_historico_data ON historico (data, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_historico_insumo_data ON historico (insumo_codigo, data, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_historico_tipo_data ON historico (tipo, data, id)")
+
+# Dias de antecedência padrão para os alertas de validade
+DIAS_ALERTA_VALIDADE = 30
+
+# Função para buscar os lotes vencidos ou que vencem nos próximos `dias` dias
+# Cada lote com saldo é um alerta; o estoque sem lote de um item usa a validade do item.
+# As duas partes são consultas por intervalo nos índices de validade (lotes com saldo e itens
+# com validade); o saldo sem lote soma os lotes do item pelo índice (insumo_codigo, ...).
+# Da validade mais antiga para a mais nova. Retorna AlertaValidade.
+def buscar_alertas_validade(dias=DIAS_ALERTA_VALIDADE, hoje=None, conexao=None):
+    hoje = hoje or datetime.now().date()
+    limite = (hoje + timedelta(days=dias)).isoformat()
+    return consultar(f'''
+        SELECT i.rowid, i.codigo, i.nome, l.quantidade, l.validade, i.localizacao, i.observacao, l.lote
+        FROM insumo_lotes l
+        JOIN insumos i ON i.codigo = l.insumo_codigo
+        WHERE l.validade <= ? AND l.quantidade > 0
+        UNION ALL
+        SELECT * FROM (
+            SELECT i.rowid, i.codigo, i.nome, i.quantidade - {SOMA_LOTES} AS quantidade,
+                   i.validade, i.localizacao, i.observacao, NULL
+            FROM insumos i
+            WHERE i.validade <= ?
+        )
+        WHERE quantidade > 0
+        ORDER BY 5, 2, 8
+    ''', (limite, limite), AlertaValidade, conexao)
+
+# Função para criar o índice de busca textual (FTS5) sobre os insumos
+# O índice é de conteúdo externo (não duplica os dados) e é mantido pelos gatilhos abaixo.
+# O tokenizador unicode61 com remove_diacritics faz "résina" e "RESINA" casarem.
+def criar_busca_textual(conexao):
+    cursor = conexao.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'insumos_fts'")
+    ja_existia = cursor.fetchone() is not None
+
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS insumos_fts USING fts5(
+            codigo, nome, localizacao, observacao,
+            content='insumos', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS insumos_fts_inserir AFTER INSERT ON insumos BEGIN
+            INSERT INTO insumos_fts (rowid, codigo, nome, localizacao, observacao)
+            VALUES (new.rowid, new.codigo, new.nome, new.localizacao, new.observacao);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS insumos_fts_excluir AFTER DELETE ON insumos BEGIN
+            INSERT INTO insumos_fts (insumos_fts, rowid, codigo, nome, localizacao, observacao)
+            VALUES ('delete', old.rowid, old.codigo, old.nome, old.localizacao, old.observacao);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS insumos_fts_atualizar AFTER UPDATE ON insumos BEGIN
+            INSERT INTO insumos_fts (insumos_fts, rowid, codigo, nome, localizacao, observacao)
+            VALUES ('delete', old.rowid, old.codigo, old.nome, old.localizacao, old.observacao);
+            INSERT INTO insumos_fts (rowid, codigo, nome, localizacao, observacao)
+            VALUES (new.rowid, new.codigo, new.nome, new.localizacao, new.observacao);
+        END
+    ''')
+    if not ja_existia:
+        # Indexa os insumos que já estavam no banco
+        cursor.execute("INSERT INTO insumos_fts (insumos_fts) VALUES ('rebuild')")
+
+# Função para reconstruir o índice de busca textual (necessário se os rowids mudarem)
+def reconstruir_busca_textual(conexao=None):
+    (conexao or obter_conexao()).execute("INSERT INTO insumos_fts (insumos_fts) VALUES ('rebuild')")
+
+# Consumo diário agregado por item: (insumo, dia) -> total de entradas e de saídas
+# Mantido pelos gatilhos do histórico a cada inserção, alteração ou exclusão, então as
+# perguntas de consumo ("quanto do item X saiu por semana") leem uma linha por dia em vez
+# de percorrer todas as movimentações.
+def criar_consumo_diario(conexao):
+    cursor = conexao.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'consumo_diario'")
+    ja_existia = cursor.fetchone() is not None
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS consumo_diario (
+            insumo_codigo TEXT NOT NULL,
+            dia TEXT NOT NULL,
+            entradas INTEGER NOT NULL DEFAULT 0,
+            saidas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (insumo_codigo, dia)
+        ) WITHOUT ROWID
+    ''')
+    # Consultas de um dia ou período para todos os itens
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_consumo_diario_dia ON consumo_diario (dia)")
+
+    # Somar (ou subtrair) uma movimentação no dia dela
+    somar = '''
+        INSERT INTO consumo_diario (insumo_codigo, dia, entradas, saidas)
+        VALUES ({0}.insumo_codigo, date({0}.data),
+                CASE WHEN {0}.tipo = 'Entrada' THEN {0}.quantidade ELSE 0 END,
+                CASE WHEN {0}.tipo = 'Saída' THEN {0}.quantidade ELSE 0 END)
+        ON CONFLICT (insumo_codigo, dia) DO UPDATE SET
+            entradas = entradas + excluded.entradas,
+            saidas = saidas + excluded.saidas;
+    '''
+    subtrair = '''
+        UPDATE consumo_diario SET
+            entradas = entradas - CASE WHEN {0}.tipo = 'Entrada' THEN {0}.quantidade ELSE 0 END,
+            saidas = saidas - CASE WHEN {0}.tipo = 'Saída' THEN {0}.quantidade ELSE 0 END
+        WHERE insumo_codigo = {0}.insumo_codigo AND dia = date({0}.data);
+        DELETE FROM consumo_diario
+        WHERE insumo_codigo = {0}.insumo_codigo AND dia = date({0}.data) AND entradas = 0 AND saidas = 0;
+    '''
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS historico_consumo_inserir AFTER INSERT ON historico BEGIN {somar.format('new')} END")
+    # A exclusão de movimentações arquivadas (historico_arquivando) não desconta o consumo
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS historico_consumo_excluir AFTER DELETE ON historico
+        WHEN NOT EXISTS (SELECT 1 FROM historico_arquivando)
+        BEGIN {subtrair.format('old')} END
+    ''')
+    # Também dispara quando o código do insumo muda (ON UPDATE CASCADE)
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS historico_consumo_atualizar
+        AFTER UPDATE OF insumo_codigo, tipo, quantidade, data ON historico
+        BEGIN {subtrair.format('old')} {somar.format('new')} END
+    ''')
+    if not ja_existia:
+        # Carga inicial a partir do histórico que já estava no banco
+        reconstruir_consumo_diario(conexao)
+
+# Consulta que calcula o consumo diário direto do histórico (carga inicial e verificação),
+# incluindo as movimentações arquivadas; retorna (sql, parâmetros)
+def _consumo_diario_historico(conexao):
+    sql, parametros = _selecionar_historico(
+        "SELECT historico.insumo_codigo, historico.tipo, historico.quantidade, historico.data FROM {tabela} AS historico {onde}",
+        [], [], None, conexao)
+    return f'''
+        SELECT insumo_codigo, date(data) AS dia,
+               SUM(CASE WHEN tipo = 'Entrada' THEN quantidade ELSE 0 END) AS entradas,
+               SUM(CASE WHEN tipo = 'Saída' THEN quantidade ELSE 0 END) AS saidas
+        FROM ({sql})
+        GROUP BY insumo_codigo, date(data)
+    ''', parametros
+
+# Função para recalcular todo o consumo diário a partir do histórico (carga inicial ou reparo)
+def reconstruir_consumo_diario(conexao=None):
+    conexao = conexao or obter_conexao()
+    sql, parametros = _consumo_diario_historico(conexao)
+    with transacao(conexao):
+        conexao.execute("DELETE FROM consumo_diario")
+        conexao.execute(f'''
+            INSERT INTO consumo_diario (insumo_codigo, dia, entradas, saidas)
+            SELECT * FROM ({sql}) WHERE entradas <> 0 OR saidas <> 0
+        ''', parametros)
+
+# Função para conferir o consumo diário com o histórico
+# Retorna as diferenças encontradas (lista vazia = tabela consistente)
+def verificar_consumo_diario(conexao=None):
+    sql, parametros = _consumo_diario_historico(conexao)
+    return consultar(f'''
+        WITH esperado AS (
+            SELECT * FROM ({sql}) WHERE entradas <> 0 OR saidas <> 0
+        )
+        SELECT e.insumo_codigo, e.dia, e.entradas, e.saidas, c.entradas, c.saidas
+        FROM esperado e
+        LEFT JOIN consumo_diario c ON c.insumo_codigo = e.insumo_codigo AND c.dia = e.dia
+        WHERE c.entradas IS NOT e.entradas OR c.saidas IS NOT e.saidas
+        UNION ALL
+        SELECT c.insumo_codigo, c.dia, NULL, NULL, c.entradas, c.saidas
+        FROM consumo_diario c
+        LEFT JOIN esperado e ON e.insumo_codigo = c.insumo_codigo AND e.dia = c.dia
+        WHERE e.insumo_codigo IS NULL
+        ORDER BY 1, 2
+    ''', parametros, DivergenciaConsumo, conexao)
+
+# Dias entre o pedido e a chegada da reposição, e dias de consumo que a reposição deve cobrir
+# (usados no cálculo de previsao.py e pela tela de reposição, que não carrega o pandas)
+PRAZO_REPOSICAO_DIAS = 7
+COBERTURA_DIAS = 30
+
+# Previsão de reposição calculada por previsao.py, guardada no banco para a tela abrir na hora
+# Os gatilhos marcam em previsao_pendentes os itens que mudaram (movimentação, edição,
+# importação ou exclusão); a próxima atualização recalcula só esses itens.
+def criar_previsao_reposicao(conexao):
+    cursor = conexao.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS previsao_reposicao (
+            insumo_codigo TEXT PRIMARY KEY,
+            quantidade INTEGER NOT NULL,
+            media_diaria REAL NOT NULL,
+            media_ponderada REAL NOT NULL,
+            dias_restantes REAL,
+            data_ruptura TEXT,
+            reposicao_sugerida INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS previsao_pendentes (
+            insumo_codigo TEXT PRIMARY KEY
+        ) WITHOUT ROWID
+    ''')
+    # Dia do último cálculo completo (a janela de consumo anda a cada dia)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS previsao_controle (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            dia TEXT NOT NULL
+        )
+    ''')
+    # ON CONFLICT DO NOTHING, e não INSERT OR IGNORE: num gatilho disparado por um UPSERT
+    # (importação da planilha), o OR IGNORE dá lugar ao tratamento de conflito do comando externo
+    marcar = "INSERT INTO previsao_pendentes (insumo_codigo) VALUES ({0}.codigo) ON CONFLICT DO NOTHING;"
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS insumos_previsao_inserir AFTER INSERT ON insumos BEGIN {marcar.format('new')} END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS insumos_previsao_excluir AFTER DELETE ON insumos BEGIN {marcar.format('old')} END")
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS insumos_previsao_atualizar AFTER UPDATE OF codigo, quantidade ON insumos
+        BEGIN {marcar.format('old')} {marcar.format('new')} END
+    ''')
+
+# Previsão de reposição guardada, dos itens que acabam primeiro para os que não têm consumo
+def listar_previsao_reposicao(conexao=None):
+    return consultar('''
+        SELECT p.insumo_codigo, i.nome, p.quantidade, p.media_diaria, p.media_ponderada,
+               p.dias_restantes, p.data_ruptura, p.reposicao_sugerida
+        FROM previsao_reposicao p
+        JOIN insumos i ON i.codigo = p.insumo_codigo
+        ORDER BY p.dias_restantes IS NULL, p.dias_restantes, p.insumo_codigo
+    ''', tipo=PrevisaoReposicao, conexao=conexao)
+
+# Versão da tabela de insumos: um contador incrementado por gatilho a cada linha inserida,
+# alterada ou excluída (por qualquer caminho: telas, importação, serviço). O serviço usa a
+# versão como ETag da lista de itens, e os clientes só baixam a lista quando ela muda.
+def criar_versao_insumos(conexao):
+    cursor = conexao.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS versao_dados (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO versao_dados (tabela, versao) VALUES ('insumos', 1)")
+    incrementar = "UPDATE versao_dados SET versao = versao + 1 WHERE tabela = 'insumos';"
+    for evento, nome in (("INSERT", "inserir"), ("DELETE", "excluir"), ("UPDATE", "atualizar")):
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS insumos_versao_{nome} AFTER {evento} ON insumos BEGIN {incrementar} END")
+
+def versao_insumos(conexao=None):
+    return consultar("SELECT versao FROM versao_dados WHERE tabela = 'insumos'", conexao=conexao)[0][0]
+
+# Códigos de barras dos fabricantes (EAN, GTIN...) associados aos insumos
+# Um item pode ter vários (marcas, tamanhos de caixa); alterar o código do item leva junto as
+# associações, e excluir o item as apaga. A tela de leitura lê a tabela inteira ao abrir e
+# resolve cada leitura em memória.
+def criar_codigos_barras(conexao):
+    cursor = conexao.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS codigos_barras (
+            barras TEXT PRIMARY KEY,
+            insumo_codigo TEXT NOT NULL,
+            FOREIGN KEY (insumo_codigo) REFERENCES insumos (codigo) ON UPDATE CASCADE ON DELETE CASCADE
+        ) WITHOUT ROWID
+    ''')
+    # Sem este índice, cada alteração de código ou exclusão de item percorreria a tabela
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_codigos_barras_insumo ON codigos_barras (insumo_codigo)")
+
+# Pares (barras, codigo do insumo)
+def listar_codigos_barras(conexao=None):
+    return consultar("SELECT barras, insumo_codigo FROM codigos_barras", conexao=conexao)
+
+# Lotes de cada item: parte do estoque do item (insumos.quantidade continua sendo o total) com
+# número de lote e validade próprios. O que o total tem além da soma dos lotes é o estoque sem
+# lote, que vence na validade do próprio item. As saídas consomem primeiro o que vence primeiro
+# (FEFO, veja movimentacoes.py); lotes zerados são apagados.
+def criar_lotes(conexao):
+    cursor = conexao.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS insumo_lotes (
+            id INTEGER PRIMARY KEY,
+            insumo_codigo TEXT NOT NULL,
+            lote TEXT NOT NULL,
+            validade TEXT,
+            quantidade INTEGER NOT NULL CHECK (quantidade >= 0),
+            UNIQUE (insumo_codigo, lote),
+            FOREIGN KEY (insumo_codigo) REFERENCES insumos (codigo) ON UPDATE CASCADE ON DELETE CASCADE
+        )
+    ''')
+    # Lotes de um item na ordem de validade (FEFO) e soma por item, só com o índice
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_lotes_insumo_validade ON insumo_lotes (insumo_codigo, validade, quantidade)")
+    # Alertas: consulta por intervalo só sobre lotes com saldo
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_lotes_validade ON insumo_lotes (validade) WHERE quantidade > 0")
+
+# Soma dos lotes do item `i` (subconsulta coberta pelo índice idx_lotes_insumo_validade)
+SOMA_LOTES = "COALESCE((SELECT SUM(quantidade) FROM insumo_lotes WHERE insumo_codigo = i.codigo), 0)"
+
+# Lotes com saldo de um item, do que vence primeiro ao que vence por último (sem validade no fim)
+def listar_lotes(codigo, conexao=None):
+    return consultar('''
+        SELECT id, insumo_codigo, lote, validade, quantidade FROM insumo_lotes
+        WHERE insumo_codigo = ? AND quantidade > 0
+        ORDER BY validade IS NULL, validade, id
+    ''', (codigo,), Lote, conexao)
+
+# Lotes da tabela de lotes, na ordem do item e da validade
+def lotes_insumo_lotes(tamanho_lote=500, conexao=None):
+    return consultar_em_lotes(
+        "SELECT id, insumo_codigo, lote, validade, quantidade FROM insumo_lotes ORDER BY insumo_codigo, validade, id",
+        (), Lote, tamanho_lote, conexao)
+
+# Função para manter a soma dos lotes dentro do total do item
+# Quando o total é reduzido fora das movimentações (edição do item, planilha), a diferença sai
+# dos lotes que vencem por último. codigo=None confere todos os itens com lotes.
+def limitar_lotes(codigo=None, conexao=None):
+    with transacao(conexao) as conexao:
+        filtro = "WHERE l.insumo_codigo = ?" if codigo is not None else ""
+        excessos = conexao.execute(f'''
+            SELECT l.insumo_codigo, SUM(l.quantidade) - i.quantidade
+            FROM insumo_lotes l
+            JOIN insumos i ON i.codigo = l.insumo_codigo
+            {filtro}
+            GROUP BY l.insumo_codigo
+            HAVING SUM(l.quantidade) > i.quantidade
+        ''', () if codigo is None else (codigo,)).fetchall()
+        for insumo_codigo, excesso in excessos:
+            lotes = conexao.execute('''
+                SELECT id, quantidade FROM insumo_lotes WHERE insumo_codigo = ?
+                ORDER BY validade IS NOT NULL, validade DESC, id DESC
+            ''', (insumo_codigo,)).fetchall()
+            for id_lote, quantidade in lotes:
+                if excesso <= 0:
+                    break
+                retirar = min(quantidade, excesso)
+                conexao.execute("UPDATE insumo_lotes SET quantidade = quantidade - ? WHERE id = ?", (retirar, id_lote))
+                excesso -= retirar
+        conexao.execute("DELETE FROM insumo_lotes WHERE quantidade = 0")
+        return len(excessos)
+
+# Estoque das filiais: retrato de cada clínica trazido pela consolidação das planilhas
+# (consolidacao.py), separado do estoque desta clínica (insumos). Sem chave estrangeira: uma
+# filial pode ter itens que não existem aqui. Cada consolidação substitui o retrato da filial.
+def criar_estoque_filiais(conexao):
+    cursor = conexao.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS estoque_filiais (
+            filial TEXT NOT NULL,
+            codigo TEXT NOT NULL,
+            nome TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            validade TEXT,
+            localizacao TEXT,
+            observacao TEXT,
+            PRIMARY KEY (filial, codigo)
+        ) WITHOUT ROWID
+    ''')
+    # Um item em todas as filiais (e a soma das quantidades) sem ler a tabela inteira
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_estoque_filiais_codigo ON estoque_filiais (codigo, quantidade)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS filiais (
+            filial TEXT PRIMARY KEY,
+            arquivo TEXT NOT NULL,
+            itens INTEGER NOT NULL,
+            importado_em TEXT NOT NULL
+        )
+    ''')
+
+def listar_filiais(conexao=None):
+    return consultar("SELECT filial, arquivo, itens, importado_em FROM filiais ORDER BY filial", (), Filial, conexao)
+
+# Estoque de um item em cada filial (codigo=None: todos os itens), na ordem do código
+def listar_estoque_filiais(codigo=None, conexao=None):
+    filtro, parametros = ("WHERE codigo = ?", (codigo,)) if codigo is not None else ("", ())
+    return consultar(f'''
+        SELECT filial, codigo, nome, quantidade, validade, localizacao, observacao FROM estoque_filiais
+        {filtro}
+        ORDER BY codigo, filial
+    ''', parametros, EstoqueFilial, conexao)
+
+# Função para associar um código de barras a um insumo (substitui a associação anterior)
+def associar_codigo_barras(barras, codigo, conexao=None):
+    with transacao(conexao) as conexao:
+        conexao.execute('''
+            INSERT INTO codigos_barras (barras, insumo_codigo) VALUES (?, ?)
+            ON CONFLICT (barras) DO UPDATE SET insumo_codigo = excluded.insumo_codigo
+        ''', (barras, codigo))
+
+# Agrupamentos aceitos por listar_consumo: rótulo do período a partir do dia
+AGRUPAMENTOS_CONSUMO = {
+    "dia": "dia",
+    "semana": "date(dia, '-6 days', 'weekday 1')",  # segunda-feira da semana
+    "mes": "strftime('%Y-%m', dia)",
+    "ano": "strftime('%Y', dia)",
+}
+
+# Função para listar o consumo por dia, semana, mês ou ano a partir do agregado diário
+# Filtros opcionais: código do insumo e período (datas ISO, inclusive)
+def listar_consumo(codigo=None, inicio=None, fim=None, agrupamento="dia", conexao=None):
+    periodo = AGRUPAMENTOS_CONSUMO[agrupamento]
+    condicoes, parametros = [], []
+    if codigo:
+        condicoes.append("insumo_codigo = ?")
+        parametros.append(codigo)
+    if inicio:
+        condicoes.append("dia >= ?")
+        parametros.append(inicio)
+    if fim:
+        condicoes.append("dia <= ?")
+        parametros.append(fim)
+    onde = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    return consultar(f'''
+        SELECT insumo_codigo, {periodo} AS periodo, SUM(entradas), SUM(saidas)
+        FROM consumo_diario
+        {onde}
+        GROUP BY insumo_codigo, periodo
+        ORDER BY insumo_codigo, periodo
+    ''', parametros, ConsumoPeriodo, conexao)
+
+# Função para converter o texto digitado numa consulta FTS5 de prefixos
+# Ex.: "resina a2" -> '"resina"* "a2"*' (todas as palavras, cada uma como prefixo)
+def termo_busca(texto):
+    palavras = re.findall(r"\w+", texto or "")
+    if not palavras:
+        return None
+    return " ".join(f'"{palavra}"*' for palavra in palavras)
+
+# Fonte de dados paginada da tabela de insumos (usada pela TabelaVirtual)
+# As páginas são buscadas por chave (keyset): a partir da última linha carregada, pela
+# expressão de ordenação + rowid, o que usa os índices acima em vez de OFFSET.
+# As linhas são do tipo Insumo. Sem conexão explícita, cada consulta usa a conexão da thread
+# que a faz, então a primeira página pode ser buscada numa thread de trabalho.
+class FonteInsumos:
+    COLUNAS = colunas_insumo()
+
+    # Ordenada pelo cabeçalho, a fonte pagina por chave (buscar_apos/buscar_antes)
+    paginacao_por_chave = True
+
+    def __init__(self, busca=None, conexao=None):
+        self.conexao = conexao
+        self.busca = termo_busca(busca)
+        self.indice_ordem = 0
+        self.decrescente = False
+
+    def ordenar(self, indice, decrescente=False):
+        if ORDENACAO_INSUMOS[indice] is None:
+            return False
+        self.indice_ordem = indice
+        self.decrescente = decrescente
+        return True
+
+    def chave(self, linha):
+        return linha[0]
+
+    def _expressao(self):
+        return ORDENACAO_INSUMOS[self.indice_ordem]
+
+    # Valor da expressão de ordenação para uma linha já carregada
+    def _valor_ordem(self, linha):
+        valor = linha[self.indice_ordem + 1]
+        if valor is None and self._expressao().startswith("COALESCE"):
+            return ""
+        return valor
+
+    def _filtro(self):
+        if self.busca:
+            return ["rowid IN (SELECT rowid FROM insumos_fts WHERE insumos_fts MATCH ?)"], [self.busca]
+        return [], []
+
+    def _consultar(self, condicoes, parametros, decrescente, limite, offset=0):
+        expressao = self._expressao()
+        direcao = "DESC" if decrescente else "ASC"
+        filtro, parametros_filtro = self._filtro()
+        condicoes = filtro + condicoes
+        onde = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        return consultar(f'''
+            SELECT {self.COLUNAS} FROM insumos {onde}
+            ORDER BY {expressao} {direcao}, rowid {direcao}
+            LIMIT ? OFFSET ?
+        ''', parametros_filtro + parametros + [limite, offset], Insumo, self.conexao)
+
+    def contar(self):
+        filtro, parametros = self._filtro()
+        onde = f"WHERE {' AND '.join(filtro)}" if filtro else ""
+        return consultar(f"SELECT COUNT(*) FROM insumos {onde}", parametros, conexao=self.conexao)[0][0]
+
+    def buscar(self, inicio, limite):
+        return self._consultar([], [], self.decrescente, limite, inicio)
+
+    def _buscar_vizinhas(self, linha, limite, adiante):
+        # O limite redundante (>= / <=) permite ao SQLite posicionar-se direto no índice
+        decrescente = self.decrescente != (not adiante)
+        comparacao, limite_expressao = ("<", "<=") if decrescente else (">", ">=")
+        expressao = self._expressao()
+        valor = self._valor_ordem(linha)
+        linhas = self._consultar(
+            [f"{expressao} {limite_expressao} ?", f"({expressao}, rowid) {comparacao} (?, ?)"],
+            [valor, valor, linha[0]], decrescente, limite)
+        return linhas if adiante else linhas[::-1]
+
+    def buscar_apos(self, linha, limite):
+        return self._buscar_vizinhas(linha, limite, adiante=True)
+
+    def buscar_antes(self, linha, limite):
+        return self._buscar_vizinhas(linha, limite, adiante=False)
+
+# Fonte de dados do resultado de uma busca textual
+# Enquanto o usuário não escolhe uma coluna, os resultados vêm por relevância (bm25, com peso
+# maior para código e nome); ao clicar num cabeçalho, volta à ordenação indexada da FonteInsumos.
+class FonteBuscaInsumos(FonteInsumos):
+    PESOS = "bm25(insumos_fts, 10.0, 5.0, 1.0, 1.0)"
+
+    def __init__(self, busca, conexao=None):
+        super().__init__(busca, conexao)
+        self.por_relevancia = True
+
+    @property
+    def paginacao_por_chave(self):
+        return not self.por_relevancia
+
+    def ordenar(self, indice, decrescente=False):
+        if not super().ordenar(indice, decrescente):
+            return False
+        self.por_relevancia = False
+        return True
+
+    def contar(self):
+        if not self.busca:
+            return 0
+        return super().contar()
+
+    def buscar(self, inicio, limite):
+        if not self.busca:
+            return []
+        if not self.por_relevancia:
+            return super().buscar(inicio, limite)
+        return consultar(f'''
+            SELECT {colunas_insumo("insumos")} FROM insumos_fts
+            JOIN insumos ON insumos.rowid = insumos_fts.rowid
+            WHERE insumos_fts MATCH ?
+            ORDER BY {self.PESOS}, insumos.rowid
+            LIMIT ? OFFSET ?
+        ''', (self.busca, limite, inicio), Insumo, self.conexao)
@@ -0,0 +1,7 @@
+# Benchmarks do aplicativo com clínicas sintéticas
+# Gera planilhas no formato do ESTOQUE.xlsx e bancos de dados em várias escalas e mede as
+# operações principais sem interface gráfica. Os resultados saem em JSON para comparar versões:
+#
+#   python -m benchmarks medir --escala pequena --saida base.json
+#   python -m benchmarks medir --escala pequena --saida novo.json
+#   python -m benchmarks comparar base.json novo.json
@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import banco
+from benchmarks import dados
+
+# Linha de comando dos benchmarks (veja benchmarks/__init__.py)
+
+# Variação acima da qual `comparar` aponta uma regressão (0.2 = 20% mais lento)
+TOLERANCIA = 0.2
+# Diferença mínima (ms) para contar como regressão; abaixo disso é ruído de medição
+DIFERENCA_MINIMA_MS = 1.0
+
+# Linhas buscadas por tela na tabela virtual (janela visível + margem)
+LINHAS_TELA = 70
+
+# Função para medir uma operação: `repeticoes` execuções, com preparar() antes de cada uma
+def medir(funcao, repeticoes, preparar=None):
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        "repeticoes": repeticoes,
+        "min_ms": round(min(tempos), 3),
+        "mediana_ms": round(statistics.median(tempos), 3),
+        "max_ms": round(max(tempos), 3),
+    }
+
+def remover_banco(caminho):
+    banco.fechar_conexao()
+    for sufixo in ("", "-wal", "-shm"):
+        if os.path.exists(caminho + sufixo):
+            os.remove(caminho + sufixo)
+
+# Benchmarks da planilha: importação inicial, reimportação sem mudanças e forçada
+def medir_importacao(pasta, planilha, repeticoes):
+    from importacao import importar_planilha
+
+    caminho = os.path.join(pasta, "importacao.db")
+
+    def banco_vazio():
+        remover_banco(caminho)
+        banco.CAMINHO_BANCO = caminho
+        banco.criar_tabelas()
+
+    resultados = {"importar_planilha_inicial": medir(lambda: importar_planilha(planilha), repeticoes, banco_vazio)}
+    resultados["importar_planilha_inalterada"] = medir(lambda: importar_planilha(planilha), repeticoes)
+    resultados["importar_planilha_forcada"] = medir(lambda: importar_planilha(planilha, forcar=True), repeticoes)
+    remover_banco(caminho)
+    return resultados
+
+# Benchmarks que leem o banco sintético: telas, alertas, histórico, exportação e relatório
+def medir_consultas(pasta, caminho_banco, repeticoes):
+    from exportacao import exportar_para_excel
+    from relatorios import gerar_relatorio_pdf
+
+    banco.CAMINHO_BANCO = caminho_banco
+    resultados = {}
+
+    def primeira_tela(fonte):
+        fonte.contar()
+        return fonte.buscar(0, LINHAS_TELA)
+
+    resultados["monitor_primeira_pagina"] = medir(lambda: primeira_tela(banco.FonteInsumos()), repeticoes)
+    for indice, expressao in enumerate(banco.ORDENACAO_INSUMOS):
+        if expressao is None:
+            continue
+        def ordenada(indice=indice):
+            fonte = banco.FonteInsumos()
+            fonte.ordenar(indice, decrescente=True)
+            primeira_tela(fonte)
+        resultados[f"monitor_ordenar_coluna_{indice}"] = medir(ordenada, repeticoes)
+
+    def rolar(paginas=50):
+        fonte = banco.FonteInsumos()
+        linhas = fonte.buscar(0, LINHAS_TELA)
+        for _ in range(paginas):
+            # No fim da tabela volta ao topo, para medir sempre o mesmo número de páginas
+            linhas = fonte.buscar_apos(linhas[-1], LINHAS_TELA) or fonte.buscar(0, LINHAS_TELA)
+    resultados["monitor_rolagem_50_paginas"] = medir(rolar, repeticoes)
+
+    total = banco.FonteInsumos().contar()
+    resultados["monitor_salto_meio"] = medir(lambda: banco.FonteInsumos().buscar(total // 2, LINHAS_TELA), repeticoes)
+    resultados["monitor_busca_textual"] = medir(lambda: primeira_tela(banco.FonteBuscaInsumos("resina a2")), repeticoes)
+    resultados["monitor_busca_textual_prefixo"] = medir(lambda: primeira_tela(banco.FonteBuscaInsumos("an")), repeticoes)
+
+    resultados["alertas_validade"] = medir(lambda: banco.buscar_alertas_validade(banco.DIAS_ALERTA_VALIDADE), repeticoes)
+
+    codigo = banco.consultar("SELECT insumo_codigo FROM historico GROUP BY insumo_codigo ORDER BY COUNT(*) DESC LIMIT 1")[0][0]
+    resultados["historico_primeira_pagina"] = medir(lambda: banco.listar_historico(limite=200), repeticoes)
+    resultados["historico_por_item"] = medir(lambda: banco.listar_historico(codigo=codigo, limite=200), repeticoes)
+
+    def paginar(paginas=20):
+        pagina = banco.listar_historico(limite=200)
+        for _ in range(paginas):
+            pagina = banco.listar_historico(apos=pagina[-1], limite=200)
+    resultados["historico_20_paginas"] = medir(paginar, repeticoes)
+
+    resultados["exportar_para_excel"] = medir(lambda: exportar_para_excel(os.path.join(pasta, "exportacao.xlsx")),
+                                              max(1, repeticoes // 2))
+    inicio = (datetime.now() - timedelta(days=30)).date().isoformat()
+    resultados["relatorio_pdf_30_dias"] = medir(
+        lambda: gerar_relatorio_pdf(os.path.join(pasta, "relatorio.pdf"), inicio=inicio), max(1, repeticoes // 2))
+    banco.fechar_conexao()
+    return resultados
+
+# Versão do código medido (commit do git, se houver)
+def versao_codigo():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+def comando_medir(args):
+    itens, movimentacoes = dados.ESCALAS[args.escala]
+    itens = args.itens or itens
+    movimentacoes = args.movimentacoes or movimentacoes
+    pasta = args.pasta or tempfile.mkdtemp(prefix="benchmark_estoque_")
+    os.makedirs(pasta, exist_ok=True)
+
+    # Dados gerados ficam na pasta e são reaproveitados nas próximas execuções
+    nome = f"{itens}_{movimentacoes}_{args.semente}"
+    planilha = os.path.join(pasta, f"planilha_{nome}.xlsx")
+    caminho_banco = os.path.join(pasta, f"banco_{nome}.db")
+    if not os.path.exists(planilha):
+        print(f"Gerando planilha com {itens} itens...", file=sys.stderr)
+        dados.gravar_planilha(planilha, itens, args.semente)
+    if not os.path.exists(caminho_banco):
+        print(f"Gerando banco com {itens} itens e {movimentacoes} movimentações...", file=sys.stderr)
+        dados.gerar_banco(caminho_banco, itens, movimentacoes, args.semente)
+
+    print("Medindo...", file=sys.stderr)
+    resultados = medir_importacao(pasta, planilha, args.repeticoes)
+    resultados.update(medir_consultas(pasta, caminho_banco, args.repeticoes))
+
+    relatorio = {
+        "versao": versao_codigo(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "escala": {"nome": args.escala, "itens": itens, "movimentacoes": movimentacoes, "semente": args.semente},
+        "resultados": resultados,
+    }
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto)
+        print(f"Resultados gravados em {args.saida}", file=sys.stderr)
+    else:
+        print(texto)
+    return 0
+
+# Compara dois arquivos de resultados pela mediana; código de saída 1 se houver regressão
+def comando_comparar(args):
+    with open(args.base, encoding="utf-8") as arquivo:
+        base = json.load(arquivo)
+    with open(args.novo, encoding="utf-8") as arquivo:
+        novo = json.load(arquivo)
+    if base["escala"] != novo["escala"]:
+        print("Aviso: os resultados são de escalas diferentes", file=sys.stderr)
+
+    regressoes = 0
+    print(f"{'benchmark':40} {'base (ms)':>12} {'novo (ms)':>12} {'variação':>10}")
+    for nome, medido in novo["resultados"].items():
+        anterior = base["resultados"].get(nome)
+        if anterior is None:
+            print(f"{nome:40} {'-':>12} {medido['mediana_ms']:12.2f} {'novo':>10}")
+            continue
+        variacao = medido["mediana_ms"] / anterior["mediana_ms"] - 1 if anterior["mediana_ms"] else 0.0
+        marca = ""
+        if variacao > args.tolerancia and medido["mediana_ms"] - anterior["mediana_ms"] > args.minimo_ms:
+            marca = "  REGRESSÃO"
+            regressoes += 1
+        print(f"{nome:40} {anterior['mediana_ms']:12.2f} {medido['mediana_ms']:12.2f} {variacao:+10.1%}{marca}")
+    return 1 if regressoes else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks do controle de estoque")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    medir_parser = subparsers.add_parser("medir", help="gerar os dados sintéticos (se preciso) e medir")
+    medir_parser.add_argument("--escala", choices=dados.ESCALAS, default="pequena")
+    medir_parser.add_argument("--itens", type=int, help="substitui o número de itens da escala")
+    medir_parser.add_argument("--movimentacoes", type=int, help="substitui o número de movimentações da escala")
+    medir_parser.add_argument("--semente", type=int, default=dados.SEMENTE)
+    medir_parser.add_argument("--repeticoes", type=int, default=5)
+    medir_parser.add_argument("--pasta", help="pasta dos dados gerados (reaproveitados entre execuções)")
+    medir_parser.add_argument("--saida", help="arquivo JSON de resultados (padrão: saída padrão)")
+    medir_parser.set_defaults(funcao=comando_medir)
+
+    comparar_parser = subparsers.add_parser("comparar", help="comparar dois arquivos de resultados")
+    comparar_parser.add_argument("base")
+    comparar_parser.add_argument("novo")
+    comparar_parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    comparar_parser.add_argument("--minimo-ms", type=float, default=DIFERENCA_MINIMA_MS)
+    comparar_parser.set_defaults(funcao=comando_comparar)
+
+    args = parser.parse_args(argv)
+    return args.funcao(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import banco
+from movimentacoes import ENTRADA, SAIDA
+
+# Gerador de dados sintéticos
+# Tudo é gerado a partir de uma semente, então a mesma escala produz sempre os mesmos dados.
+
+# Escalas predefinidas: (itens, movimentações no histórico)
+ESCALAS = {
+    "minima": (1_000, 10_000),
+    "pequena": (1_000, 100_000),
+    "media": (50_000, 1_000_000),
+    "grande": (500_000, 3_000_000),
+}
+
+SEMENTE = 2024
+
+PRODUTOS = [
+    "RESINA COMPOSTA", "ANESTÉSICO LIDOCAÍNA 2%", "AGULHA GENGIVAL CURTA 30G", "ALGINATO TIPO II",
+    "ÁCIDO FOSFÓRICO 37%", "ADESIVO MONOCOMPONENTE", "LUVA DE PROCEDIMENTO", "MÁSCARA DESCARTÁVEL",
+    "SUGADOR DESCARTÁVEL", "FIO DE SUTURA NYLON", "BROCA DIAMANTADA", "CONE DE GUTA PERCHA",
+    "HIPOCLORITO DE SÓDIO 2,5%", "ALGODÃO HIDRÓFILO", "GAZE ESTÉRIL", "CIMENTO DE IONÔMERO DE VIDRO",
+]
+VARIANTES = ["A1", "A2", "A3", "B1", "B2", "C/100", "C/50", "4ML", "500G", "P", "M", "G", "FGM", "3M", "SDI"]
+ESTANTES = list("ABCDEFGH")
+MESES_ABREVIADOS = ["jan", "fev", "mar", "abr", "mai", "jun", "jul", "ago", "set", "out", "nov", "dez"]
+
+# Códigos no formato da planilha real ("06.17.066")
+def gerar_codigos(itens):
+    numeros = np.arange(itens)
+    return pd.Series(numeros).map(lambda n: f"{6 + n // 100_000:02d}.{(n // 1000) % 100:02d}.{n % 1000:03d}")
+
+# Função para gerar o DataFrame de uma planilha de estoque com `itens` linhas
+# Reproduz as irregularidades da planilha real: validades em vários formatos,
+# quantidades com texto ("2cx"), códigos repetidos e linhas sem código.
+def gerar_planilha(itens, semente=SEMENTE):
+    rng = np.random.default_rng(semente)
+    codigos = gerar_codigos(itens)
+    nomes = (pd.Series(rng.choice(PRODUTOS, itens)) + " " + pd.Series(rng.choice(VARIANTES, itens))
+             + " " + pd.Series(np.arange(itens)).astype(str))
+
+    quantidades = pd.Series(rng.integers(0, 200, itens)).astype(object)
+    com_texto = rng.random(itens) < 0.03
+    quantidades[com_texto] = quantidades[com_texto].astype(str) + "cx"
+
+    hoje = pd.Timestamp(datetime.now().date())
+    datas = hoje + pd.to_timedelta(rng.integers(-180, 1500, itens), unit="D")
+    validades = pd.Series(datas.to_pydatetime(), dtype=object)
+    sorteio = rng.random(itens)
+    validades[sorteio < 0.10] = "INDETERMINADO"
+    validades[(sorteio >= 0.10) & (sorteio < 0.13)] = "X"
+    mes_ano = (sorteio >= 0.13) & (sorteio < 0.18)
+    validades[mes_ano] = [f"{d.month:02d}/{d.year % 100:02d}" for d in datas[mes_ano]]
+    mes_nome = (sorteio >= 0.18) & (sorteio < 0.20)
+    validades[mes_nome] = [f"{MESES_ABREVIADOS[d.month - 1]}/{d.year % 100:02d}" for d in datas[mes_nome]]
+
+    df = pd.DataFrame({
+        "CÓDIGO": codigos,
+        "ÍTEM": nomes,
+        "QUANTIDADE": quantidades,
+        "VALIDADE": validades,
+        "ESTANTE/PRATELEIRA": rng.choice(ESTANTES, itens),
+        "OBSERVAÇÃO": np.where(rng.random(itens) < 0.05, "USO RESTRITO", None),
+    })
+    # Algumas linhas sem código e alguns códigos repetidos, como na planilha real
+    df.loc[rng.random(itens) < 0.005, "CÓDIGO"] = None
+    repetidas = rng.choice(itens, max(1, itens // 500), replace=False)
+    df.loc[repetidas, "CÓDIGO"] = df["CÓDIGO"].shift(1)[repetidas]
+    return df
+
+# Função para gravar a planilha sintética no formato do ESTOQUE.xlsx
+def gravar_planilha(caminho, itens, semente=SEMENTE):
+    gerar_planilha(itens, semente).to_excel(caminho, index=False, sheet_name="Página1")
+    return caminho
+
+# Função para gerar um banco de dados completo: insumos e `movimentacoes` linhas de histórico
+# nos últimos `dias` dias (inseridas em lotes, com os gatilhos de agregação ativos)
+def gerar_banco(caminho, itens, movimentacoes, semente=SEMENTE, dias=3 * 365, lote=100_000):
+    rng = np.random.default_rng(semente)
+    banco.CAMINHO_BANCO = caminho
+    banco.criar_tabelas()
+    conexao = banco.obter_conexao()
+
+    insumos = gerar_planilha(itens, semente)
+    insumos = insumos[insumos["CÓDIGO"].notna()].drop_duplicates(subset="CÓDIGO")
+    validades = pd.to_datetime(insumos["VALIDADE"].where(insumos["VALIDADE"].map(lambda v: isinstance(v, datetime))))
+    linhas = pd.DataFrame({
+        "codigo": insumos["CÓDIGO"],
+        "nome": insumos["ÍTEM"],
+        "quantidade": rng.integers(0, 200, len(insumos)),
+        "validade": validades.dt.strftime("%Y-%m-%d"),
+        "localizacao": insumos["ESTANTE/PRATELEIRA"],
+        "observacao": insumos["OBSERVAÇÃO"],
+    })
+    with banco.transacao(conexao):
+        conexao.executemany('''
+            INSERT INTO insumos (codigo, nome, quantidade, validade, localizacao, observacao)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', linhas.astype(object).where(linhas.notna(), None).itertuples(index=False, name=None))
+
+    # Poucos itens concentram a maior parte das movimentações (distribuição de Zipf)
+    codigos = linhas["codigo"].to_numpy()
+    inicio = datetime.now() - timedelta(days=dias)
+    for deslocamento in range(0, movimentacoes, lote):
+        quantidade = min(lote, movimentacoes - deslocamento)
+        indices = np.minimum(rng.zipf(1.3, quantidade) - 1, len(codigos) - 1)
+        segundos = np.sort(rng.integers(0, dias * 86400, quantidade))
+        datas = (pd.Timestamp(inicio) + pd.to_timedelta(segundos, unit="s")).strftime("%Y-%m-%d %H:%M:%S")
+        tipos = np.where(rng.random(quantidade) < 0.7, SAIDA, ENTRADA)
+        with banco.transacao(conexao):
+            conexao.executemany('''
+                INSERT INTO historico (insumo_codigo, tipo, quantidade, data) VALUES (?, ?, ?, ?)
+            ''', zip(codigos[indices].tolist(), tipos.tolist(), rng.integers(1, 10, quantidade).tolist(), list(datas)))
+
+    conexao.execute("ANALYZE")
+    banco.fechar_conexao()
+    return caminho
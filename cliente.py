@@ -0,0 +1,327 @@
+import http.client
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import uuid
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+import banco
+import eventos
+import instrumentacao
+import movimentacoes
+
+# Cliente do serviço de estoque (servico.py), usado pela interface em modo cliente
+# Tem os mesmos métodos de acesso.AcessoLocal e devolve os mesmos tipos, então as telas não
+# mudam. As alterações feitas por esta estação são publicadas em eventos.py como no modo local.
+# Cada thread mantém a sua conexão HTTP aberta (keep-alive), e a lista de itens fica
+# numa cópia local validada pela versão (ETag): enquanto ninguém alterar o estoque, a tela de
+# monitoramento pagina, ordena e busca sem ir ao servidor.
+
+TEMPO_LIMITE = 15  # segundos por requisição
+
+# Erros do serviço; herdam dos erros do sqlite3 para as telas tratarem igual ao modo local
+class ErroServico(sqlite3.DatabaseError):
+    pass
+
+class ConflitoServico(ErroServico, sqlite3.IntegrityError):
+    pass
+
+# Função para separar "host:porta" ou "http://host:porta" em (host, porta)
+def endereco_servidor(texto):
+    url = urlsplit(texto if "//" in texto else f"//{texto}")
+    return url.hostname or "127.0.0.1", url.port or 8765
+
+# Forma comparável de um texto: minúsculo e sem acentos (como o remove_diacritics do FTS5)
+def _normalizar(texto):
+    texto = unicodedata.normalize("NFKD", str(texto).lower())
+    return "".join(letra for letra in texto if not unicodedata.combining(letra))
+
+class ClienteEstoque:
+    remoto = True
+
+    def __init__(self, endereco, tempo_limite=TEMPO_LIMITE):
+        self.host, self.porta = endereco_servidor(endereco)
+        self.descricao = f"serviço {self.host}:{self.porta}"
+        self.tempo_limite = tempo_limite
+        self._local = threading.local()
+        self._conexoes = []
+        self._trava = threading.Lock()
+        # Cópia local da lista de itens: (ETag, versão, lista de banco.Insumo)
+        self._cache = (None, None, [])
+
+    # Conexões HTTP
+
+    def _conexao(self):
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = http.client.HTTPConnection(self.host, self.porta, timeout=self.tempo_limite)
+            self._local.conexao = conexao
+            with self._trava:
+                self._conexoes.append(conexao)
+        return conexao
+
+    def _descartar_conexao(self):
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is not None:
+            conexao.close()
+            self._local.conexao = None
+
+    # Função para fazer uma requisição; devolve (status, cabeçalhos, corpo JSON)
+    # Se a conexão mantida aberta tiver sido fechada pelo servidor, ou a resposta vier cortada ou
+    # malformada (http.client.HTTPException: IncompleteRead, BadStatusLine), tenta de novo numa nova.
+    # A queda pode vir depois de o serviço gravar: as gravações levam um identificador
+    # (servico.CABECALHO_REQUISICAO) e a repetição recebe a resposta da original, sem gravar de novo.
+    def _requisitar(self, metodo, caminho, corpo=None, cabecalhos=None):
+        dados = None if corpo is None else json.dumps(corpo).encode("utf-8")
+        cabecalhos = dict(cabecalhos or {})
+        if dados is not None:
+            cabecalhos["Content-Type"] = "application/json"
+        if metodo != "GET":
+            cabecalhos["X-Requisicao"] = uuid.uuid4().hex
+        inicio = time.perf_counter()
+        for tentativa in range(2):
+            try:
+                conexao = self._conexao()
+                conexao.request(metodo, caminho, body=dados, headers=cabecalhos)
+                resposta = conexao.getresponse()
+                conteudo = resposta.read()
+                break
+            except (http.client.HTTPException, ConnectionResetError, BrokenPipeError) as e:
+                self._descartar_conexao()
+                if tentativa:
+                    raise ErroServico(f"Conexão com o {self.descricao} perdida: {e}")
+            except OSError as e:
+                self._descartar_conexao()
+                raise ErroServico(f"Não foi possível acessar o {self.descricao}: {e}")
+        rota = re.sub(r"/\d+", "/*", caminho.split("?")[0])
+        instrumentacao.registrar("HTTP", f"{metodo} {rota}", (time.perf_counter() - inicio) * 1000)
+        return resposta.status, resposta.headers, json.loads(conteudo) if conteudo else None
+
+    @staticmethod
+    def _verificar(status, resposta):
+        if status == 409:
+            raise ConflitoServico(resposta["erro"])
+        if status >= 400:
+            raise ErroServico((resposta or {}).get("erro", f"Erro HTTP {status}"))
+        return resposta
+
+    def _chamar(self, metodo, caminho, corpo=None):
+        status, _, resposta = self._requisitar(metodo, caminho, corpo)
+        return self._verificar(status, resposta)
+
+    # Função para enviar várias requisições numa só ida e volta
+    # requisicoes: (metodo, caminho, corpo ou None); cabecalhos: caminho -> cabeçalhos extras
+    # Devolve [(status, corpo, cabeçalhos), ...] na mesma ordem
+    def lote(self, requisicoes, cabecalhos=None):
+        corpo = {"requisicoes": [
+            {"metodo": metodo, "caminho": caminho, "corpo": dados, "cabecalhos": (cabecalhos or {}).get(caminho)}
+            for metodo, caminho, dados in requisicoes
+        ]}
+        respostas = self._chamar("POST", "/lote", corpo)["respostas"]
+        return [(resposta["status"], resposta["corpo"], resposta["cabecalhos"]) for resposta in respostas]
+
+    # Função para encerrar as conexões (ao fechar o aplicativo)
+    def encerrar(self):
+        with self._trava:
+            conexoes, self._conexoes = self._conexoes, []
+        for conexao in conexoes:
+            conexao.close()
+
+    # O serviço exporta a planilha depois de cada alteração
+    def agendar_exportacao(self):
+        pass
+
+    # Lista de itens com cache local
+
+    def _guardar_lista(self, etag, resposta):
+        insumos = [banco.Insumo._make(linha) for linha in resposta["insumos"]]
+        self._cache = (etag, resposta["versao"], insumos)
+        return insumos
+
+    # Lista completa de itens; só é baixada de novo quando a versão no servidor muda (ETag)
+    def listar_insumos(self):
+        etag, _, insumos = self._cache
+        status, cabecalhos, resposta = self._requisitar("GET", "/insumos", cabecalhos={"If-None-Match": etag} if etag else None)
+        if status == 304:
+            return insumos
+        return self._guardar_lista(cabecalhos.get("ETag"), self._verificar(status, resposta))
+
+    @property
+    def versao_insumos(self):
+        return self._cache[1]
+
+    # Função para sincronizar ao abrir a interface: lista de itens e alertas numa só requisição
+    # Devolve (número de itens, número de alertas)
+    def sincronizar(self, dias_alerta=banco.DIAS_ALERTA_VALIDADE):
+        etag = self._cache[0]
+        (status_lista, lista, cabecalhos), (status_alertas, alertas, _) = self.lote(
+            [("GET", "/insumos", None), ("GET", f"/alertas?dias={dias_alerta}", None)],
+            cabecalhos={"/insumos": {"If-None-Match": etag}} if etag else None)
+        if status_lista != 304:
+            self._guardar_lista(cabecalhos.get("ETag"), self._verificar(status_lista, lista))
+        return len(self._cache[2]), len(self._verificar(status_alertas, alertas))
+
+    def FonteInsumos(self):
+        return FonteInsumosRemota(self)
+
+    def FonteBuscaInsumos(self, busca):
+        return FonteInsumosRemota(self, busca)
+
+    def listar_codigos_nomes(self):
+        return sorted(((insumo.codigo, insumo.nome) for insumo in self.listar_insumos()),
+                      key=lambda par: par[0] or "")
+
+    # Insumos
+
+    def obter_insumo(self, rowid):
+        status, _, resposta = self._requisitar("GET", f"/insumos/{int(rowid)}")
+        if status == 404:
+            return None
+        return banco.Insumo._make(self._verificar(status, resposta))
+
+    @staticmethod
+    def _campos(codigo, nome, quantidade, validade, localizacao, observacao, estoque_minimo, estoque_alvo):
+        return {"codigo": codigo, "nome": nome, "quantidade": quantidade, "validade": validade,
+                "localizacao": localizacao, "observacao": observacao,
+                "estoque_minimo": estoque_minimo, "estoque_alvo": estoque_alvo}
+
+    # Código de um item na cópia local da lista (para os eventos de alteração e exclusão)
+    def _codigo_em_cache(self, rowid):
+        for insumo in self._cache[2]:
+            if insumo.rowid == rowid:
+                return insumo.codigo
+        return None
+
+    # O serviço devolve o item como ficou gravado (com a situação do estoque calculada no banco)
+    def inserir_insumo(self, codigo, nome, quantidade, validade, localizacao, observacao,
+                       estoque_minimo=None, estoque_alvo=None):
+        resposta = self._chamar("POST", "/insumos", self._campos(codigo, nome, quantidade, validade, localizacao,
+                                                                 observacao, estoque_minimo, estoque_alvo))
+        eventos.publicar(eventos.InsumoAlterado(eventos.INSUMO_INSERIDO, resposta["rowid"], None,
+                                                banco.Insumo._make(resposta["insumo"])))
+        return resposta["rowid"]
+
+    def atualizar_insumo(self, rowid, codigo, nome, quantidade, validade, localizacao, observacao,
+                         estoque_minimo=None, estoque_alvo=None):
+        resposta = self._chamar("PUT", f"/insumos/{int(rowid)}",
+                                self._campos(codigo, nome, quantidade, validade, localizacao, observacao,
+                                             estoque_minimo, estoque_alvo))
+        if resposta.get("insumo") is not None:
+            eventos.publicar(eventos.InsumoAlterado(eventos.INSUMO_ALTERADO, rowid, self._codigo_em_cache(rowid),
+                                                    banco.Insumo._make(resposta["insumo"])))
+
+    def excluir_insumo(self, rowid):
+        self._chamar("DELETE", f"/insumos/{int(rowid)}")
+        eventos.publicar(eventos.InsumoAlterado(eventos.INSUMO_EXCLUIDO, rowid, self._codigo_em_cache(rowid), None))
+
+    # Movimentações, histórico, alertas e previsão
+
+    def aplicar_movimentacoes(self, linhas, parcial=False):
+        linhas = [movimentacoes.LinhaMovimentacao(*linha) for linha in linhas]
+        resposta = self._chamar("POST", "/movimentacoes", {"linhas": [list(linha) for linha in linhas], "parcial": parcial})
+        resultados = [movimentacoes.ResultadoMovimentacao(linha, *resultado)
+                      for linha, resultado in zip(linhas, resposta["resultados"])]
+        self._publicar_lancadas(resultados)
+        return resultados
+
+    # O serviço não devolve os ids nem a hora gravada: as movimentações do evento vão sem id e
+    # com a hora desta estação, uma por linha (a divisão de uma saída entre lotes, feita no
+    # serviço, só aparece quando o histórico é consultado de novo)
+    def _publicar_lancadas(self, resultados):
+        aplicados = [resultado for resultado in resultados if resultado.aplicada]
+        if not aplicados or not eventos.tem_assinantes():
+            return
+        data = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        nomes = {insumo.codigo: insumo.nome for insumo in self._cache[2]}
+        eventos.publicar(eventos.MovimentacoesLancadas(
+            {resultado.linha.codigo: resultado.saldo for resultado in aplicados},
+            [banco.Movimentacao(None, resultado.linha.codigo, nomes.get(resultado.linha.codigo), resultado.linha.tipo,
+                                resultado.linha.quantidade, data, resultado.linha.lote) for resultado in aplicados]))
+
+    def listar_codigos_barras(self):
+        return [tuple(par) for par in self._chamar("GET", "/codigos_barras")]
+
+    def associar_codigo_barras(self, barras, codigo):
+        self._chamar("POST", "/codigos_barras", {"barras": barras, "codigo": codigo})
+
+    def listar_historico(self, inicio=None, fim=None, codigo=None, tipo=None, apos=None, limite=None):
+        parametros = {"inicio": inicio, "fim": fim, "codigo": codigo, "tipo": tipo, "limite": limite}
+        if apos is not None:
+            parametros.update(apos_data=apos.data, apos_id=apos.id)
+        consulta = urlencode({chave: valor for chave, valor in parametros.items() if valor is not None})
+        return [banco.Movimentacao._make(linha) for linha in self._chamar("GET", f"/historico?{consulta}")]
+
+    def buscar_alertas_validade(self, dias=banco.DIAS_ALERTA_VALIDADE):
+        return [banco.AlertaValidade._make(linha) for linha in self._chamar("GET", f"/alertas?dias={int(dias)}")]
+
+    def listar_estoque_baixo(self):
+        return [banco.Insumo._make(linha) for linha in self._chamar("GET", "/estoque_baixo")]
+
+    def listar_lotes(self, codigo):
+        return [banco.Lote._make(linha) for linha in self._chamar("GET", f"/lotes?{urlencode({'codigo': codigo})}")]
+
+    def listar_previsao_reposicao(self):
+        return [banco.PrevisaoReposicao._make(linha) for linha in self._chamar("GET", "/previsao")]
+
+    def atualizar_previsao(self):
+        return self._chamar("POST", "/previsao/atualizar")["recalculados"]
+
+# Fonte de dados da tela de monitoramento sobre a cópia local da lista de itens
+# Mesma interface de banco.FonteInsumos. A cada contar() (abrir, recarregar) a lista é validada
+# no servidor; ordenação, busca e paginação são feitas aqui, sem novas requisições.
+class FonteInsumosRemota:
+    paginacao_por_chave = False
+
+    def __init__(self, cliente, busca=None):
+        self.cliente = cliente
+        self.palavras = [_normalizar(palavra) for palavra in (busca or "").split()]
+        self.busca = busca
+        self.indice_ordem = None if self.palavras else 0  # busca: ordem da lista até escolher uma coluna
+        self.decrescente = False
+        self._versao = None
+        self._linhas = []
+
+    def ordenar(self, indice, decrescente=False):
+        if banco.ORDENACAO_INSUMOS[indice] is None:
+            return False
+        self.indice_ordem = indice
+        self.decrescente = decrescente
+        self._versao = None  # reordenar na próxima leitura
+        return True
+
+    def chave(self, linha):
+        return linha[0]
+
+    # Cada palavra digitada é prefixo de alguma palavra do código, nome, localização ou observação
+    def _atende(self, insumo):
+        if not self.palavras:
+            return True
+        texto = _normalizar(" ".join(str(valor) for valor in insumo[1:7] if valor is not None))
+        palavras_insumo = texto.replace("-", " ").replace(".", " ").replace("/", " ").split()
+        return all(any(palavra.startswith(prefixo) for palavra in palavras_insumo) for prefixo in self.palavras)
+
+    def _atualizar(self):
+        insumos = self.cliente.listar_insumos()
+        if self._versao == self.cliente.versao_insumos and self._versao is not None:
+            return
+        linhas = [insumo for insumo in insumos if self._atende(insumo)]
+        if self.indice_ordem is not None:
+            coluna = self.indice_ordem + 1
+            coalesce = banco.ORDENACAO_INSUMOS[self.indice_ordem].startswith("COALESCE")
+            linhas.sort(key=lambda linha: (("" if coalesce else 0) if linha[coluna] is None else linha[coluna], linha[0]),
+                        reverse=self.decrescente)
+        self._linhas = linhas
+        self._versao = self.cliente.versao_insumos
+
+    def contar(self):
+        self._atualizar()
+        return len(self._linhas)
+
+    def buscar(self, inicio, limite):
+        if self._versao is None:
+            self._atualizar()
+        return self._linhas[inicio:inicio + limite]
@@ -0,0 +1,180 @@
+import csv
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import banco
+from instrumentacao import medido
+
+# Consolidação das planilhas das filiais
+# Cada clínica do grupo manda a sua planilha no formato do ESTOQUE.xlsx. Ler um .xlsx com o
+# openpyxl ocupa um núcleo só e é a parte demorada, então cada arquivo é lido, validado e
+# normalizado (importacao.normalizar_planilha) num processo separado; o processo principal só
+# grava, numa única transação, o retrato de todas as filiais na tabela estoque_filiais.
+#
+# A filial é o nome do arquivo sem a extensão ("Centro.xlsx" -> filial "Centro"). Um arquivo com
+# erro não altera o retrato anterior da sua filial; as linhas inválidas de um arquivo lido são
+# rejeitadas uma a uma, como na importação da planilha principal.
+
+EXTENSOES_PLANILHA = (".xlsx", ".xlsm", ".xls")
+ABA_PADRAO = "Página1"  # se a planilha não tiver esta aba, usa a primeira
+COLUNAS_OBRIGATORIAS = ("CÓDIGO", "ÍTEM")
+
+# Situação de um arquivo na consolidação
+@dataclass
+class ArquivoFilial:
+    arquivo: str
+    filial: str
+    itens: int = 0
+    linhas_rejeitadas: list = field(default_factory=list)  # (linha na planilha, motivo)
+    erro: str = None
+
+    def situacao(self):
+        if self.erro:
+            return f"Erro: {self.erro}"
+        if self.linhas_rejeitadas:
+            return f"Consolidado com {len(self.linhas_rejeitadas)} linha(s) rejeitada(s)"
+        return "Consolidado"
+
+# Resultado de uma consolidação: um ArquivoFilial por arquivo, na ordem do nome
+@dataclass
+class ResultadoConsolidacao:
+    arquivos: list = field(default_factory=list)
+
+    @property
+    def consolidados(self):
+        return [arquivo for arquivo in self.arquivos if not arquivo.erro]
+
+    @property
+    def com_erro(self):
+        return [arquivo for arquivo in self.arquivos if arquivo.erro]
+
+    def resumo(self):
+        if not self.arquivos:
+            return "Nenhuma planilha encontrada na pasta."
+        itens = sum(arquivo.itens for arquivo in self.consolidados)
+        rejeitadas = sum(len(arquivo.linhas_rejeitadas) for arquivo in self.arquivos)
+        return (f"{len(self.consolidados)} filiais consolidadas ({itens} itens), "
+                f"{len(self.com_erro)} arquivos com erro, {rejeitadas} linhas rejeitadas")
+
+    # Linhas do relatório de erros: (arquivo, filial, linha na planilha ou vazio, motivo)
+    def linhas_relatorio(self):
+        for arquivo in self.arquivos:
+            if arquivo.erro:
+                yield arquivo.arquivo, arquivo.filial, "", arquivo.erro
+            for linha, motivo in arquivo.linhas_rejeitadas:
+                yield arquivo.arquivo, arquivo.filial, linha, motivo
+
+COLUNAS_RELATORIO = ["ARQUIVO", "FILIAL", "LINHA", "MOTIVO"]
+
+# Função para gravar o relatório de erros em CSV (";" e BOM, como a exportação de dados)
+def gravar_relatorio(resultado, nome_arquivo):
+    with open(nome_arquivo, "w", encoding="utf-8-sig", newline="") as arquivo:
+        escritor = csv.writer(arquivo, delimiter=";")
+        escritor.writerow(COLUNAS_RELATORIO)
+        escritor.writerows(resultado.linhas_relatorio())
+    return nome_arquivo
+
+def filial_do_arquivo(caminho):
+    return os.path.splitext(os.path.basename(caminho))[0].strip()
+
+# Planilhas da pasta, na ordem do nome (arquivos temporários do Excel, "~$...", ficam de fora)
+def listar_planilhas(pasta):
+    return sorted(
+        os.path.join(pasta, nome) for nome in os.listdir(pasta)
+        if nome.lower().endswith(EXTENSOES_PLANILHA) and not nome.startswith("~$")
+    )
+
+# Lê, valida e normaliza uma planilha (roda num processo do pool)
+# Retorna (ArquivoFilial, tuplas prontas para o INSERT na ordem de importacao.COLUNAS_INSUMO)
+def ler_planilha_filial(caminho, aba=ABA_PADRAO):
+    import pandas as pd
+    from importacao import COLUNAS_INSUMO, normalizar_planilha, para_tuplas
+
+    relatorio = ArquivoFilial(os.path.basename(caminho), filial_do_arquivo(caminho))
+    try:
+        with pd.ExcelFile(caminho) as planilha:
+            df = planilha.parse(aba if aba in planilha.sheet_names else planilha.sheet_names[0])
+    except Exception as e:
+        relatorio.erro = f"não foi possível ler a planilha ({e})"
+        return relatorio, []
+
+    faltando = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in df.columns]
+    if faltando:
+        relatorio.erro = f"colunas ausentes: {', '.join(faltando)}"
+        return relatorio, []
+
+    df, rejeitadas = normalizar_planilha(df)
+    relatorio.itens = len(df)
+    relatorio.linhas_rejeitadas = rejeitadas
+    return relatorio, para_tuplas(df, COLUNAS_INSUMO)
+
+# Função para consolidar as planilhas de uma pasta no estoque das filiais
+# processos: tamanho do pool (padrão: um por núcleo, no máximo um por arquivo)
+# progresso(lidos, total) e cancelado (threading.Event) são opcionais, para a interface
+# Retorna ResultadoConsolidacao (None se cancelada antes de gravar)
+@medido("Importação", "consolidação das filiais")
+def consolidar_filiais(pasta, aba=ABA_PADRAO, processos=None, progresso=None, cancelado=None, conexao=None):
+    caminhos = listar_planilhas(pasta)
+    lidos = {}
+    processos = min(processos or os.cpu_count() or 1, len(caminhos))
+
+    if processos <= 1:
+        for feitos, caminho in enumerate(caminhos, 1):
+            if cancelado is not None and cancelado.is_set():
+                return None
+            lidos[caminho] = ler_planilha_filial(caminho, aba)
+            if progresso is not None:
+                progresso(feitos, len(caminhos))
+    elif caminhos:
+        # "spawn": os processos não herdam as threads, o Tk nem as conexões SQLite deste processo
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as pool:
+            futuros = {pool.submit(ler_planilha_filial, caminho, aba): caminho for caminho in caminhos}
+            for feitos, futuro in enumerate(as_completed(futuros), 1):
+                if cancelado is not None and cancelado.is_set():
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    return None
+                caminho = futuros[futuro]
+                try:
+                    lidos[caminho] = futuro.result()
+                except Exception as e:  # processo interrompido (memória, arquivo corrompido)
+                    lidos[caminho] = ArquivoFilial(os.path.basename(caminho), filial_do_arquivo(caminho),
+                                                   erro=f"falha ao processar o arquivo ({e})"), []
+                if progresso is not None:
+                    progresso(feitos, len(caminhos))
+
+    resultado = ResultadoConsolidacao([lidos[caminho][0] for caminho in caminhos])
+    _marcar_filiais_repetidas(resultado)
+    _gravar(resultado, {lidos[caminho][0].filial: lidos[caminho][1] for caminho in caminhos
+                        if not lidos[caminho][0].erro}, conexao)
+    return resultado
+
+# Dois arquivos com o mesmo nome de filial ("Centro.xlsx" e "Centro.xls"): nenhum é gravado
+def _marcar_filiais_repetidas(resultado):
+    contagem = {}
+    for arquivo in resultado.arquivos:
+        contagem[arquivo.filial.casefold()] = contagem.get(arquivo.filial.casefold(), 0) + 1
+    for arquivo in resultado.arquivos:
+        if not arquivo.erro and contagem[arquivo.filial.casefold()] > 1:
+            arquivo.erro = "outro arquivo da pasta tem o mesmo nome de filial"
+
+# Grava as filiais lidas numa única transação: o retrato anterior de cada uma é substituído
+def _gravar(resultado, tuplas_por_filial, conexao=None):
+    agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with banco.transacao(conexao) as conexao:
+        for arquivo in resultado.consolidados:
+            conexao.execute("DELETE FROM estoque_filiais WHERE filial = ?", (arquivo.filial,))
+            conexao.executemany('''
+                INSERT INTO estoque_filiais (filial, codigo, nome, quantidade, validade, localizacao, observacao)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', ((arquivo.filial,) + tupla for tupla in tuplas_por_filial[arquivo.filial]))
+            conexao.execute('''
+                INSERT INTO filiais (filial, arquivo, itens, importado_em) VALUES (?, ?, ?, ?)
+                ON CONFLICT (filial) DO UPDATE SET
+                    arquivo = excluded.arquivo,
+                    itens = excluded.itens,
+                    importado_em = excluded.importado_em
+            ''', (arquivo.filial, arquivo.arquivo, arquivo.itens, agora))
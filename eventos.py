@@ -0,0 +1,77 @@
+import queue
+import threading
+from collections import namedtuple
+
+# Avisos de alteração dos dados para as telas abertas
+# A camada de dados publica um evento por alteração confirmada (item cadastrado, alterado ou
+# excluído; guia de movimentações lançada) e cada tela assinante atualiza só as linhas afetadas,
+# em vez de recarregar a tabela inteira. No modo local os eventos saem de banco.py e
+# movimentacoes.py quando a transação é confirmada; no modo cliente, de cliente.py.
+#
+# Os assinantes são chamados sempre na thread do Tk: um evento publicado numa thread de trabalho
+# fica na fila até entregar_pendentes(), chamada pelo laço do ExecutorTarefas (tarefas.py) antes
+# de entregar o resultado da tarefa que fez a alteração.
+
+INSUMO_INSERIDO = "inserido"
+INSUMO_ALTERADO = "alterado"
+INSUMO_EXCLUIDO = "excluido"
+
+# Um item cadastrado, alterado ou excluído
+# insumo: banco.Insumo como ficou (None na exclusão); codigo_anterior: código antes da
+# alteração ou da exclusão (None no cadastro)
+InsumoAlterado = namedtuple("InsumoAlterado", "tipo rowid codigo_anterior insumo")
+
+# Uma guia lançada: saldos {codigo: quantidade após a guia} e as banco.Movimentacao gravadas
+MovimentacoesLancadas = namedtuple("MovimentacoesLancadas", "saldos movimentacoes")
+
+_trava = threading.Lock()
+_assinaturas = []  # (tipos de evento, função)
+_pendentes = queue.SimpleQueue()
+_thread_interface = threading.main_thread()
+
+def tem_assinantes():
+    return bool(_assinaturas)
+
+# Função para assinar eventos; tipos: classes de evento (None = todas)
+# dono: widget da tela; a assinatura é cancelada quando ele for destruído
+# Retorna a assinatura, para cancelar()
+def assinar(funcao, tipos=None, dono=None):
+    assinatura = (tuple(tipos) if tipos else None, funcao)
+    with _trava:
+        _assinaturas.append(assinatura)
+    if dono is not None:
+        dono.bind("<Destroy>", lambda e: e.widget is dono and cancelar(assinatura), add="+")
+    return assinatura
+
+def cancelar(assinatura):
+    with _trava:
+        if assinatura in _assinaturas:
+            _assinaturas.remove(assinatura)
+
+# Função para publicar um evento (de qualquer thread)
+def publicar(evento):
+    if not _assinaturas:
+        return
+    if threading.current_thread() is _thread_interface:
+        _entregar(evento)
+    else:
+        _pendentes.put(evento)
+
+# Entrega os eventos publicados por threads de trabalho (chamada na thread do Tk)
+def entregar_pendentes():
+    while True:
+        try:
+            evento = _pendentes.get_nowait()
+        except queue.Empty:
+            return
+        _entregar(evento)
+
+def _entregar(evento):
+    with _trava:
+        assinaturas = list(_assinaturas)
+    for tipos, funcao in assinaturas:
+        if tipos is None or isinstance(evento, tipos):
+            try:
+                funcao(evento)
+            except Exception as e:
+                print(f"Erro ao atualizar a tela após {type(evento).__name__}: {e}")
@@ -0,0 +1,264 @@
+import csv
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import banco
+from instrumentacao import medido
+from validade import TEXTO_INDETERMINADO
+
+# Planilha gerada a partir do banco
+ARQUIVO_EXPORTACAO = "ESTOQUE_ATUALIZADO.xlsx"
+
+# Tempo de espera (segundos) sem novas alterações antes de exportar
+ESPERA_EXPORTACAO = 2.0
+
+# Máscara de permissões do processo (os.umask só é lido trocando o valor, então é feito uma vez)
+_MASCARA = os.umask(0)
+os.umask(_MASCARA)
+
+# Função para gravar um arquivo de forma atômica: escreve num temporário na mesma pasta e
+# renomeia por cima do destino, assim quem abrir a planilha nunca vê um arquivo pela metade
+# O mkstemp cria o temporário só com permissão do dono; antes de renomear ele recebe as
+# permissões do arquivo substituído (ou as de um arquivo novo, se o destino ainda não existe)
+def gravar_atomicamente(nome_arquivo, escrever):
+    pasta = os.path.dirname(os.path.abspath(nome_arquivo))
+    sufixo = os.path.splitext(nome_arquivo)[1]
+    descritor, temporario = tempfile.mkstemp(prefix=".~", suffix=sufixo, dir=pasta)
+    os.close(descritor)
+    try:
+        escrever(temporario)
+        try:
+            modo = os.stat(nome_arquivo).st_mode & 0o7777
+        except FileNotFoundError:
+            modo = 0o666 & ~_MASCARA
+        os.chmod(temporario, modo)
+        os.replace(temporario, nome_arquivo)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+# Colunas da planilha de estoque: as mesmas do ESTOQUE.xlsx e os níveis de estoque de cada item,
+# para a exportação poder ser reimportada (importacao.COLUNAS_PLANILHA e COLUNAS_NIVEIS)
+COLUNAS_ESTOQUE = ["CÓDIGO", "ÍTEM", "QUANTIDADE", "VALIDADE", "ESTANTE/PRATELEIRA", "OBSERVAÇÃO",
+                   "ESTOQUE MÍNIMO", "ESTOQUE ALVO"]
+COLUNAS_HISTORICO = ["ID", "CÓDIGO", "ÍTEM", "TIPO", "QUANTIDADE", "DATA", "LOTE"]
+COLUNAS_ALERTAS = ["CÓDIGO", "ÍTEM", "LOTE", "QUANTIDADE", "VALIDADE", "ESTANTE/PRATELEIRA", "SITUAÇÃO"]
+
+# Largura (em caracteres) de cada coluna nas planilhas
+LARGURAS_ESTOQUE = [12, 45, 12, 14, 20, 30, 16, 14]
+LARGURAS_HISTORICO = [10, 12, 45, 10, 12, 20, 14]
+LARGURAS_ALERTAS = [12, 45, 14, 12, 14, 20, 12]
+
+# Linhas lidas do banco por vez: a memória usada não depende do tamanho das tabelas
+TAMANHO_LOTE = 2000
+TAMANHO_LOTE_PARQUET = 50_000  # também o tamanho dos grupos de linhas do arquivo
+
+FORMATO_DATA_EXCEL = "DD/MM/YYYY"
+FORMATO_DATA_HORA_EXCEL = "DD/MM/YYYY HH:MM:SS"
+
+# Pasta de trabalho do openpyxl em modo "somente escrita": cada linha vai direto para o arquivo
+# (XML em streaming) em vez de ficar guardada em memória como célula
+def _nova_pasta_trabalho():
+    from openpyxl import Workbook
+    return Workbook(write_only=True)
+
+# Função para escrever uma aba: cabeçalho em negrito, congelado, e as linhas do gerador
+def _escrever_aba(pasta_trabalho, titulo, colunas, larguras, linhas):
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    aba = pasta_trabalho.create_sheet(titulo)
+    for indice, largura in enumerate(larguras, start=1):
+        aba.column_dimensions[get_column_letter(indice)].width = largura
+    aba.freeze_panes = "A2"
+    negrito = Font(bold=True)
+    cabecalho = []
+    for coluna in colunas:
+        celula = WriteOnlyCell(aba, value=coluna)
+        celula.font = negrito
+        cabecalho.append(celula)
+    aba.append(cabecalho)
+    for linha in linhas(aba):
+        aba.append(linha)
+    return aba
+
+def _celula_data(aba, valor, formato):
+    from openpyxl.cell import WriteOnlyCell
+
+    celula = WriteOnlyCell(aba, value=valor)
+    celula.number_format = formato
+    return celula
+
+# Validade como data do Excel; sem validade, o texto usado na planilha original
+def _validade_excel(aba, validade):
+    if validade is None:
+        return TEXTO_INDETERMINADO
+    return _celula_data(aba, datetime.fromisoformat(validade), FORMATO_DATA_EXCEL)
+
+def _linhas_estoque(aba):
+    for lote in banco.lotes_insumos(TAMANHO_LOTE):
+        for insumo in lote:
+            yield [insumo.codigo, insumo.nome, insumo.quantidade, _validade_excel(aba, insumo.validade),
+                   insumo.localizacao, insumo.observacao, insumo.estoque_minimo, insumo.estoque_alvo]
+
+def _linhas_historico(inicio, fim):
+    def linhas(aba):
+        for lote in banco.lotes_historico(inicio, fim, tamanho_lote=TAMANHO_LOTE):
+            for movimentacao in lote:
+                yield [movimentacao.id, movimentacao.insumo_codigo, movimentacao.nome, movimentacao.tipo,
+                       movimentacao.quantidade,
+                       _celula_data(aba, datetime.fromisoformat(movimentacao.data), FORMATO_DATA_HORA_EXCEL),
+                       movimentacao.lote]
+    return linhas
+
+def _linhas_alertas(dias):
+    def linhas(aba):
+        hoje = datetime.now().date().isoformat()
+        for alerta in banco.buscar_alertas_validade(dias):
+            situacao = "VENCIDO" if alerta.validade < hoje else "VENCENDO"
+            yield [alerta.codigo, alerta.nome, alerta.lote, alerta.quantidade, _validade_excel(aba, alerta.validade),
+                   alerta.localizacao, situacao]
+    return linhas
+
+# Função para exportar os dados do banco para a planilha Excel
+# Só o estoque, na aba "Página1" do formato do ESTOQUE.xlsx (é a exportação feita a cada alteração)
+@medido("Exportação")
+def exportar_para_excel(nome_arquivo=ARQUIVO_EXPORTACAO):
+    def escrever(caminho):
+        pasta_trabalho = _nova_pasta_trabalho()
+        _escrever_aba(pasta_trabalho, "Página1", COLUNAS_ESTOQUE, LARGURAS_ESTOQUE, _linhas_estoque)
+        pasta_trabalho.save(caminho)
+
+    gravar_atomicamente(nome_arquivo, escrever)
+    return nome_arquivo
+
+# Função para exportar uma pasta de trabalho completa: estoque, histórico e alertas de validade
+# inicio/fim: período do histórico (datas ISO, inclusive); sem eles, o histórico inteiro
+@medido("Exportação", "pasta de trabalho completa")
+def exportar_pasta_trabalho(nome_arquivo, inicio=None, fim=None, dias_alerta=banco.DIAS_ALERTA_VALIDADE):
+    def escrever(caminho):
+        pasta_trabalho = _nova_pasta_trabalho()
+        _escrever_aba(pasta_trabalho, "Estoque", COLUNAS_ESTOQUE, LARGURAS_ESTOQUE, _linhas_estoque)
+        _escrever_aba(pasta_trabalho, "Histórico", COLUNAS_HISTORICO, LARGURAS_HISTORICO, _linhas_historico(inicio, fim))
+        _escrever_aba(pasta_trabalho, "Alertas de Validade", COLUNAS_ALERTAS, LARGURAS_ALERTAS, _linhas_alertas(dias_alerta))
+        pasta_trabalho.save(caminho)
+
+    gravar_atomicamente(nome_arquivo, escrever)
+    return nome_arquivo
+
+# Exportação de dados brutos (contabilidade): um arquivo por tabela, valores como estão no banco
+# (datas ISO, validade vazia quando indeterminada). CSV com ";" e BOM, que o Excel em português
+# abre direto; Parquet precisa do pacote opcional pyarrow.
+FORMATOS_DADOS = ("csv", "parquet")
+
+# Tabelas exportadas: nome do arquivo -> (colunas, função que devolve os lotes de linhas)
+def _tabelas_dados(inicio, fim, tamanho_lote):
+    return {
+        "insumos": (list(banco.Insumo._fields), lambda: banco.lotes_insumos(tamanho_lote)),
+        "historico": (list(banco.Movimentacao._fields), lambda: banco.lotes_historico(inicio, fim, tamanho_lote=tamanho_lote)),
+        "lotes": (list(banco.Lote._fields), lambda: banco.lotes_insumo_lotes(tamanho_lote)),
+    }
+
+def _escrever_csv(caminho, colunas, lotes):
+    with open(caminho, "w", encoding="utf-8-sig", newline="") as arquivo:
+        escritor = csv.writer(arquivo, delimiter=";")
+        escritor.writerow(colunas)
+        for lote in lotes:
+            escritor.writerows(lote)
+
+# Tipos das colunas no Parquet (as demais são texto)
+TIPOS_PARQUET = {"rowid": "int64", "id": "int64", "quantidade": "int64", "estoque_minimo": "int64", "estoque_alvo": "int64"}
+
+def _escrever_parquet(caminho, colunas, lotes):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("A exportação em Parquet precisa do pacote pyarrow (pip install pyarrow)")
+
+    esquema = pa.schema([(coluna, getattr(pa, TIPOS_PARQUET.get(coluna, "string"))()) for coluna in colunas])
+    with pq.ParquetWriter(caminho, esquema) as escritor:
+        for lote in lotes:
+            escritor.write_table(pa.Table.from_arrays(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(zip(*lote), esquema)], schema=esquema))
+        # Tabela vazia: o arquivo ainda sai com o esquema
+
+# Função para exportar as tabelas em CSV ou Parquet na pasta; devolve os arquivos gravados
+@medido("Exportação", "dados brutos")
+def exportar_dados(pasta, formato="csv", inicio=None, fim=None):
+    if formato not in FORMATOS_DADOS:
+        raise ValueError(f"Formato desconhecido: {formato}")
+    escrever = _escrever_csv if formato == "csv" else _escrever_parquet
+    tamanho_lote = TAMANHO_LOTE if formato == "csv" else TAMANHO_LOTE_PARQUET
+    os.makedirs(pasta, exist_ok=True)
+    arquivos = []
+    for nome, (colunas, lotes) in _tabelas_dados(inicio, fim, tamanho_lote).items():
+        nome_arquivo = os.path.join(pasta, f"{nome}.{formato}")
+        gravar_atomicamente(nome_arquivo, lambda caminho: escrever(caminho, colunas, lotes()))
+        arquivos.append(nome_arquivo)
+    return arquivos
+
+# Exportador em segundo plano (write-behind)
+# Cada alteração chama agendar(); rajadas de alterações viram uma única exportação, feita numa
+# thread própria depois de `espera` segundos sem novas alterações. descarregar() força a
+# exportação pendente e espera terminar (usado ao fechar o aplicativo).
+class ExportadorPlanilha:
+    def __init__(self, exportar=exportar_para_excel, espera=ESPERA_EXPORTACAO):
+        self._exportar = exportar
+        self._espera = espera
+        self._condicao = threading.Condition()
+        self._pendente = False
+        self._exportando = False
+        self._prazo = 0.0
+        self._thread = None
+        self.ultimo_erro = None
+
+    def agendar(self):
+        with self._condicao:
+            self._pendente = True
+            self._prazo = time.monotonic() + self._espera
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._executar, name="exportador-planilha", daemon=True)
+                self._thread.start()
+            self._condicao.notify_all()
+
+    def descarregar(self, timeout=None):
+        with self._condicao:
+            if self._pendente:
+                self._prazo = time.monotonic()
+                self._condicao.notify_all()
+            return self._condicao.wait_for(lambda: not self._pendente and not self._exportando, timeout)
+
+    def _executar(self):
+        while True:
+            with self._condicao:
+                # Espera o período de silêncio; novas chamadas a agendar() adiam o prazo
+                while self._pendente:
+                    restante = self._prazo - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._condicao.wait(restante)
+                if not self._pendente:
+                    self._thread = None
+                    return
+                self._pendente = False
+                self._exportando = True
+
+            try:
+                self._exportar()
+                self.ultimo_erro = None
+            except Exception as e:
+                self.ultimo_erro = e
+                print(f"Erro ao exportar a planilha: {e}")
+            finally:
+                # Fecha a conexão desta thread antes de liberar descarregar(): aberta, ela impede
+                # o checkpoint do WAL quando o aplicativo fecha a sua (a próxima exportação reabre)
+                banco.fechar_conexao()
+                with self._condicao:
+                    self._exportando = False
+                    self._condicao.notify_all()
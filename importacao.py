@@ -0,0 +1,208 @@
+import hashlib
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import pandas as pd
+
+import banco
+from instrumentacao import medido
+from validade import FORMATOS_VALIDADE, MESES, PADRAO_MES_ANO
+
+# Colunas da planilha e colunas correspondentes na tabela de insumos
+COLUNAS_PLANILHA = {
+    "CÓDIGO": "codigo",
+    "ÍTEM": "nome",
+    "QUANTIDADE": "quantidade",
+    "VALIDADE": "validade",
+    "ESTANTE/PRATELEIRA": "localizacao",
+    "OBSERVAÇÃO": "observacao",
+}
+COLUNAS_INSUMO = list(COLUNAS_PLANILHA.values())
+# Colunas opcionais com os níveis de estoque do item: vazias ou ausentes na planilha, o item
+# mantém os níveis que tem no banco (um item novo fica com os padrões)
+COLUNAS_NIVEIS = {
+    "ESTOQUE MÍNIMO": "estoque_minimo",
+    "ESTOQUE ALVO": "estoque_alvo",
+}
+COLUNAS_GRAVADAS = COLUNAS_INSUMO + list(COLUNAS_NIVEIS.values())
+
+# Resultado de uma importação de planilha
+@dataclass
+class ResultadoImportacao:
+    inseridos: int = 0
+    atualizados: int = 0
+    inalterados: int = 0
+    rejeitados: int = 0
+    arquivo_inalterado: bool = False
+    linhas_rejeitadas: list = field(default_factory=list)  # (linha na planilha, motivo)
+
+    def resumo(self):
+        if self.arquivo_inalterado:
+            return "Planilha sem alterações desde a última importação."
+        return (f"{self.inseridos} inseridos, {self.atualizados} atualizados, "
+                f"{self.inalterados} inalterados, {self.rejeitados} rejeitados")
+
+# Função para calcular o SHA-256 do arquivo sem carregá-lo inteiro na memória
+def calcular_hash_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+# Função para normalizar e validar o DataFrame lido da planilha (operações vetorizadas)
+# Retorna (linhas válidas, linhas rejeitadas como lista de (linha, motivo))
+def normalizar_planilha(df):
+    df = df.rename(columns={**COLUNAS_PLANILHA, **COLUNAS_NIVEIS})
+    for coluna in COLUNAS_GRAVADAS:
+        if coluna not in df.columns:
+            df[coluna] = None
+    df = df[COLUNAS_GRAVADAS].copy()
+    # Número da linha no Excel (cabeçalho na linha 1)
+    df["linha"] = df.index + 2
+
+    def texto(serie):
+        return serie.where(serie.notna()).astype("string").str.strip().replace("", pd.NA)
+
+    df["codigo"] = texto(df["codigo"])
+    df["nome"] = texto(df["nome"])
+    df["localizacao"] = texto(df["localizacao"])
+    df["observacao"] = texto(df["observacao"])
+    df["validade"] = normalizar_validades(texto(df["validade"]))
+
+    # Quantidades como "2cx" ou "2 pares" aproveitam o número inicial; o resto vira 0
+    quantidade = texto(df["quantidade"]).str.extract(r"^(\d+)", expand=False)
+    df["quantidade"] = pd.to_numeric(quantidade, errors="coerce").fillna(0).astype("int64")
+    # Níveis de estoque: mesmo aproveitamento do número inicial, mas vazio continua vazio
+    for coluna in COLUNAS_NIVEIS.values():
+        nivel = texto(df[coluna]).str.extract(r"^(\d+)", expand=False)
+        df[coluna] = pd.to_numeric(nivel, errors="coerce").astype("Int64")
+
+    motivos = pd.Series(pd.NA, index=df.index, dtype="string")
+    motivos = motivos.mask((df["estoque_alvo"] < df["estoque_minimo"]).fillna(False), "estoque alvo menor que o mínimo")
+    motivos = motivos.mask(df["nome"].isna(), "nome vazio")
+    motivos = motivos.mask(df["codigo"].isna(), "código vazio")
+    # Códigos repetidos: prevalece a última ocorrência, como no INSERT OR REPLACE antigo
+    repetidas = df["codigo"].notna() & df.duplicated(subset="codigo", keep="last")
+    motivos = motivos.mask(repetidas & motivos.isna(), "código repetido mais abaixo na planilha")
+    invalidas = motivos.notna()
+    rejeitadas = list(zip(df.loc[invalidas, "linha"].tolist(), motivos[invalidas].tolist()))
+
+    return df[~invalidas].reset_index(drop=True), rejeitadas
+
+# Função para converter a coluna de validade para ISO (AAAA-MM-DD), vetorizada
+# Mesmas regras de validade.normalizar_validade: valores não reconhecidos ficam nulos
+def normalizar_validades(serie):
+    datas = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    for formato in FORMATOS_VALIDADE:
+        datas = datas.fillna(pd.to_datetime(serie, format=formato, errors="coerce"))
+
+    # Só mês e ano ("02/26", "nov/31"): último dia do mês
+    partes = serie.str.lower().str.extract(PADRAO_MES_ANO.pattern)
+    meses = pd.to_numeric(partes[0].replace({nome: str(numero) for nome, numero in MESES.items()}), errors="coerce")
+    anos = pd.to_numeric(partes[1], errors="coerce")
+    anos = anos.where(anos >= 100, anos + 2000)
+    meses = meses.where(meses.between(1, 12))
+    inicio_mes = pd.to_datetime(anos.astype("string") + "-" + meses.astype("string"), format="%Y-%m", errors="coerce")
+    datas = datas.fillna(inicio_mes + pd.offsets.MonthEnd(0))
+
+    return datas.dt.strftime("%Y-%m-%d").astype("string")
+
+# Função para calcular um hash por linha (detecta linhas alteradas desde a última importação)
+def calcular_hash_linhas(df):
+    hashes = pd.util.hash_pandas_object(df[COLUNAS_GRAVADAS].astype("string"), index=False)
+    return hashes.to_numpy().view("int64")
+
+# Função para converter um DataFrame em tuplas para o executemany (None no lugar de NA)
+def para_tuplas(df, colunas):
+    dados = df[colunas].astype(object).where(df[colunas].notna(), None)
+    return list(dados.itertuples(index=False, name=None))
+
+# Função para importar a planilha de forma incremental
+# Só grava no banco as linhas que mudaram na planilha desde a última importação, preservando
+# as quantidades alteradas pelo aplicativo nos itens que não mudaram na planilha.
+@medido("Importação")
+def importar_planilha(planilha_path, conexao=None, sheet_name="Página1", forcar=False):
+    conexao = conexao or banco.obter_conexao()
+    resultado = ResultadoImportacao()
+    caminho = os.path.abspath(planilha_path)
+    info = os.stat(caminho)
+
+    cursor = conexao.cursor()
+    cursor.execute("SELECT mtime_ns, tamanho, sha256 FROM planilha_importacoes WHERE caminho = ?", (caminho,))
+    anterior = cursor.fetchone()
+
+    if anterior and not forcar and anterior[:2] == (info.st_mtime_ns, info.st_size):
+        resultado.arquivo_inalterado = True
+        return resultado
+
+    sha256 = calcular_hash_arquivo(caminho)
+    agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if anterior and not forcar and anterior[2] == sha256:
+        # Arquivo apenas "tocado" (data alterada, conteúdo igual)
+        cursor.execute("UPDATE planilha_importacoes SET mtime_ns = ?, tamanho = ? WHERE caminho = ?",
+                       (info.st_mtime_ns, info.st_size, caminho))
+        resultado.arquivo_inalterado = True
+        return resultado
+
+    df, rejeitadas = normalizar_planilha(pd.read_excel(caminho, sheet_name=sheet_name))
+    resultado.rejeitados = len(rejeitadas)
+    resultado.linhas_rejeitadas = rejeitadas
+    df["hash"] = calcular_hash_linhas(df)
+
+    # Linhas cuja versão na planilha é diferente da última importada
+    hashes_anteriores = pd.read_sql_query("SELECT codigo, hash AS hash_anterior FROM planilha_linhas", conexao)
+    df = df.merge(hashes_anteriores, on="codigo", how="left")
+    alteradas = df["hash_anterior"].isna() | (df["hash"] != df["hash_anterior"])
+
+    # Compara as linhas alteradas com o que está no banco para classificar inserção/atualização
+    atuais = pd.read_sql_query(f"SELECT {', '.join(COLUNAS_GRAVADAS)} FROM insumos", conexao)
+    atuais = atuais.drop_duplicates(subset="codigo").set_index("codigo")
+    candidatos = df[alteradas].set_index("codigo")
+    existentes = candidatos.index.isin(atuais.index)
+
+    campos = [coluna for coluna in COLUNAS_GRAVADAS if coluna != "codigo"]
+    novos = candidatos[campos].astype("string")
+    banco_atual = atuais.reindex(candidatos.index)[campos].astype("string")
+    # Nível vazio na planilha mantém o do banco: não é diferença
+    for coluna in COLUNAS_NIVEIS.values():
+        novos[coluna] = novos[coluna].fillna(banco_atual[coluna])
+    diferentes = (novos.fillna("") != banco_atual.fillna("")).any(axis=1).to_numpy()
+
+    gravar = candidatos[~existentes | diferentes].reset_index()
+    resultado.inseridos = int((~existentes).sum())
+    resultado.atualizados = int((existentes & diferentes).sum())
+    resultado.inalterados = len(df) - resultado.inseridos - resultado.atualizados
+
+    # Grava tudo em uma única transação
+    with banco.transacao(conexao):
+        cursor.executemany(f'''
+            INSERT INTO insumos (codigo, nome, quantidade, validade, localizacao, observacao, estoque_minimo, estoque_alvo)
+            VALUES (?1, ?2, ?3, ?4, ?5, ?6, COALESCE(?7, {banco.ESTOQUE_MINIMO_PADRAO}), COALESCE(?8, {banco.ESTOQUE_ALVO_PADRAO}))
+            ON CONFLICT (codigo) DO UPDATE SET
+                nome = excluded.nome,
+                quantidade = excluded.quantidade,
+                validade = excluded.validade,
+                localizacao = excluded.localizacao,
+                observacao = excluded.observacao,
+                estoque_minimo = COALESCE(?7, estoque_minimo),
+                estoque_alvo = COALESCE(?8, estoque_alvo)
+        ''', para_tuplas(gravar, COLUNAS_GRAVADAS))
+        # A planilha traz o total do item: lotes que passem dele são reduzidos
+        banco.limitar_lotes(conexao=conexao)
+        cursor.executemany('''
+            INSERT INTO planilha_linhas (codigo, hash) VALUES (?, ?)
+            ON CONFLICT (codigo) DO UPDATE SET hash = excluded.hash
+        ''', para_tuplas(df[alteradas], ["codigo", "hash"]))
+        cursor.execute('''
+            INSERT INTO planilha_importacoes (caminho, mtime_ns, tamanho, sha256, importado_em)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (caminho) DO UPDATE SET
+                mtime_ns = excluded.mtime_ns,
+                tamanho = excluded.tamanho,
+                sha256 = excluded.sha256,
+                importado_em = excluded.importado_em
+        ''', (caminho, info.st_mtime_ns, info.st_size, sha256, agora))
+
+    return resultado
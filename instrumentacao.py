@@ -0,0 +1,273 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+
+# Instrumentação: tempo de cada comando SQL e de cada operação da interface
+# As conexões do aplicativo (banco.conectar) usam ConexaoInstrumentada, que cronometra a
+# execução de cada comando e as leituras em bloco (fetch*). Operações maiores (atualização de tabelas,
+# exportação, relatório) são medidas com @medido ou `with medir(...)`.
+# Para cada operação guardamos contagem, tempos recentes (percentis) e, para consultas que
+# percorrem uma tabela inteira, o EXPLAIN QUERY PLAN. O que passa do limite vai para um
+# arquivo de log rotativo; a tela de diagnóstico mostra as operações mais lentas.
+
+ATIVA = True
+
+# Limites (ms) acima dos quais a operação é registrada no log de operações lentas
+LIMITE_SQL_MS = 100
+LIMITE_OPERACAO_MS = 500
+
+# Nome do log; o arquivo fica na pasta do banco de dados (caminho_log), não na pasta de onde o
+# aplicativo ou o agendador foi chamado
+ARQUIVO_LOG = "operacoes_lentas.log"
+TAMANHO_LOG = 1024 * 1024  # bytes por arquivo
+ARQUIVOS_LOG = 3  # arquivos antigos mantidos (operacoes_lentas.log.1, .2, ...)
+
+# Tempos mais recentes guardados por operação, para os percentis
+AMOSTRAS_POR_OPERACAO = 1000
+
+SQL = "SQL"
+
+_trava = threading.Lock()
+_estatisticas = {}
+_logger = None
+_manipulador = None
+_caminho_manipulador = None  # último caminho aberto (ou tentado) para o log
+
+# Estatísticas de uma operação (um comando SQL ou uma operação nomeada)
+class Estatistica:
+    def __init__(self, categoria, nome):
+        self.categoria = categoria
+        self.nome = nome
+        self.contagem = 0
+        self.total_ms = 0.0
+        self.maximo_ms = 0.0
+        self.amostras = deque(maxlen=AMOSTRAS_POR_OPERACAO)
+        self.plano = None  # EXPLAIN QUERY PLAN (só consultas)
+        self.varredura = False  # o plano percorre uma tabela inteira
+
+    def registrar(self, ms):
+        self.contagem += 1
+        self.total_ms += ms
+        self.maximo_ms = max(self.maximo_ms, ms)
+        self.amostras.append(ms)
+
+    def percentil(self, p):
+        if not self.amostras:
+            return 0.0
+        ordenadas = sorted(self.amostras)
+        return ordenadas[min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))]
+
+    @property
+    def media_ms(self):
+        return self.total_ms / self.contagem if self.contagem else 0.0
+
+# Caminho do log de operações lentas: ao lado do banco em uso (banco.CAMINHO_BANCO)
+def caminho_log():
+    import banco  # banco importa este módulo
+    return os.path.join(os.path.dirname(os.path.abspath(banco.CAMINHO_BANCO)), ARQUIVO_LOG)
+
+# O arquivo acompanha o banco: se o caminho do banco mudar, o log passa para a nova pasta
+def _log_lento():
+    global _logger, _manipulador, _caminho_manipulador
+    if _logger is None:
+        _logger = logging.getLogger("estoque.operacoes_lentas")
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+    caminho = caminho_log()
+    if caminho != _caminho_manipulador:
+        with _trava:
+            _caminho_manipulador = caminho
+            if _manipulador is not None:
+                _logger.removeHandler(_manipulador)
+                _manipulador.close()
+                _manipulador = None
+            try:
+                _manipulador = RotatingFileHandler(caminho, maxBytes=TAMANHO_LOG, backupCount=ARQUIVOS_LOG,
+                                                   encoding="utf-8", delay=True)
+                _manipulador.setFormatter(logging.Formatter("%(asctime)s %(threadName)s %(message)s"))
+                _logger.addHandler(_manipulador)
+            except OSError as e:
+                print(f"Não foi possível abrir o log de operações lentas: {e}")
+    return _logger
+
+# Função para registrar um tempo medido
+def registrar(categoria, nome, ms, detalhe=""):
+    with _trava:
+        estatistica = _estatisticas.get((categoria, nome))
+        if estatistica is None:
+            estatistica = _estatisticas[(categoria, nome)] = Estatistica(categoria, nome)
+        estatistica.registrar(ms)
+    limite = LIMITE_SQL_MS if categoria == SQL else LIMITE_OPERACAO_MS
+    if ms >= limite:
+        _log_lento().info("%s %.1f ms: %s%s", categoria, ms, nome, f" ({detalhe})" if detalhe else "")
+    return estatistica
+
+# Gerenciador de contexto para medir uma operação: with medir("Exportação", "planilha"): ...
+@contextmanager
+def medir(categoria, nome):
+    if not ATIVA:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(categoria, nome, (time.perf_counter() - inicio) * 1000)
+
+# Decorador equivalente a medir(), com o nome da função por padrão
+def medido(categoria, nome=None):
+    def decorador(funcao):
+        @wraps(funcao)
+        def medida(*args, **kwargs):
+            with medir(categoria, nome or funcao.__name__):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
+
+# Operações mais lentas (pelo percentil 95), para a tela de diagnóstico
+def operacoes_mais_lentas(limite=50):
+    with _trava:
+        estatisticas = list(_estatisticas.values())
+    return sorted(estatisticas, key=lambda e: e.percentil(95), reverse=True)[:limite]
+
+def limpar():
+    with _trava:
+        _estatisticas.clear()
+
+# SQL em uma linha, sem espaços repetidos (chave das estatísticas)
+def normalizar_sql(sql):
+    return re.sub(r"\s+", " ", sql).strip()
+
+def _consulta(sql):
+    return sql.lstrip().upper().startswith(("SELECT", "WITH"))
+
+# Tabelas de controle com uma linha ou poucas: percorrê-las inteiras não é problema
+TABELAS_PEQUENAS = {
+    "historico_arquivado",
+    "historico_arquivando",
+    "versao_dados",
+    "manutencao",
+    "previsao_controle",
+    "filiais",
+}
+
+# Varredura completa: "SCAN tabela" sem índice (tabelas virtuais FTS, o catálogo do SQLite e as
+# tabelas pequenas não contam)
+def _tem_varredura(plano):
+    for linha in plano:
+        if not linha.startswith("SCAN ") or "USING" in linha or "VIRTUAL TABLE" in linha:
+            continue
+        tabela = linha.split()[1]
+        if not tabela.startswith("sqlite_") and tabela not in TABELAS_PEQUENAS:
+            return True
+    return False
+
+# Cursor que cronometra execute/executemany e as leituras em bloco (fetchone, fetchmany, fetchall)
+# do comando atual. A iteração linha a linha não é cronometrada, para não pesar nas leituras
+# longas (importação, exportação): o execute já inclui a busca da primeira linha.
+# O comando é registrado quando as linhas acabam (fetch*), quando outro comando é executado no
+# mesmo cursor ou quando o cursor é fechado/descartado.
+class CursorInstrumentado(sqlite3.Cursor):
+    _sql = None
+    _ms = 0.0
+    _parametros = ()
+
+    def _iniciar(self, sql, parametros):
+        self._finalizar()
+        self._sql = sql
+        self._parametros = parametros
+        self._ms = 0.0
+
+    def _medir(self, operacao, *args):
+        inicio = time.perf_counter()
+        try:
+            return operacao(*args)
+        finally:
+            self._ms += (time.perf_counter() - inicio) * 1000
+
+    def _finalizar(self):
+        if self._sql is None:
+            return
+        sql, parametros, ms = self._sql, self._parametros, self._ms
+        self._sql = None
+        chave = normalizar_sql(sql)
+        estatistica = registrar(SQL, chave, ms)
+        if estatistica.plano is None and _consulta(sql) and not isinstance(parametros, list):
+            self._explicar(estatistica, sql, parametros)
+
+    # EXPLAIN QUERY PLAN na primeira execução de cada consulta, com os mesmos parâmetros
+    def _explicar(self, estatistica, sql, parametros):
+        try:
+            cursor = sqlite3.Cursor(self.connection)
+            plano = [linha[3] for linha in cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parametros)]
+            cursor.close()
+        except sqlite3.Error:
+            plano = []
+        estatistica.plano = plano
+        estatistica.varredura = _tem_varredura(plano)
+        if estatistica.varredura:
+            _log_lento().info("SQL com varredura completa: %s | plano: %s", estatistica.nome, "; ".join(plano))
+
+    def execute(self, sql, parametros=()):
+        self._iniciar(sql, parametros)
+        resultado = self._medir(super().execute, sql, parametros)
+        if self.description is None:
+            self._finalizar()  # comando sem linhas de resultado
+        return resultado
+
+    def executemany(self, sql, sequencia):
+        # Lotes: o tempo do executemany inteiro conta como uma execução
+        self._iniciar(sql, [])
+        resultado = self._medir(super().executemany, sql, sequencia)
+        self._finalizar()
+        return resultado
+
+    def fetchone(self):
+        linha = self._medir(super().fetchone)
+        if linha is None:
+            self._finalizar()
+        return linha
+
+    def fetchmany(self, size=None):
+        tamanho = self.arraysize if size is None else size
+        linhas = self._medir(super().fetchmany, tamanho)
+        if len(linhas) < tamanho:
+            self._finalizar()
+        return linhas
+
+    def fetchall(self):
+        linhas = self._medir(super().fetchall)
+        self._finalizar()
+        return linhas
+
+    def close(self):
+        self._finalizar()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finalizar()
+        except Exception:
+            pass
+
+# Conexão cujos cursores (inclusive os de execute/executemany) são instrumentados
+class ConexaoInstrumentada(sqlite3.Connection):
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, sequencia):
+        return self.cursor().executemany(sql, sequencia)
+
+# Fábrica de conexão para sqlite3.connect(factory=...)
+def fabrica_conexao():
+    return ConexaoInstrumentada if ATIVA else sqlite3.Connection
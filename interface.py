@@ -0,0 +1,1815 @@
+import tkinter as tk
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+import os
+import sqlite3
+import time
+from tkinter import filedialog, messagebox
+from datetime import datetime
+
+import banco
+import eventos
+import instrumentacao
+import movimentacoes
+from acesso import AcessoLocal
+from autocompletar import IndiceInsumos, SeletorInsumo
+from leitura import SessaoLeitura
+from tabela_virtual import TabelaVirtual
+from tarefas import ExecutorTarefas, IndicadorOcupado
+from validade import data_do_formulario, formatar_validade, validade_do_formulario
+
+# pandas, openpyxl e reportlab não são importados aqui: só quando a tela que usa é aberta
+# (ou pela sincronização da planilha, em segundo plano), para o menu aparecer logo.
+
+# Adaptadores personalizados para datetime
+def adapt_datetime(dt):
+    return dt.isoformat()
+
+def convert_datetime(s):
+    return datetime.fromisoformat(s.decode())
+
+sqlite3.register_adapter(datetime, adapt_datetime)
+sqlite3.register_converter("datetime", convert_datetime)
+
+# Acesso aos dados pelas telas: o banco local ou, em modo cliente, o serviço de estoque
+# (veja acesso.py e cliente.py). Definido por iniciar_aplicativo().
+estoque = AcessoLocal()
+
+# Índice de códigos e nomes do seletor de insumos (autocompletar), mantido entre as telas:
+# os eventos de cadastro, edição e exclusão atualizam o item alterado, e as telas de
+# movimentação e de leitura sincronizam ao abrir
+indice_insumos = IndiceInsumos()
+
+def atualizar_indice(evento):
+    if evento.tipo != eventos.INSUMO_INSERIDO:
+        indice_insumos.remover(evento.codigo_anterior)
+    if evento.insumo is not None:
+        indice_insumos.adicionar(evento.insumo.codigo, evento.insumo.nome)
+
+eventos.assinar(atualizar_indice, (eventos.InsumoAlterado,))
+
+# Consultas e arquivos lentos rodam neste executor, fora da thread do Tk (veja tarefas.py)
+executor = ExecutorTarefas()
+
+# Função para carregar dados da planilha para o banco de dados
+# A importação é incremental: planilhas inalteradas são ignoradas e só as linhas que mudaram
+# desde a última importação são gravadas (veja importacao.py)
+def carregar_planilha_para_banco(planilha_path):
+    from importacao import importar_planilha
+
+    banco.criar_tabelas()
+    resultado = importar_planilha(planilha_path)
+
+    print(f"Importação de {planilha_path}: {resultado.resumo()}")
+    for linha, motivo in resultado.linhas_rejeitadas:
+        print(f"Linha {linha} rejeitada: {motivo}")
+    return resultado
+
+# Função para centralizar a janela
+def centralizar_janela(root):
+    root.update_idletasks()
+    largura_janela = root.winfo_width()
+    altura_janela = root.winfo_height()
+    largura_tela = root.winfo_screenwidth()
+    altura_tela = root.winfo_screenheight()
+
+    x = (largura_tela // 2) - (largura_janela // 2)
+    y = (altura_tela // 2) - (altura_janela // 2)
+    root.geometry(f'{largura_janela}x{altura_janela}+{x}+{y}')
+
+# Função para ler os níveis de estoque dos formulários de cadastro e edição
+# Retorna (estoque_minimo, estoque_alvo), com None nos campos vazios (padrão no cadastro, nível
+# atual na edição), ou None se os valores forem inválidos (o erro já foi mostrado)
+def niveis_do_formulario(dados, parent=None):
+    niveis = []
+    for chave in ("estoque_minimo", "estoque_alvo"):
+        if dados[chave] and not dados[chave].isdigit():
+            messagebox.showerror("Erro", "Os níveis de estoque devem ser números inteiros!", parent=parent)
+            return None
+        niveis.append(int(dados[chave]) if dados[chave] else None)
+    if None not in niveis and niveis[1] < niveis[0]:
+        messagebox.showerror("Erro", "O estoque alvo não pode ser menor que o estoque mínimo!", parent=parent)
+        return None
+    return tuple(niveis)
+
+# Função para registrar novos insumos manualmente
+def tela_registrar_insumos(root):
+    root.withdraw()
+    janela = ttk.Toplevel()
+    janela.title("Registrar Novo Insumo")
+    janela.geometry("800x600")
+
+    centralizar_janela(janela)
+
+    campos = [
+        ("Código do Insumo", "codigo"),
+        ("Nome do Insumo", "nome"),
+        ("Quantidade Inicial", "quantidade"),
+        ("Validade (DD/MM/AAAA)", "validade"),
+        ("Localização", "localizacao"),
+        ("Observação", "observacao"),
+        ("Estoque Mínimo", "estoque_minimo"),
+        ("Estoque Alvo", "estoque_alvo")
+    ]
+    padroes = {"estoque_minimo": banco.ESTOQUE_MINIMO_PADRAO, "estoque_alvo": banco.ESTOQUE_ALVO_PADRAO}
+
+    entradas = {}
+    for texto, chave in campos:
+        label = ttk.Label(janela, text=texto)
+        label.pack()
+        entrada = ttk.Entry(janela)
+        if chave in padroes:
+            entrada.insert(0, str(padroes[chave]))
+        entrada.pack()
+        entradas[chave] = entrada
+
+    def salvar_insumo():
+        dados = {chave: entradas[chave].get().strip() for chave in entradas}
+
+        if not dados["codigo"] or not dados["nome"] or not dados["quantidade"].isdigit():
+            messagebox.showerror("Erro", "Preencha todos os campos obrigatórios corretamente!")
+            return
+        niveis = niveis_do_formulario(dados)
+        if niveis is None:
+            return
+
+        # Validar a data de validade (gravada no banco como AAAA-MM-DD, vazia = indeterminada)
+        try:
+            validade = validade_do_formulario(dados["validade"])
+        except ValueError:
+            messagebox.showerror("Erro", "Formato de data inválido! Use DD/MM/AAAA.")
+            return
+
+        try:
+            estoque.inserir_insumo(
+                dados["codigo"],
+                dados["nome"],
+                int(dados["quantidade"]),
+                validade,
+                dados["localizacao"],
+                dados["observacao"],
+                *niveis
+            )
+            messagebox.showinfo("Sucesso", "Insumo cadastrado com sucesso!")
+            estoque.agendar_exportacao()  # Atualizar a planilha Excel em segundo plano
+        except sqlite3.Error as e:
+            messagebox.showerror("Erro de Banco de Dados", str(e))
+
+        janela.destroy()
+        root.deiconify()
+
+    btn_salvar = ttk.Button(janela, text="Salvar", command=salvar_insumo, bootstyle=SUCCESS)
+    btn_salvar.pack(pady=10)
+    btn_cancelar = ttk.Button(janela, text="Cancelar", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=DANGER)
+    btn_cancelar.pack(pady=5)
+
+# Função para editar um insumo
+# As telas abertas se atualizam pelo evento da alteração (eventos.py)
+def editar_insumo(rowid):
+    insumo = estoque.obter_insumo(rowid)
+
+    if insumo:
+        janela_editar = ttk.Toplevel()
+        janela_editar.title("Editar Insumo")
+        janela_editar.geometry("400x500")
+        centralizar_janela(janela_editar)
+
+        campos = [
+            ("Código do Insumo", "codigo", insumo.codigo),
+            ("Nome do Insumo", "nome", insumo.nome),
+            ("Quantidade", "quantidade", insumo.quantidade),
+            ("Validade (DD/MM/AAAA)", "validade", formatar_validade(insumo.validade)),
+            ("Localização", "localizacao", insumo.localizacao),
+            ("Observação", "observacao", insumo.observacao),
+            ("Estoque Mínimo", "estoque_minimo", insumo.estoque_minimo),
+            ("Estoque Alvo", "estoque_alvo", insumo.estoque_alvo)
+        ]
+
+        entradas = {}
+        for texto, chave, valor in campos:
+            label = ttk.Label(janela_editar, text=texto)
+            label.pack()
+            entrada = ttk.Entry(janela_editar)
+            entrada.insert(0, "" if valor is None else str(valor))  # Convertendo o valor para string
+            entrada.pack()
+            entradas[chave] = entrada
+
+        def salvar_edicao():
+            dados = {chave: entradas[chave].get().strip() for chave in entradas}
+
+            if not dados["nome"] or not dados["quantidade"].isdigit():
+                messagebox.showerror("Erro", "Preencha todos os campos obrigatórios corretamente!")
+                return
+            niveis = niveis_do_formulario(dados, janela_editar)
+            if niveis is None:
+                return
+
+            # Validar a data de validade (gravada no banco como AAAA-MM-DD, vazia = indeterminada)
+            try:
+                validade = validade_do_formulario(dados["validade"])
+            except ValueError:
+                messagebox.showerror("Erro", "Formato de data inválido! Use DD/MM/AAAA.")
+                return
+
+            try:
+                estoque.atualizar_insumo(
+                    rowid,
+                    dados["codigo"] if dados["codigo"] else None,
+                    dados["nome"],
+                    int(dados["quantidade"]),
+                    validade,
+                    dados["localizacao"],
+                    dados["observacao"],
+                    *niveis
+                )
+                messagebox.showinfo("Sucesso", "Insumo editado com sucesso!")
+                estoque.agendar_exportacao()  # Atualizar a planilha Excel em segundo plano
+            except sqlite3.Error as e:
+                messagebox.showerror("Erro de Banco de Dados", str(e))
+            finally:
+                janela_editar.destroy()
+
+        btn_salvar = ttk.Button(janela_editar, text="Salvar", command=salvar_edicao, bootstyle=SUCCESS)
+        btn_salvar.pack(pady=10)
+        btn_cancelar = ttk.Button(janela_editar, text="Cancelar", command=janela_editar.destroy, bootstyle=DANGER)
+        btn_cancelar.pack(pady=5)
+    else:
+        messagebox.showerror("Erro", "Insumo não encontrado!")
+
+# Função para excluir um insumo
+def excluir_insumo(rowid):
+    if messagebox.askokcancel("Confirmação", "Tem certeza de que deseja excluir este insumo?"):
+        try:
+            estoque.excluir_insumo(rowid)
+            messagebox.showinfo("Sucesso", "Insumo excluído com sucesso!")
+            estoque.agendar_exportacao()  # Atualizar a planilha Excel em segundo plano
+        except sqlite3.IntegrityError:
+            messagebox.showerror("Erro", "Não é possível excluir um insumo que possui movimentações no histórico!")
+        except sqlite3.Error as e:
+            messagebox.showerror("Erro de Banco de Dados", str(e))
+
+# Cores das faixas de estoque nas telas de monitoramento e de estoque baixo, pela situação que
+# vem do banco com cada item (banco.SITUACAO_ESTOQUE, pelos níveis de estoque do próprio item)
+CORES_ESTOQUE = {
+    banco.ESTOQUE_OK: "#d4edda",  # Verde Claro
+    banco.ESTOQUE_ATENCAO: "#fff3cd",  # Amarelo Claro
+    banco.ESTOQUE_BAIXO: "#f8d7da",  # Vermelho Claro
+}
+
+# Função para monitorar estoque (atualizado)
+def tela_monitorar_estoque(root):
+    root.withdraw()
+    janela = ttk.Toplevel()
+    janela.title("Monitorar Estoque")
+    janela.geometry("1000x600")
+
+    centralizar_janela(janela)
+
+    titulo = ttk.Label(janela, text="Estoque Atual", font=("Arial", 18, "bold"))
+    titulo.pack(pady=10)
+
+    # Tabela virtual: só as linhas visíveis são buscadas no banco, página a página
+    def formatar_linha(linha):
+        valores = list(linha[1:9])  # Removendo rowid e situação da exibição
+        valores[3] = formatar_validade(linha.validade)
+        return valores, (linha.situacao,)
+
+    colunas = ("Código", "Nome", "Quantidade", "Validade", "Localização", "Observação", "Mínimo", "Alvo")
+    tabela = TabelaVirtual(janela, colunas, estoque.FonteInsumos(), formatar_linha)
+    for tag, cor in CORES_ESTOQUE.items():
+        tabela.tag_configure(tag, background=cor)
+    tabela.pack(fill=tk.BOTH, expand=True, pady=10)
+    indicador = IndicadorOcupado(janela)
+
+    # A contagem e a primeira página de cada fonte (lista completa ou busca) vêm do executor;
+    # uma busca nova descarta o resultado da anterior
+    carga_pendente = None
+
+    def trocar_fonte(fonte):
+        nonlocal carga_pendente
+        if carga_pendente is not None:
+            carga_pendente.cancelar()
+        limite = tabela.preparar_fonte(fonte)
+        carga_pendente = executor.executar(
+            TabelaVirtual.carregar_inicio, fonte, limite,
+            ao_concluir=lambda carga: tabela.definir_fonte(fonte, carga),
+            ao_falhar=lambda erro: messagebox.showerror("Erro", f"Erro ao carregar o estoque: {erro}", parent=janela),
+            dono=janela, indicador=indicador)
+
+    trocar_fonte(estoque.FonteInsumos())
+
+    # Alterações feitas em qualquer tela: as linhas em memória são corrigidas no lugar; só um item
+    # novo, uma linha fora da memória ou uma mudança que altera a posição recarrega a janela visível
+    recarga_agendada = None
+
+    def agendar_recarga():
+        nonlocal recarga_agendada
+        if recarga_agendada is None:
+            recarga_agendada = janela.after_idle(recarregar)
+
+    def recarregar():
+        nonlocal recarga_agendada
+        recarga_agendada = None
+        tabela.recarregar()
+
+    # A linha só muda de posição se mudar o valor da coluna ordenada ou, numa busca, o texto buscado
+    def mesma_posicao(antiga, nova):
+        fonte = tabela.fonte
+        if fonte.busca and (antiga.codigo, antiga.nome, antiga.localizacao, antiga.observacao) != \
+                (nova.codigo, nova.nome, nova.localizacao, nova.observacao):
+            return False
+        if getattr(fonte, "por_relevancia", False) or fonte.indice_ordem is None:
+            return True  # ordem de relevância: depende só do texto
+        return antiga[fonte.indice_ordem + 1] == nova[fonte.indice_ordem + 1]
+
+    def insumo_alterado(evento):
+        if evento.tipo == eventos.INSUMO_EXCLUIDO:
+            if not tabela.remover_linha(evento.rowid):
+                agendar_recarga()
+            return
+        mudou_posicao = []
+
+        def substituir(linha):
+            if linha.rowid != evento.rowid:
+                return None
+            if not mesma_posicao(linha, evento.insumo):
+                mudou_posicao.append(linha)
+            return evento.insumo
+
+        if evento.tipo == eventos.INSUMO_INSERIDO or not tabela.substituir_linhas(substituir) or mudou_posicao:
+            agendar_recarga()
+
+    # A quantidade muda na hora; a situação (cor da linha) vem do banco, então a janela visível é
+    # consultada de novo quando algum item movimentado está em memória
+    def movimentacoes_lancadas(evento):
+        def substituir(linha):
+            if linha.codigo not in evento.saldos:
+                return None
+            return linha._replace(quantidade=evento.saldos[linha.codigo])
+
+        if tabela.substituir_linhas(substituir):
+            agendar_recarga()
+
+    eventos.assinar(insumo_alterado, (eventos.InsumoAlterado,), dono=janela)
+    eventos.assinar(movimentacoes_lancadas, (eventos.MovimentacoesLancadas,), dono=janela)
+
+    def editar_selecionado():
+        linha = tabela.linha_selecionada()
+        if linha:
+            editar_insumo(linha.rowid)
+        else:
+            messagebox.showerror("Erro", "Selecione um insumo para editar!")
+
+    def excluir_selecionado():
+        linha = tabela.linha_selecionada()
+        if linha:
+            excluir_insumo(linha.rowid)
+        else:
+            messagebox.showerror("Erro", "Selecione um insumo para excluir!")
+
+    btn_editar = ttk.Button(janela, text="Editar Insumo", command=editar_selecionado, bootstyle=SUCCESS)
+    btn_editar.pack(pady=5)
+    btn_excluir = ttk.Button(janela, text="Excluir Insumo", command=excluir_selecionado, bootstyle=DANGER)
+    btn_excluir.pack(pady=5)
+    btn_voltar = ttk.Button(janela, text="Voltar", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=SECONDARY)
+    btn_voltar.pack(pady=10)
+
+    # Busca enquanto digita (código, nome, localização ou observação), sem diferenciar acentos
+    filtro_label = ttk.Label(janela, text="Buscar Insumo:")
+    filtro_label.pack()
+    filtro_entrada = ttk.Entry(janela)
+    filtro_entrada.pack()
+
+    busca_agendada = None
+
+    def filtrar_dados():
+        nonlocal busca_agendada
+        busca_agendada = None
+        busca = filtro_entrada.get().strip()
+        if busca:
+            trocar_fonte(estoque.FonteBuscaInsumos(busca))
+        else:
+            trocar_fonte(estoque.FonteInsumos())
+
+    # Espera uma pausa na digitação antes de consultar o banco
+    def agendar_busca(event=None):
+        nonlocal busca_agendada
+        if busca_agendada is not None:
+            janela.after_cancel(busca_agendada)
+        busca_agendada = janela.after(250, filtrar_dados)
+
+    filtro_entrada.bind("<KeyRelease>", agendar_busca)
+    filtro_entrada.bind("<Return>", lambda e: filtrar_dados())
+    filtro_entrada.bind("<Escape>", lambda e: [filtro_entrada.delete(0, tk.END), filtrar_dados()])
+
+    janela.protocol("WM_DELETE_WINDOW", lambda: [janela.destroy(), root.deiconify()])
+
+# Função para movimentação de estoque
+def tela_movimentacao_estoque(root):
+    root.withdraw()
+    janela = ttk.Toplevel()
+    janela.title("Movimentação de Estoque")
+    janela.geometry("950x750")
+
+    centralizar_janela(janela)
+
+    titulo = ttk.Label(janela, text="Registrar Movimentação de Estoque", font=("Arial", 18, "bold"))
+    titulo.pack(pady=10)
+
+    # Seletor com autocompletar: digite parte do código ou do nome (sem acentos) e escolha na lista
+    frame_selecao = ttk.Frame(janela)
+    frame_selecao.pack(pady=10)
+    label_insumo = ttk.Label(frame_selecao, text="Selecionar Insumo:")
+    label_insumo.pack(side=tk.LEFT, padx=5, anchor=tk.N)
+    seletor = SeletorInsumo(frame_selecao, indice_insumos, largura=50, ao_selecionar=lambda selecao: carregar_lotes(selecao[0]))
+    seletor.pack(side=tk.LEFT, padx=5)
+    indicador = IndicadorOcupado(janela)
+
+    # Alinha o índice com o banco (ou o serviço) em segundo plano; só as diferenças são aplicadas
+    executor.executar(lambda: indice_insumos.sincronizar(estoque.listar_codigos_nomes()),
+                      ao_concluir=lambda _: seletor.atualizar_sugestoes() if seletor.entrada.get() else None,
+                      ao_falhar=lambda erro: messagebox.showerror("Erro", f"Erro ao carregar os insumos: {erro}", parent=janela),
+                      dono=janela, indicador=indicador)
+
+    frame_quantidade = ttk.Frame(janela)
+    frame_quantidade.pack(pady=10)
+    label_quantidade = ttk.Label(frame_quantidade, text="Quantidade:")
+    label_quantidade.pack(side=tk.LEFT, padx=5)
+    entrada_quantidade = ttk.Entry(frame_quantidade, width=10)
+    entrada_quantidade.pack(side=tk.LEFT, padx=5)
+
+    # Lote (opcional): a lista traz os lotes com saldo do item, do que vence primeiro; um lote novo
+    # pode ser digitado numa entrada, com a validade. Saída sem lote: o que vence primeiro (FEFO).
+    label_lote = ttk.Label(frame_quantidade, text="Lote:")
+    label_lote.pack(side=tk.LEFT, padx=5)
+    combo_lote = ttk.Combobox(frame_quantidade, width=14)
+    combo_lote.pack(side=tk.LEFT, padx=5)
+    label_validade_lote = ttk.Label(frame_quantidade, text="Validade do lote (DD/MM/AAAA):")
+    label_validade_lote.pack(side=tk.LEFT, padx=5)
+    entrada_validade_lote = ttk.Entry(frame_quantidade, width=11)
+    entrada_validade_lote.pack(side=tk.LEFT, padx=5)
+    validades_lotes = {}
+
+    def carregar_lotes(codigo):
+        executor.executar(estoque.listar_lotes, codigo, ao_concluir=mostrar_lotes, dono=janela, indicador=indicador)
+
+    def mostrar_lotes(lotes):
+        validades_lotes.clear()
+        validades_lotes.update((lote.lote, lote.validade) for lote in lotes)
+        combo_lote.configure(values=[lote.lote for lote in lotes])
+        combo_lote.set("")
+
+    def lote_escolhido(event):
+        entrada_validade_lote.delete(0, tk.END)
+        validade = validades_lotes.get(combo_lote.get())
+        if validade:
+            entrada_validade_lote.insert(0, formatar_validade(validade))
+
+    combo_lote.bind("<<ComboboxSelected>>", lote_escolhido)
+
+    def ler_selecao():
+        selecao = seletor.selecionado()
+        if not selecao or not entrada_quantidade.get().isdigit() or int(entrada_quantidade.get()) <= 0:
+            messagebox.showerror("Erro", "Preencha todos os campos corretamente!")
+            return None
+        try:
+            validade = data_do_formulario(entrada_validade_lote.get())
+        except ValueError:
+            messagebox.showerror("Erro", "Formato de data inválido! Use DD/MM/AAAA.")
+            return None
+        codigo, nome = selecao
+        return codigo, nome, int(entrada_quantidade.get()), combo_lote.get().strip() or None, validade
+
+    # Os lançamentos rodam no executor: no modo cliente são uma requisição ao serviço, que pode demorar
+    # Se falharem (serviço fora do ar), o usuário é avisado para conferir o histórico antes de repetir
+    def lancamento_falhou(erro, botoes):
+        for botao in botoes:
+            botao.config(state=tk.NORMAL)
+        messagebox.showerror("Erro", f"Erro ao lançar a movimentação: {erro}\n"
+                                     "Confira o histórico antes de lançar de novo.")
+
+    # Registrar uma única movimentação (entrada ou saída)
+    def registrar(tipo):
+        selecao = ler_selecao()
+        if not selecao:
+            return
+        codigo, _, quantidade, lote, validade = selecao
+
+        def registrada(resultados):
+            btn_entrada.config(state=tk.NORMAL)
+            btn_saida.config(state=tk.NORMAL)
+            resultado = resultados[0]
+            if not resultado.aplicada:
+                messagebox.showerror("Erro", f"{resultado.motivo}!")
+                return
+
+            estoque.agendar_exportacao()  # Atualizar a planilha Excel em segundo plano
+            carregar_lotes(codigo)
+            messagebox.showinfo("Sucesso", f"{tipo} registrada com sucesso! Saldo atual: {resultado.saldo}")
+
+        btn_entrada.config(state=tk.DISABLED)
+        btn_saida.config(state=tk.DISABLED)
+        executor.executar(estoque.aplicar_movimentacoes, [(codigo, tipo, quantidade, lote, validade)],
+                          ao_concluir=registrada, ao_falhar=lambda erro: lancamento_falhou(erro, (btn_entrada, btn_saida)),
+                          dono=janela, indicador=indicador)
+
+    frame_botoes = ttk.Frame(janela)
+    frame_botoes.pack(pady=5)
+    btn_entrada = ttk.Button(frame_botoes, text="Registrar Entrada", command=lambda: registrar(movimentacoes.ENTRADA), bootstyle=SUCCESS)
+    btn_entrada.pack(side=tk.LEFT, padx=5)
+    btn_saida = ttk.Button(frame_botoes, text="Registrar Saída", command=lambda: registrar(movimentacoes.SAIDA), bootstyle=DANGER)
+    btn_saida.pack(side=tk.LEFT, padx=5)
+
+    # Guia de movimentação: várias linhas (uma entrega, um kit de procedimento) lançadas de uma vez
+    titulo_guia = ttk.Label(janela, text="Guia de Movimentação", font=("Arial", 14, "bold"))
+    titulo_guia.pack(pady=(15, 5))
+
+    frame_guia = ttk.Frame(janela)
+    frame_guia.pack(pady=5)
+    colunas = ("Código", "Nome", "Tipo", "Quantidade", "Lote", "Situação")
+    tabela_guia = ttk.Treeview(janela, columns=colunas, show="headings", height=8)
+    for col in colunas:
+        tabela_guia.heading(col, text=col)
+        tabela_guia.column(col, width=120)
+    tabela_guia.tag_configure("recusada", background="#f8d7da")  # Vermelho Claro
+    linhas_guia = {}  # item da tabela -> (codigo, tipo, quantidade, lote, validade)
+
+    def adicionar_linha(tipo):
+        selecao = ler_selecao()
+        if not selecao:
+            return
+        codigo, nome, quantidade, lote, validade = selecao
+        item = tabela_guia.insert("", tk.END, values=(codigo, nome, tipo, quantidade, lote or "", ""))
+        linhas_guia[item] = (codigo, tipo, quantidade, lote, validade)
+
+    def remover_linha():
+        for item in tabela_guia.selection():
+            tabela_guia.delete(item)
+            del linhas_guia[item]
+
+    def lancar_guia():
+        itens = tabela_guia.get_children()
+        if not itens:
+            messagebox.showerror("Erro", "A guia está vazia!")
+            return
+        linhas = [linhas_guia[item] for item in itens]
+
+        def lancada(resultados):
+            btn_lancar.config(state=tk.NORMAL)
+            btn_guia_remover.config(state=tk.NORMAL)
+            aplicadas = 0
+            for item, resultado in zip(itens, resultados):
+                if resultado.aplicada:
+                    tabela_guia.delete(item)
+                    del linhas_guia[item]
+                    aplicadas += 1
+                else:
+                    valores = list(tabela_guia.item(item)["values"])
+                    valores[5] = resultado.motivo
+                    tabela_guia.item(item, values=valores, tags=("recusada",))
+
+            if aplicadas:
+                estoque.agendar_exportacao()  # Atualizar a planilha Excel em segundo plano
+            if aplicadas == len(itens):
+                messagebox.showinfo("Sucesso", f"Guia lançada: {aplicadas} movimentações registradas!")
+            else:
+                messagebox.showerror("Erro", f"{len(itens) - aplicadas} linha(s) recusada(s); {aplicadas} lançada(s). Veja a coluna Situação.")
+
+        # Remover e lançar ficam desativados até a resposta, que atualiza as linhas enviadas
+        btn_lancar.config(state=tk.DISABLED)
+        btn_guia_remover.config(state=tk.DISABLED)
+        executor.executar(estoque.aplicar_movimentacoes, linhas, parcial=lancar_parcial.get(),
+                          ao_concluir=lancada, ao_falhar=lambda erro: lancamento_falhou(erro, (btn_lancar, btn_guia_remover)),
+                          dono=janela, indicador=indicador)
+
+    btn_guia_entrada = ttk.Button(frame_guia, text="Adicionar Entrada", command=lambda: adicionar_linha(movimentacoes.ENTRADA), bootstyle=SUCCESS)
+    btn_guia_entrada.pack(side=tk.LEFT, padx=5)
+    btn_guia_saida = ttk.Button(frame_guia, text="Adicionar Saída", command=lambda: adicionar_linha(movimentacoes.SAIDA), bootstyle=DANGER)
+    btn_guia_saida.pack(side=tk.LEFT, padx=5)
+    btn_guia_remover = ttk.Button(frame_guia, text="Remover Linha", command=remover_linha, bootstyle=SECONDARY)
+    btn_guia_remover.pack(side=tk.LEFT, padx=5)
+
+    tabela_guia.pack(fill=tk.X, padx=10, pady=5)
+
+    frame_lancar = ttk.Frame(janela)
+    frame_lancar.pack(pady=5)
+    # Por padrão a guia é tudo ou nada: se uma linha for recusada, nenhuma é lançada
+    lancar_parcial = tk.BooleanVar(value=False)
+    check_parcial = ttk.Checkbutton(frame_lancar, text="Lançar as linhas aceitas mesmo se outras forem recusadas", variable=lancar_parcial)
+    check_parcial.pack(side=tk.LEFT, padx=5)
+    btn_lancar = ttk.Button(frame_lancar, text="Lançar Guia", command=lancar_guia, bootstyle=PRIMARY)
+    btn_lancar.pack(side=tk.LEFT, padx=5)
+
+    btn_voltar = ttk.Button(janela, text="Voltar", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=SECONDARY)
+    btn_voltar.pack(pady=10)
+
+# Cores da faixa de situação da tela de leitura
+COR_LEITURA_NEUTRA = "#e9ecef"  # Cinza Claro
+COR_LEITURA_OK = "#d4edda"  # Verde Claro
+COR_LEITURA_ERRO = "#f8d7da"  # Vermelho Claro
+DURACAO_DESTAQUE_MS = 700  # tempo da cor de uma leitura antes de voltar ao neutro
+
+# Função para a leitura de códigos de barras (leitor que funciona como teclado)
+# O campo de leitura fica sempre com o foco; cada leitura soma unidades ao item na lista da
+# sessão, sem janelas de confirmação: o resultado aparece na faixa colorida, com um bipe (dois
+# bipes em caso de erro). A sessão inteira é lançada numa única transação, tudo ou nada.
+def tela_leitura_codigos(root):
+    root.withdraw()
+    janela = ttk.Toplevel()
+    janela.title("Leitura de Códigos de Barras")
+    janela.geometry("800x750")
+
+    centralizar_janela(janela)
+
+    titulo = ttk.Label(janela, text="Leitura de Códigos de Barras", font=("Arial", 18, "bold"))
+    titulo.pack(pady=10)
+
+    sessao = SessaoLeitura(indice_insumos)
+    indicador = IndicadorOcupado(janela)
+
+    # O tipo vale para a sessão inteira
+    frame_tipo = ttk.Frame(janela)
+    frame_tipo.pack(pady=5)
+    tipo = tk.StringVar(value=movimentacoes.SAIDA)
+    radio_entrada = ttk.Radiobutton(frame_tipo, text="Entrada", variable=tipo, value=movimentacoes.ENTRADA, bootstyle=SUCCESS)
+    radio_entrada.pack(side=tk.LEFT, padx=10)
+    radio_saida = ttk.Radiobutton(frame_tipo, text="Saída", variable=tipo, value=movimentacoes.SAIDA, bootstyle=DANGER)
+    radio_saida.pack(side=tk.LEFT, padx=10)
+    som = tk.BooleanVar(value=True)
+    check_som = ttk.Checkbutton(frame_tipo, text="Bipe", variable=som)
+    check_som.pack(side=tk.LEFT, padx=10)
+
+    entrada_leitura = ttk.Entry(janela, width=40, font=("Arial", 16), state=tk.DISABLED)
+    entrada_leitura.pack(pady=5)
+
+    label_situacao = tk.Label(janela, text="Carregando os códigos...", font=("Arial", 13, "bold"),
+                              background=COR_LEITURA_NEUTRA, pady=8)
+    label_situacao.pack(fill=tk.X, padx=10, pady=5)
+
+    colunas = ("Código", "Nome", "Quantidade", "Situação")
+    tabela = ttk.Treeview(janela, columns=colunas, show="headings", height=12)
+    for col, largura in zip(colunas, (140, 300, 90, 240)):
+        tabela.heading(col, text=col)
+        tabela.column(col, width=largura)
+    tabela.tag_configure("desconhecido", background="#fff3cd")  # Amarelo Claro
+    tabela.tag_configure("recusada", background="#f8d7da")  # Vermelho Claro
+    tabela.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+    linhas_tabela = {}  # item da tabela -> (chave, conhecido)
+
+    label_totais = ttk.Label(janela, text="")
+    label_totais.pack()
+
+    destaque = [0]  # número da última sinalização; só ela volta a faixa ao neutro
+
+    def bipe(vezes):
+        if som.get():
+            for vez in range(vezes):
+                janela.after(150 * vez, janela.bell)
+
+    def sinalizar(texto, erro=False):
+        destaque[0] += 1
+        numero = destaque[0]
+        label_situacao.config(text=texto, background=COR_LEITURA_ERRO if erro else COR_LEITURA_OK)
+        bipe(2 if erro else 1)
+        janela.after(DURACAO_DESTAQUE_MS, lambda: destaque[0] == numero and label_situacao.config(background=COR_LEITURA_NEUTRA))
+
+    def atualizar_totais():
+        label_totais.config(text=f"{len(sessao.contagens)} item(ns), {sessao.unidades} unidade(s)"
+                                 + (f", {len(sessao.desconhecidos)} código(s) não cadastrado(s)" if sessao.desconhecidos else ""))
+
+    # Atualiza só a linha lida e a leva para o topo da lista
+    def mostrar_linha(chave, conhecido=True):
+        item = ("i:" if conhecido else "b:") + chave
+        total = sessao.total(chave, conhecido)
+        if not total:
+            if tabela.exists(item):
+                tabela.delete(item)
+                del linhas_tabela[item]
+        else:
+            if conhecido:
+                valores = (chave, indice_insumos.nome(chave), total, "")
+            else:
+                valores = (chave, "(não cadastrado)", total, "Associe a um insumo")
+            if tabela.exists(item):
+                tabela.item(item, values=valores, tags=() if conhecido else ("desconhecido",))
+                tabela.move(item, "", 0)
+            else:
+                tabela.insert("", 0, iid=item, values=valores, tags=() if conhecido else ("desconhecido",))
+                linhas_tabela[item] = (chave, conhecido)
+            tabela.selection_set(item)
+            tabela.see(item)
+        atualizar_totais()
+
+    def ao_ler(event=None):
+        texto = entrada_leitura.get()
+        entrada_leitura.delete(0, tk.END)
+        if not texto.strip():
+            return "break"
+        try:
+            leitura = sessao.registrar(texto)
+        except ValueError as e:
+            sinalizar(f"{e}: {texto}", erro=True)
+            return "break"
+        mostrar_linha(leitura.chave, leitura.codigo is not None)
+        if leitura.codigo is None:
+            sinalizar(f"Código {leitura.chave} não cadastrado", erro=True)
+        else:
+            sinalizar(f"{leitura.codigo} - {leitura.nome}: +{leitura.quantidade} (total {leitura.total})")
+        return "break"
+
+    def focar():
+        if str(entrada_leitura.cget("state")) == tk.NORMAL:
+            entrada_leitura.focus_set()
+
+    def desfazer(event=None):
+        linha = sessao.desfazer()
+        if linha:
+            mostrar_linha(*linha)
+            label_situacao.config(text="Última leitura desfeita", background=COR_LEITURA_NEUTRA)
+        focar()
+        return "break"
+
+    def remover_linha():
+        for item in tabela.selection():
+            sessao.remover(*linhas_tabela.pop(item))
+            tabela.delete(item)
+        atualizar_totais()
+        focar()
+
+    # Clicar na lista não tira o foco do campo de leitura
+    tabela.bind("<ButtonRelease-1>", lambda e: focar())
+    entrada_leitura.bind("<Return>", ao_ler)
+    entrada_leitura.bind("<KP_Enter>", ao_ler)
+    entrada_leitura.bind("<Control-z>", desfazer)
+
+    # Associação de um código desconhecido (linha amarela selecionada) a um insumo
+    frame_associar = ttk.Frame(janela)
+    frame_associar.pack(pady=5)
+    label_associar = ttk.Label(frame_associar, text="Associar código a:")
+    label_associar.pack(side=tk.LEFT, padx=5, anchor=tk.N)
+    seletor = SeletorInsumo(frame_associar, indice_insumos, largura=40, linhas=5)
+    seletor.pack(side=tk.LEFT, padx=5)
+
+    def associar():
+        selecionadas = [linhas_tabela[item] for item in tabela.selection() if not linhas_tabela[item][1]]
+        insumo = seletor.selecionado()
+        if not selecionadas or not insumo:
+            sinalizar("Selecione uma linha amarela e o insumo", erro=True)
+            return
+        barras, codigo = selecionadas[0][0], insumo[0]
+
+        def associado(_):
+            sessao.associar(barras, codigo)
+            mostrar_linha(barras, False)
+            mostrar_linha(codigo)
+            seletor.limpar()
+            sinalizar(f"Código {barras} associado a {codigo} - {insumo[1]}")
+            focar()
+
+        executor.executar(estoque.associar_codigo_barras, barras, codigo, ao_concluir=associado,
+                          ao_falhar=lambda erro: sinalizar(f"Erro ao associar o código: {erro}", erro=True),
+                          dono=janela, indicador=indicador)
+
+    btn_associar = ttk.Button(frame_associar, text="Associar", command=associar, bootstyle=INFO)
+    btn_associar.pack(side=tk.LEFT, padx=5, anchor=tk.N)
+
+    def lancar(event=None):
+        if sessao.desconhecidos:
+            sinalizar("Há códigos não cadastrados: associe ou remova as linhas amarelas", erro=True)
+            return "break"
+        linhas = sessao.linhas(tipo.get())
+        if not linhas:
+            sinalizar("A sessão está vazia", erro=True)
+            return "break"
+        entrada_leitura.config(state=tk.DISABLED)
+        btn_lancar.config(state=tk.DISABLED)
+        executor.executar(estoque.aplicar_movimentacoes, linhas, ao_concluir=lancada, ao_falhar=falhou,
+                          dono=janela, indicador=indicador)
+        return "break"
+
+    def liberar():
+        entrada_leitura.config(state=tk.NORMAL)
+        btn_lancar.config(state=tk.NORMAL)
+        focar()
+
+    def lancada(resultados):
+        liberar()
+        if all(resultado.aplicada for resultado in resultados):
+            estoque.agendar_exportacao()  # Atualizar a planilha Excel em segundo plano
+            sinalizar(f"{tipo.get()} lançada: {len(resultados)} item(ns), {sessao.unidades} unidade(s)")
+            sessao.limpar()
+            tabela.delete(*tabela.get_children())
+            linhas_tabela.clear()
+            atualizar_totais()
+            return
+        # As demais linhas voltam com GUIA_CANCELADA; só as que causaram a recusa ficam vermelhas
+        recusadas = 0
+        for resultado in resultados:
+            item = "i:" + resultado.linha.codigo
+            causa = resultado.motivo != movimentacoes.GUIA_CANCELADA
+            recusadas += causa
+            if tabela.exists(item):
+                valores = list(tabela.item(item)["values"])
+                valores[3] = resultado.motivo
+                tabela.item(item, values=valores, tags=("recusada",) if causa else ())
+        sinalizar(f"{recusadas} item(ns) recusado(s); nada foi lançado", erro=True)
+
+    def falhou(erro):
+        liberar()
+        sinalizar(f"Erro ao lançar a sessão: {erro}", erro=True)
+
+    frame_botoes = ttk.Frame(janela)
+    frame_botoes.pack(pady=10)
+    btn_desfazer = ttk.Button(frame_botoes, text="Desfazer Leitura (Ctrl+Z)", command=desfazer, bootstyle=WARNING)
+    btn_desfazer.pack(side=tk.LEFT, padx=5)
+    btn_remover = ttk.Button(frame_botoes, text="Remover Linha", command=remover_linha, bootstyle=SECONDARY)
+    btn_remover.pack(side=tk.LEFT, padx=5)
+    btn_lancar = ttk.Button(frame_botoes, text="Lançar Sessão (F12)", command=lancar, bootstyle=PRIMARY, state=tk.DISABLED)
+    btn_lancar.pack(side=tk.LEFT, padx=5)
+    btn_voltar = ttk.Button(frame_botoes, text="Voltar", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=SECONDARY)
+    btn_voltar.pack(side=tk.LEFT, padx=5)
+    janela.bind("<F12>", lancar)
+
+    # Códigos de barras e índice de itens carregados em segundo plano; a leitura só começa depois
+    def carregar_codigos():
+        indice_insumos.sincronizar(estoque.listar_codigos_nomes())
+        return estoque.listar_codigos_barras()
+
+    def codigos_carregados(pares):
+        sessao.carregar_codigos_barras(pares)
+        liberar()
+        label_situacao.config(text=f"Pronto para ler ({len(indice_insumos)} itens, {len(sessao.barras)} códigos de barras)")
+
+    executor.executar(carregar_codigos, ao_concluir=codigos_carregados,
+                      ao_falhar=lambda erro: label_situacao.config(text=f"Erro ao carregar os códigos: {erro}", background=COR_LEITURA_ERRO),
+                      dono=janela, indicador=indicador)
+
+    janela.protocol("WM_DELETE_WINDOW", lambda: [janela.destroy(), root.deiconify()])
+
+# Função para histórico de movimentações
+def tela_historico(root):
+    root.withdraw()
+    janela = ttk.Toplevel()
+    janela.title("Histórico de Movimentações")
+    janela.geometry("800x600")
+
+    centralizar_janela(janela)
+
+    titulo = ttk.Label(janela, text="Histórico de Movimentações", font=("Arial", 18, "bold"))
+    titulo.pack(pady=10)
+
+    # Filtros: período, item e tipo de movimentação
+    frame_filtros = ttk.Frame(janela)
+    frame_filtros.pack(pady=5)
+    filtros = {}
+    for texto, chave, largura in [("De (DD/MM/AAAA):", "inicio", 11), ("Até:", "fim", 11), ("Código:", "codigo", 12)]:
+        label = ttk.Label(frame_filtros, text=texto)
+        label.pack(side=tk.LEFT, padx=(8, 2))
+        entrada = ttk.Entry(frame_filtros, width=largura)
+        entrada.pack(side=tk.LEFT)
+        entrada.bind("<Return>", lambda e: carregar_historico())
+        filtros[chave] = entrada
+    label_tipo = ttk.Label(frame_filtros, text="Tipo:")
+    label_tipo.pack(side=tk.LEFT, padx=(8, 2))
+    combo_tipo = ttk.Combobox(frame_filtros, state="readonly", width=8, values=("Todos", movimentacoes.ENTRADA, movimentacoes.SAIDA))
+    combo_tipo.current(0)
+    combo_tipo.pack(side=tk.LEFT)
+
+    frame_tabela = ttk.Frame(janela)
+    frame_tabela.pack(fill=tk.BOTH, expand=True)
+
+    colunas = ("ID", "Código do Insumo", "Nome do Insumo", "Tipo", "Quantidade", "Data", "Lote")
+    barra = ttk.Scrollbar(frame_tabela, orient=tk.VERTICAL)
+    tabela = ttk.Treeview(frame_tabela, columns=colunas, show="headings")
+    for col in colunas:
+        tabela.heading(col, text=col)
+        tabela.column(col, width=120)
+    barra.configure(command=tabela.yview)
+    barra.pack(side=tk.RIGHT, fill=tk.Y, pady=10)
+    tabela.pack(fill=tk.BOTH, expand=True, pady=10)
+
+    label_total = ttk.Label(janela, text="")
+    label_total.pack()
+
+    # Carregamento por páginas: a primeira página abre a tela na hora; as seguintes vêm com
+    # "Carregar mais" ou ao rolar até o fim da tabela
+    TAMANHO_PAGINA = 200
+    estado = {"filtro": {}, "ultima": None, "fim": True, "tarefa": None}
+    itens_por_codigo = {}  # código do insumo -> itens da tabela (para os eventos de alteração)
+    indicador = IndicadorOcupado(janela)
+
+    def carregar_pagina():
+        if estado["fim"] or estado["tarefa"] is not None:
+            return
+        estado["tarefa"] = executor.executar(
+            estoque.listar_historico, apos=estado["ultima"], limite=TAMANHO_PAGINA, **estado["filtro"],
+            ao_concluir=mostrar_pagina, ao_falhar=falhar, dono=janela, indicador=indicador)
+
+    def falhar(erro):
+        estado["tarefa"] = None
+        messagebox.showerror("Erro", f"Erro ao carregar o histórico: {erro}", parent=janela)
+
+    def inserir_linha(linha, posicao):
+        item = tabela.insert("", posicao, values=["" if valor is None else valor for valor in linha])
+        itens_por_codigo.setdefault(linha.insumo_codigo, []).append(item)
+
+    def mostrar_total():
+        carregadas = len(tabela.get_children())
+        label_total.config(text=f"{carregadas} movimentações" + ("" if estado["fim"] else " (role para carregar mais)"))
+
+    @instrumentacao.medido("Tela", "histórico: página")
+    def mostrar_pagina(pagina):
+        estado["tarefa"] = None
+        for linha in pagina:
+            inserir_linha(linha, tk.END)
+        if pagina:
+            estado["ultima"] = pagina[-1]
+        estado["fim"] = len(pagina) < TAMANHO_PAGINA
+        mostrar_total()
+        btn_mais.config(state=tk.DISABLED if estado["fim"] else tk.NORMAL)
+
+    def carregar_historico():
+        try:
+            inicio = data_do_formulario(filtros["inicio"].get())
+            fim = data_do_formulario(filtros["fim"].get())
+        except ValueError:
+            messagebox.showerror("Erro", "Formato de data inválido! Use DD/MM/AAAA.")
+            return
+        tipo = combo_tipo.get()
+        estado["filtro"] = {
+            "inicio": inicio,
+            "fim": fim,
+            "codigo": filtros["codigo"].get().strip() or None,
+            "tipo": None if tipo == "Todos" else tipo,
+        }
+        if estado["tarefa"] is not None:
+            estado["tarefa"].cancelar()  # página de um filtro anterior
+            estado["tarefa"] = None
+        estado["ultima"] = None
+        estado["fim"] = False
+        tabela.delete(*tabela.get_children())
+        itens_por_codigo.clear()
+        carregar_pagina()
+
+    def atende_filtro(movimentacao):
+        filtro = estado["filtro"]
+        dia = movimentacao.data[:10]
+        return ((not filtro["inicio"] or dia >= filtro["inicio"]) and (not filtro["fim"] or dia <= filtro["fim"])
+                and (not filtro["codigo"] or movimentacao.insumo_codigo == filtro["codigo"])
+                and (not filtro["tipo"] or movimentacao.tipo == filtro["tipo"]))
+
+    # Movimentações lançadas com a tela aberta entram no topo, se atenderem ao filtro
+    # (a paginação continua a partir da última linha carregada, que não muda)
+    def movimentacoes_lancadas(evento):
+        if estado["ultima"] is None and estado["tarefa"] is not None:
+            return  # a primeira página ainda vai chegar e já as inclui
+        novas = [movimentacao for movimentacao in evento.movimentacoes if atende_filtro(movimentacao)]
+        for movimentacao in novas:
+            inserir_linha(movimentacao, 0)
+        if novas:
+            mostrar_total()
+
+    # Código ou nome alterado: só as linhas daquele item
+    def insumo_alterado(evento):
+        if evento.tipo != eventos.INSUMO_ALTERADO or evento.codigo_anterior not in itens_por_codigo:
+            return
+        itens = itens_por_codigo.pop(evento.codigo_anterior)
+        for item in itens:
+            if tabela.exists(item):
+                valores = list(tabela.item(item)["values"])
+                valores[1], valores[2] = evento.insumo.codigo, evento.insumo.nome
+                tabela.item(item, values=valores)
+        itens_por_codigo.setdefault(evento.insumo.codigo, []).extend(itens)
+
+    eventos.assinar(movimentacoes_lancadas, (eventos.MovimentacoesLancadas,), dono=janela)
+    eventos.assinar(insumo_alterado, (eventos.InsumoAlterado,), dono=janela)
+
+    # Rolagem infinita: ao chegar ao fim da tabela, busca a próxima página
+    def ao_rolar(primeiro, ultimo):
+        barra.set(primeiro, ultimo)
+        if float(ultimo) >= 1.0 and not estado["fim"]:
+            janela.after_idle(carregar_pagina)
+
+    tabela.configure(yscrollcommand=ao_rolar)
+    combo_tipo.bind("<<ComboboxSelected>>", lambda e: carregar_historico())
+
+    btn_filtrar = ttk.Button(frame_filtros, text="Filtrar", command=carregar_historico, bootstyle=INFO)
+    btn_filtrar.pack(side=tk.LEFT, padx=8)
+
+    frame_botoes = ttk.Frame(janela)
+    frame_botoes.pack(pady=10)
+    btn_mais = ttk.Button(frame_botoes, text="Carregar mais", command=carregar_pagina, bootstyle=INFO)
+    btn_mais.pack(side=tk.LEFT, padx=5)
+
+    carregar_historico()
+
+    btn_voltar = ttk.Button(frame_botoes, text="Voltar", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=SECONDARY)
+    btn_voltar.pack(side=tk.LEFT, padx=5)
+
+# Função para verificar validade
+def tela_alertas_validade(root):
+    root.withdraw()
+    janela = ttk.Toplevel()
+    janela.title("Alertas de Validade")
+    janela.geometry("800x600")
+
+    centralizar_janela(janela)
+
+    titulo = ttk.Label(janela, text="Itens Vencidos ou Próximos da Validade", font=("Arial", 18, "bold"))
+    titulo.pack(pady=10)
+
+    # Horizonte dos alertas (dias de antecedência)
+    frame_prazo = ttk.Frame(janela)
+    frame_prazo.pack(pady=5)
+    label_prazo = ttk.Label(frame_prazo, text="Vencendo nos próximos (dias):")
+    label_prazo.pack(side=tk.LEFT, padx=5)
+    entrada_prazo = ttk.Spinbox(frame_prazo, from_=0, to=3650, increment=15, width=6)
+    entrada_prazo.set(banco.DIAS_ALERTA_VALIDADE)
+    entrada_prazo.pack(side=tk.LEFT, padx=5)
+
+    frame_tabela = ttk.Frame(janela)
+    frame_tabela.pack(fill=tk.BOTH, expand=True)
+
+    colunas = ("Código", "Nome", "Lote", "Quantidade", "Validade", "Localização")
+    tabela = ttk.Treeview(frame_tabela, columns=colunas, show="headings")
+    for col in colunas:
+        tabela.heading(col, text=col)
+        tabela.column(col, width=120)
+    tabela.tag_configure("vencido", background="#f8d7da")  # Vermelho Claro
+    tabela.tag_configure("proximo", background="#fff3cd")  # Amarelo Claro
+    tabela.pack(fill=tk.BOTH, expand=True, pady=10)
+
+    indicador = IndicadorOcupado(janela)
+    consulta_pendente = None
+    recarga_agendada = [None]
+    # Alertas exibidos (um por lote; item da tabela = "rowid:lote") e os itens da tabela de cada
+    # código, para os eventos
+    exibidos = {}  # item da tabela -> AlertaValidade
+    itens_por_codigo = {}
+
+    # Uma consulta por intervalo nos índices de validade, feita pelo executor
+    def carregar_alertas():
+        nonlocal consulta_pendente
+        if not entrada_prazo.get().isdigit():
+            messagebox.showerror("Erro", "Informe o número de dias!")
+            return
+        if consulta_pendente is not None:
+            consulta_pendente.cancelar()
+        dias = int(entrada_prazo.get())
+        consulta_pendente = executor.executar(
+            estoque.buscar_alertas_validade, dias,
+            ao_concluir=mostrar_alertas,
+            ao_falhar=lambda erro: messagebox.showerror("Erro", f"Erro ao buscar os alertas: {erro}", parent=janela),
+            dono=janela, indicador=indicador)
+
+    # Uma alteração que pode fazer surgir um lote na lista: uma consulta só para a rajada de eventos
+    def agendar_recarga():
+        if recarga_agendada[0] is None:
+            recarga_agendada[0] = janela.after_idle(recarregar)
+
+    def recarregar():
+        recarga_agendada[0] = None
+        if entrada_prazo.get().isdigit():
+            carregar_alertas()
+
+    def mostrar_item(alerta, posicao):
+        hoje = datetime.now().date().isoformat()
+        valores = [alerta.codigo, alerta.nome, alerta.lote or "", alerta.quantidade, formatar_validade(alerta.validade),
+                   alerta.localizacao]
+        tag = "vencido" if alerta.validade < hoje else "proximo"
+        item = f"{alerta.rowid}:{alerta.lote or ''}"
+        if tabela.exists(item):
+            tabela.item(item, values=valores, tags=(tag,))
+        else:
+            tabela.insert("", posicao, iid=item, values=valores, tags=(tag,))
+        exibidos[item] = alerta
+        itens_por_codigo.setdefault(alerta.codigo, set()).add(item)
+
+    def tirar_item(item):
+        alerta = exibidos.pop(item, None)
+        if alerta is not None:
+            tabela.delete(item)
+            itens_por_codigo.get(alerta.codigo, set()).discard(item)
+
+    @instrumentacao.medido("Tela", "alertas de validade")
+    def mostrar_alertas(alertas):
+        tabela.delete(*tabela.get_children())
+        exibidos.clear()
+        itens_por_codigo.clear()
+        for alerta in alertas:
+            mostrar_item(alerta, tk.END)
+
+    # Item excluído: saem os seus lotes; cadastrado ou alterado: a divisão entre lotes e estoque sem
+    # lote vem do banco, então a lista é consultada de novo se o item estiver nela (ou puder entrar)
+    def insumo_alterado(evento):
+        codigo = evento.codigo_anterior if evento.codigo_anterior is not None else evento.insumo.codigo
+        itens = itens_por_codigo.pop(codigo, set())
+        if evento.tipo == eventos.INSUMO_EXCLUIDO:
+            for item in list(itens):
+                tirar_item(item)
+        elif itens or evento.insumo.validade is not None:
+            agendar_recarga()
+
+    # Saídas e entradas de lotes já listados mudam só a quantidade da linha; uma entrada em lote
+    # que não está na lista pode criar um alerta, então a lista é consultada de novo
+    def movimentacoes_lancadas(evento):
+        for movimentacao in evento.movimentacoes:
+            if movimentacao.id is None and movimentacao.tipo == movimentacoes.SAIDA and movimentacao.lote is None:
+                agendar_recarga()  # modo cliente: a divisão da saída entre os lotes não veio no evento
+                continue
+            item = next((item for item in itens_por_codigo.get(movimentacao.insumo_codigo, ())
+                         if exibidos[item].lote == movimentacao.lote), None)
+            if item is None:
+                if movimentacao.tipo == movimentacoes.ENTRADA:
+                    agendar_recarga()
+                continue
+            alerta = exibidos[item]
+            sinal = 1 if movimentacao.tipo == movimentacoes.ENTRADA else -1
+            quantidade = alerta.quantidade + sinal * movimentacao.quantidade
+            if quantidade > 0:
+                mostrar_item(alerta._replace(quantidade=quantidade), tk.END)
+            else:
+                tirar_item(item)
+
+    eventos.assinar(insumo_alterado, (eventos.InsumoAlterado,), dono=janela)
+    eventos.assinar(movimentacoes_lancadas, (eventos.MovimentacoesLancadas,), dono=janela)
+
+    carregar_alertas()
+
+    btn_atualizar = ttk.Button(frame_prazo, text="Atualizar", command=carregar_alertas, bootstyle=INFO)
+    btn_atualizar.pack(side=tk.LEFT, padx=5)
+    entrada_prazo.bind("<Return>", lambda e: carregar_alertas())
+
+    btn_voltar = ttk.Button(janela, text="Voltar", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=SECONDARY)
+    btn_voltar.pack(pady=10)
+
+# Função para os itens com estoque baixo
+# Itens abaixo do estoque alvo de cada um, dos mais críticos para os menos críticos; a lista e a
+# situação de cada item vêm de uma consulta no índice parcial dos itens abaixo do alvo
+def tela_estoque_baixo(root):
+    root.withdraw()
+    janela = ttk.Toplevel()
+    janela.title("Estoque Baixo")
+    janela.geometry("900x600")
+
+    centralizar_janela(janela)
+
+    titulo = ttk.Label(janela, text="Itens Abaixo do Estoque Alvo", font=("Arial", 18, "bold"))
+    titulo.pack(pady=10)
+
+    label_resumo = ttk.Label(janela, text="")
+    label_resumo.pack()
+
+    frame_tabela = ttk.Frame(janela)
+    frame_tabela.pack(fill=tk.BOTH, expand=True)
+
+    colunas = ("Código", "Nome", "Quantidade", "Mínimo", "Alvo", "Repor", "Localização")
+    barra = ttk.Scrollbar(frame_tabela, orient=tk.VERTICAL)
+    tabela = ttk.Treeview(frame_tabela, columns=colunas, show="headings", selectmode="browse", yscrollcommand=barra.set)
+    for col in colunas:
+        tabela.heading(col, text=col)
+        tabela.column(col, width=100)
+    tabela.column("Nome", width=240)
+    tabela.column("Localização", width=140)
+    for situacao, cor in CORES_ESTOQUE.items():
+        tabela.tag_configure(situacao, background=cor)
+    barra.configure(command=tabela.yview)
+    barra.pack(side=tk.RIGHT, fill=tk.Y, pady=10)
+    tabela.pack(fill=tk.BOTH, expand=True, pady=10)
+
+    indicador = IndicadorOcupado(janela)
+    consulta_pendente = None
+    recarga_agendada = None
+    exibidos = {}  # código -> rowid dos itens na tabela (item da tabela = rowid)
+
+    def carregar_itens():
+        nonlocal consulta_pendente
+        if consulta_pendente is not None:
+            consulta_pendente.cancelar()
+        consulta_pendente = executor.executar(
+            estoque.listar_estoque_baixo,
+            ao_concluir=mostrar_itens,
+            ao_falhar=lambda erro: messagebox.showerror("Erro", f"Erro ao buscar o estoque baixo: {erro}", parent=janela),
+            dono=janela, indicador=indicador)
+
+    # Uma consulta só para a rajada de eventos de uma guia ou de uma edição
+    def agendar_recarga():
+        nonlocal recarga_agendada
+        if recarga_agendada is None:
+            recarga_agendada = janela.after_idle(recarregar)
+
+    def recarregar():
+        nonlocal recarga_agendada
+        recarga_agendada = None
+        carregar_itens()
+
+    @instrumentacao.medido("Tela", "estoque baixo")
+    def mostrar_itens(itens):
+        tabela.delete(*tabela.get_children())
+        exibidos.clear()
+        for item in itens:
+            valores = [item.codigo, item.nome, item.quantidade, item.estoque_minimo, item.estoque_alvo,
+                       item.estoque_alvo - item.quantidade, item.localizacao or ""]
+            tabela.insert("", tk.END, iid=str(item.rowid), values=valores, tags=(item.situacao,))
+            exibidos[item.codigo] = item.rowid
+        baixos = sum(1 for item in itens if item.situacao == banco.ESTOQUE_BAIXO)
+        label_resumo.config(text=f"{len(itens)} itens abaixo do alvo, {baixos} no estoque mínimo ou abaixo dele")
+
+    # Um item entra, sai ou muda de posição conforme a situação calculada no banco: a lista é
+    # consultada de novo quando um item exibido muda ou quando outro item pode ter entrado nela
+    def insumo_alterado(evento):
+        if evento.tipo == eventos.INSUMO_EXCLUIDO:
+            if evento.codigo_anterior in exibidos:
+                agendar_recarga()
+        elif evento.codigo_anterior in exibidos or evento.insumo.situacao != banco.ESTOQUE_OK:
+            agendar_recarga()
+
+    def movimentacoes_lancadas(evento):
+        if any(codigo in exibidos for codigo in evento.saldos) or \
+                any(movimentacao.tipo == movimentacoes.SAIDA for movimentacao in evento.movimentacoes):
+            agendar_recarga()
+
+    eventos.assinar(insumo_alterado, (eventos.InsumoAlterado,), dono=janela)
+    eventos.assinar(movimentacoes_lancadas, (eventos.MovimentacoesLancadas,), dono=janela)
+
+    # Duplo clique: editar o item (por exemplo, para ajustar os níveis de estoque)
+    def editar_selecionado(event=None):
+        selecao = tabela.selection()
+        if selecao:
+            editar_insumo(int(selecao[0]))
+
+    tabela.bind("<Double-1>", editar_selecionado)
+
+    frame_botoes = ttk.Frame(janela)
+    frame_botoes.pack(pady=10)
+
+    btn_editar = ttk.Button(frame_botoes, text="Editar Insumo", command=editar_selecionado, bootstyle=SUCCESS)
+    btn_editar.pack(side=tk.LEFT, padx=5)
+    btn_atualizar = ttk.Button(frame_botoes, text="Atualizar", command=carregar_itens, bootstyle=INFO)
+    btn_atualizar.pack(side=tk.LEFT, padx=5)
+    btn_voltar = ttk.Button(frame_botoes, text="Voltar", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=SECONDARY)
+    btn_voltar.pack(side=tk.LEFT, padx=5)
+
+    janela.protocol("WM_DELETE_WINDOW", lambda: [janela.destroy(), root.deiconify()])
+
+    carregar_itens()
+
+def tela_reposicao(root):
+    root.withdraw()
+    janela = ttk.Toplevel()
+    janela.title("Reposição")
+    janela.geometry("900x600")
+
+    centralizar_janela(janela)
+
+    titulo = ttk.Label(janela, text="Previsão de Reposição", font=("Arial", 18, "bold"))
+    titulo.pack(pady=10)
+
+    label_status = ttk.Label(janela, text="")
+    label_status.pack()
+
+    frame_tabela = ttk.Frame(janela)
+    frame_tabela.pack(fill=tk.BOTH, expand=True)
+
+    colunas = ("Código", "Nome", "Estoque", "Consumo/dia", "Dias restantes", "Ruptura prevista", "Repor")
+    barra = ttk.Scrollbar(frame_tabela, orient=tk.VERTICAL)
+    tabela = ttk.Treeview(frame_tabela, columns=colunas, show="headings", yscrollcommand=barra.set)
+    for col in colunas:
+        tabela.heading(col, text=col)
+        tabela.column(col, width=110)
+    tabela.column("Nome", width=220)
+    tabela.tag_configure("urgente", background="#f8d7da")  # Vermelho Claro
+    tabela.tag_configure("atencao", background="#fff3cd")  # Amarelo Claro
+    barra.configure(command=tabela.yview)
+    barra.pack(side=tk.RIGHT, fill=tk.Y, pady=10)
+    tabela.pack(fill=tk.BOTH, expand=True, pady=10)
+
+    indicador = IndicadorOcupado(janela)
+
+    # Mostra a previsão já guardada no banco (abre na hora)
+    def carregar_previsao():
+        executor.executar(estoque.listar_previsao_reposicao, ao_concluir=mostrar_previsao, dono=janela, indicador=indicador)
+
+    @instrumentacao.medido("Tela", "reposição")
+    def mostrar_previsao(itens):
+        tabela.delete(*tabela.get_children())
+        for item in itens:
+            taxa = max(item.media_diaria, item.media_ponderada)
+            if item.dias_restantes is None:
+                restantes, ruptura, tag = "Sem consumo", "-", ""
+            else:
+                restantes, ruptura = f"{item.dias_restantes:.1f}", formatar_validade(item.data_ruptura)
+                if item.dias_restantes <= banco.PRAZO_REPOSICAO_DIAS:
+                    tag = "urgente"
+                elif item.dias_restantes <= 2 * banco.PRAZO_REPOSICAO_DIAS:
+                    tag = "atencao"
+                else:
+                    tag = ""
+            valores = [item.insumo_codigo, item.nome, item.quantidade, f"{taxa:.2f}", restantes, ruptura, item.reposicao_sugerida]
+            tabela.insert("", tk.END, values=valores, tags=(tag,))
+
+    # Recalcula em segundo plano só o que mudou e recarrega a tabela ao terminar
+    def atualizado(_):
+        btn_atualizar.config(state=tk.NORMAL)
+        carregar_previsao()
+        label_status.config(text=f"Previsão atualizada às {datetime.now():%H:%M}. "
+                                 f"Prazo de entrega: {banco.PRAZO_REPOSICAO_DIAS} dias; "
+                                 f"reposição para {banco.COBERTURA_DIAS} dias de consumo.")
+
+    def falhou(erro):
+        btn_atualizar.config(state=tk.NORMAL)
+        label_status.config(text=f"Erro ao atualizar a previsão: {erro}")
+
+    def atualizar():
+        label_status.config(text="Atualizando previsão...")
+        btn_atualizar.config(state=tk.DISABLED)
+        executor.executar(estoque.atualizar_previsao, ao_concluir=atualizado, ao_falhar=falhou,
+                          dono=janela, indicador=indicador)
+
+    frame_botoes = ttk.Frame(janela)
+    frame_botoes.pack(pady=10)
+
+    btn_atualizar = ttk.Button(frame_botoes, text="Atualizar", command=atualizar, bootstyle=INFO)
+    btn_atualizar.pack(side=tk.LEFT, padx=5)
+
+    btn_voltar = ttk.Button(frame_botoes, text="Voltar", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=SECONDARY)
+    btn_voltar.pack(side=tk.LEFT, padx=5)
+
+    carregar_previsao()
+    atualizar()
+
+def tela_gerar_relatorio(root):
+    root.withdraw()
+    janela = ttk.Toplevel()
+    janela.title("Gerar Relatório")
+    janela.geometry("800x600")
+
+    centralizar_janela(janela)
+
+    titulo = ttk.Label(janela, text="Relatório de Movimentações em PDF", font=("Arial", 18, "bold"))
+    titulo.pack(pady=10)
+
+    label = ttk.Label(janela, text="Deixe os filtros em branco para incluir todas as movimentações.")
+    label.pack(pady=5)
+
+    # Filtros do relatório: período, item e tipo
+    frame_filtros = ttk.Frame(janela)
+    frame_filtros.pack(pady=10)
+    filtros = {}
+    for linha, (texto, chave) in enumerate([("Data inicial (DD/MM/AAAA):", "inicio"),
+                                            ("Data final (DD/MM/AAAA):", "fim"),
+                                            ("Código do insumo:", "codigo")]):
+        rotulo = ttk.Label(frame_filtros, text=texto)
+        rotulo.grid(row=linha, column=0, sticky=tk.W, padx=5, pady=5)
+        entrada = ttk.Entry(frame_filtros, width=20)
+        entrada.grid(row=linha, column=1, padx=5, pady=5)
+        filtros[chave] = entrada
+    rotulo_tipo = ttk.Label(frame_filtros, text="Tipo:")
+    rotulo_tipo.grid(row=3, column=0, sticky=tk.W, padx=5, pady=5)
+    combo_tipo = ttk.Combobox(frame_filtros, state="readonly", width=18, values=("Todos", movimentacoes.ENTRADA, movimentacoes.SAIDA))
+    combo_tipo.current(0)
+    combo_tipo.grid(row=3, column=1, padx=5, pady=5)
+
+    barra_progresso = ttk.Progressbar(janela, length=400, mode="determinate", bootstyle=SUCCESS)
+    barra_progresso.pack(pady=10)
+    label_status = ttk.Label(janela, text="")
+    label_status.pack()
+
+    # O relatório é gerado pelo executor, que entrega o progresso e o resultado à tela
+    tarefa = None
+
+    # Roda numa thread do executor; o reportlab é carregado ali, sem travar a tela
+    def gerar_pdf(parametros, cancelado, progresso):
+        import relatorios
+        return relatorios.gerar_relatorio_pdf(progresso=progresso, cancelado=cancelado, **parametros)
+
+    def mostrar_progresso(feitas, total):
+        if total:
+            barra_progresso.config(maximum=total, value=feitas)
+            label_status.config(text=f"{feitas} de {total} movimentações")
+
+    def terminar():
+        btn_gerar.config(state=tk.NORMAL)
+        btn_cancelar.config(state=tk.DISABLED)
+
+    def concluido(nome_arquivo):
+        terminar()
+        messagebox.showinfo("Sucesso", f"Relatório gerado: {nome_arquivo}", parent=janela)
+
+    def falhou(erro):
+        terminar()
+        label_status.config(text="")
+        messagebox.showerror("Erro", f"Não foi possível gerar o relatório: {erro}", parent=janela)
+
+    def gerar():
+        try:
+            inicio = data_do_formulario(filtros["inicio"].get())
+            fim = data_do_formulario(filtros["fim"].get())
+        except ValueError:
+            messagebox.showerror("Erro", "Formato de data inválido! Use DD/MM/AAAA.", parent=janela)
+            return
+        tipo = combo_tipo.get()
+        parametros = {
+            "inicio": inicio,
+            "fim": fim,
+            "codigo": filtros["codigo"].get().strip() or None,
+            "tipo": None if tipo == "Todos" else tipo,
+        }
+        nonlocal tarefa
+        barra_progresso.config(value=0)
+        label_status.config(text="Gerando relatório...")
+        btn_gerar.config(state=tk.DISABLED)
+        btn_cancelar.config(state=tk.NORMAL)
+        tarefa = executor.executar(gerar_pdf, parametros, cancelavel=True, ao_progresso=mostrar_progresso,
+                                   ao_concluir=concluido, ao_falhar=falhou, dono=janela)
+
+    def cancelar():
+        if tarefa is not None and not tarefa.concluida():
+            tarefa.cancelar()  # o arquivo de destino não é alterado
+            terminar()
+            label_status.config(text="Relatório cancelado.")
+
+    def voltar():
+        cancelar()
+        janela.destroy()
+        root.deiconify()
+
+    frame_botoes = ttk.Frame(janela)
+    frame_botoes.pack(pady=10)
+
+    btn_gerar = ttk.Button(frame_botoes, text="Gerar Relatório", command=gerar, bootstyle=SUCCESS)
+    btn_gerar.pack(side=tk.LEFT, padx=5)
+
+    btn_cancelar = ttk.Button(frame_botoes, text="Cancelar", command=cancelar, bootstyle=DANGER, state=tk.DISABLED)
+    btn_cancelar.pack(side=tk.LEFT, padx=5)
+
+    btn_voltar = ttk.Button(frame_botoes, text="Voltar", command=voltar, bootstyle=SECONDARY)
+    btn_voltar.pack(side=tk.LEFT, padx=5)
+
+    janela.protocol("WM_DELETE_WINDOW", voltar)
+
+# Função para consolidar as planilhas das filiais (veja consolidacao.py)
+# Os arquivos da pasta são lidos em paralelo, em processos separados; a tela mostra o progresso
+# e a situação de cada arquivo, e o relatório de erros pode ser salvo em CSV.
+def tela_consolidar_filiais(root):
+    root.withdraw()
+    janela = ttk.Toplevel()
+    janela.title("Consolidar Filiais")
+    janela.geometry("800x600")
+
+    centralizar_janela(janela)
+
+    titulo = ttk.Label(janela, text="Consolidação das Planilhas das Filiais", font=("Arial", 18, "bold"))
+    titulo.pack(pady=10)
+
+    label = ttk.Label(janela, text="Cada planilha da pasta é uma filial (o nome do arquivo).")
+    label.pack(pady=5)
+
+    frame_pasta = ttk.Frame(janela)
+    frame_pasta.pack(pady=5)
+    label_pasta = ttk.Label(frame_pasta, text="Pasta:")
+    label_pasta.pack(side=tk.LEFT, padx=5)
+    entrada_pasta = ttk.Entry(frame_pasta, width=50)
+    entrada_pasta.pack(side=tk.LEFT, padx=5)
+
+    def escolher_pasta():
+        pasta = filedialog.askdirectory(parent=janela, title="Pasta com as planilhas das filiais")
+        if pasta:
+            entrada_pasta.delete(0, tk.END)
+            entrada_pasta.insert(0, pasta)
+
+    btn_escolher = ttk.Button(frame_pasta, text="Escolher...", command=escolher_pasta, bootstyle=INFO)
+    btn_escolher.pack(side=tk.LEFT, padx=5)
+
+    barra_progresso = ttk.Progressbar(janela, length=400, mode="determinate", bootstyle=SUCCESS)
+    barra_progresso.pack(pady=10)
+    label_status = ttk.Label(janela, text="")
+    label_status.pack()
+
+    frame_tabela = ttk.Frame(janela)
+    frame_tabela.pack(fill=tk.BOTH, expand=True, padx=10)
+    colunas = ("Arquivo", "Filial", "Itens", "Rejeitadas", "Situação")
+    tabela = ttk.Treeview(frame_tabela, columns=colunas, show="headings", height=10)
+    for col in colunas:
+        tabela.heading(col, text=col)
+        tabela.column(col, width=120)
+    tabela.column("Situação", width=260)
+    tabela.tag_configure("erro", background="#f8d7da")  # Vermelho Claro
+    tabela.tag_configure("rejeitadas", background="#fff3cd")  # Amarelo Claro
+    tabela.pack(fill=tk.BOTH, expand=True, pady=10)
+
+    tarefa = None
+    ultimo_resultado = [None]
+
+    # Roda numa thread do executor; o pandas e o pool de processos são carregados ali
+    def consolidar_pasta(pasta, cancelado, progresso):
+        import consolidacao
+        return consolidacao.consolidar_filiais(pasta, progresso=progresso, cancelado=cancelado)
+
+    def mostrar_progresso(lidos, total):
+        barra_progresso.config(maximum=total, value=lidos)
+        label_status.config(text=f"{lidos} de {total} planilhas lidas")
+
+    def terminar():
+        btn_consolidar.config(state=tk.NORMAL)
+        btn_cancelar.config(state=tk.DISABLED)
+
+    def concluido(resultado):
+        terminar()
+        if resultado is None:
+            return
+        ultimo_resultado[0] = resultado
+        tabela.delete(*tabela.get_children())
+        for arquivo in resultado.arquivos:
+            tag = "erro" if arquivo.erro else "rejeitadas" if arquivo.linhas_rejeitadas else ""
+            tabela.insert("", tk.END, tags=(tag,), values=(
+                arquivo.arquivo, arquivo.filial, arquivo.itens, len(arquivo.linhas_rejeitadas), arquivo.situacao()))
+        label_status.config(text=resultado.resumo())
+        com_erros = resultado.com_erro or any(arquivo.linhas_rejeitadas for arquivo in resultado.arquivos)
+        btn_relatorio.config(state=tk.NORMAL if com_erros else tk.DISABLED)
+
+    def falhou(erro):
+        terminar()
+        label_status.config(text="")
+        messagebox.showerror("Erro", f"Não foi possível consolidar as planilhas: {erro}", parent=janela)
+
+    def consolidar():
+        nonlocal tarefa
+        pasta = entrada_pasta.get().strip()
+        if not pasta or not os.path.isdir(pasta):
+            messagebox.showerror("Erro", "Escolha a pasta com as planilhas das filiais!", parent=janela)
+            return
+        barra_progresso.config(value=0)
+        label_status.config(text="Lendo as planilhas...")
+        btn_consolidar.config(state=tk.DISABLED)
+        btn_cancelar.config(state=tk.NORMAL)
+        tarefa = executor.executar(consolidar_pasta, pasta, cancelavel=True, ao_progresso=mostrar_progresso,
+                                   ao_concluir=concluido, ao_falhar=falhou, dono=janela)
+
+    def cancelar():
+        if tarefa is not None and not tarefa.concluida():
+            tarefa.cancelar()  # nada é gravado: a gravação só começa depois de todas as leituras
+            terminar()
+            label_status.config(text="Consolidação cancelada.")
+
+    def salvar_relatorio():
+        import consolidacao
+        nome_arquivo = filedialog.asksaveasfilename(parent=janela, defaultextension=".csv",
+                                                    initialfile="erros_filiais.csv", filetypes=[("CSV", "*.csv")])
+        if nome_arquivo:
+            consolidacao.gravar_relatorio(ultimo_resultado[0], nome_arquivo)
+            messagebox.showinfo("Sucesso", f"Relatório salvo: {nome_arquivo}", parent=janela)
+
+    def voltar():
+        cancelar()
+        janela.destroy()
+        root.deiconify()
+
+    frame_botoes = ttk.Frame(janela)
+    frame_botoes.pack(pady=10)
+
+    btn_consolidar = ttk.Button(frame_botoes, text="Consolidar", command=consolidar, bootstyle=SUCCESS)
+    btn_consolidar.pack(side=tk.LEFT, padx=5)
+
+    btn_cancelar = ttk.Button(frame_botoes, text="Cancelar", command=cancelar, bootstyle=DANGER, state=tk.DISABLED)
+    btn_cancelar.pack(side=tk.LEFT, padx=5)
+
+    btn_relatorio = ttk.Button(frame_botoes, text="Salvar Relatório de Erros", command=salvar_relatorio, bootstyle=INFO, state=tk.DISABLED)
+    btn_relatorio.pack(side=tk.LEFT, padx=5)
+
+    btn_voltar = ttk.Button(frame_botoes, text="Voltar", command=voltar, bootstyle=SECONDARY)
+    btn_voltar.pack(side=tk.LEFT, padx=5)
+
+    janela.protocol("WM_DELETE_WINDOW", voltar)
+
+# Tela de diagnóstico: operações mais lentas desde que o aplicativo foi aberto
+def tela_diagnostico(root):
+    root.withdraw()
+    janela = ttk.Toplevel()
+    janela.title("Diagnóstico")
+    janela.geometry("1000x650")
+
+    centralizar_janela(janela)
+
+    titulo = ttk.Label(janela, text="Operações Mais Lentas", font=("Arial", 18, "bold"))
+    titulo.pack(pady=10)
+
+    label_limites = ttk.Label(janela, text=f"Registradas em {instrumentacao.caminho_log()}: SQL acima de "
+                                           f"{instrumentacao.LIMITE_SQL_MS} ms e demais operações acima de "
+                                           f"{instrumentacao.LIMITE_OPERACAO_MS} ms.")
+    label_limites.pack()
+
+    frame_tabela = ttk.Frame(janela)
+    frame_tabela.pack(fill=tk.BOTH, expand=True)
+
+    colunas = ("Tipo", "Operação", "Execuções", "Média (ms)", "p50 (ms)", "p95 (ms)", "Máx. (ms)", "Total (ms)")
+    tabela = ttk.Treeview(frame_tabela, columns=colunas, show="headings", selectmode="browse")
+    for col in colunas:
+        tabela.heading(col, text=col)
+        tabela.column(col, width=85, anchor=tk.E)
+    tabela.column("Tipo", width=90, anchor=tk.W)
+    tabela.column("Operação", width=360, anchor=tk.W)
+    tabela.tag_configure("varredura", background="#fff3cd")  # Amarelo Claro
+    tabela.pack(fill=tk.BOTH, expand=True, pady=10)
+
+    # Plano de execução da consulta selecionada
+    texto_plano = tk.Text(janela, height=6, wrap=tk.WORD)
+    texto_plano.pack(fill=tk.X, padx=10)
+
+    estatisticas = {}
+
+    def carregar_diagnostico():
+        tabela.delete(*tabela.get_children())
+        estatisticas.clear()
+        for estatistica in instrumentacao.operacoes_mais_lentas():
+            valores = [estatistica.categoria, estatistica.nome, estatistica.contagem,
+                       f"{estatistica.media_ms:.1f}", f"{estatistica.percentil(50):.1f}",
+                       f"{estatistica.percentil(95):.1f}", f"{estatistica.maximo_ms:.1f}",
+                       f"{estatistica.total_ms:.0f}"]
+            item = tabela.insert("", tk.END, values=valores, tags=("varredura",) if estatistica.varredura else ())
+            estatisticas[item] = estatistica
+
+    def mostrar_plano(event=None):
+        texto_plano.delete("1.0", tk.END)
+        selecao = tabela.selection()
+        if not selecao:
+            return
+        estatistica = estatisticas[selecao[0]]
+        texto_plano.insert(tk.END, estatistica.nome + "\n")
+        if estatistica.plano:
+            aviso = "  (varredura completa de tabela)" if estatistica.varredura else ""
+            texto_plano.insert(tk.END, "Plano:" + aviso + "\n  " + "\n  ".join(estatistica.plano))
+
+    tabela.bind("<<TreeviewSelect>>", mostrar_plano)
+
+    def limpar():
+        instrumentacao.limpar()
+        carregar_diagnostico()
+        texto_plano.delete("1.0", tk.END)
+
+    frame_botoes = ttk.Frame(janela)
+    frame_botoes.pack(pady=10)
+
+    btn_atualizar = ttk.Button(frame_botoes, text="Atualizar", command=carregar_diagnostico, bootstyle=INFO)
+    btn_atualizar.pack(side=tk.LEFT, padx=5)
+
+    btn_limpar = ttk.Button(frame_botoes, text="Limpar", command=limpar, bootstyle=WARNING)
+    btn_limpar.pack(side=tk.LEFT, padx=5)
+
+    btn_voltar = ttk.Button(frame_botoes, text="Voltar", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=SECONDARY)
+    btn_voltar.pack(side=tk.LEFT, padx=5)
+
+    carregar_diagnostico()
+
+# Aplicar estilo ao aplicativo
+def aplicar_estilos():
+    estilo = ttk.Style()
+    estilo.theme_use('litera')  # Escolha o tema desejado
+
+# Tempo máximo (ms) para o menu principal aparecer; acima disso a inicialização é registrada como lenta
+ORCAMENTO_INICIO_MS = 1500
+
+# Telas que dependem da planilha já sincronizada; as demais só precisam do banco pronto
+TELAS_DEPENDENTES_DA_PLANILHA = {
+    "Registrar Novo Insumo",
+    "Monitorar Estoque",
+    "Movimentar Estoque",
+    "Leitura de Códigos",
+    "Alertas de Validade",
+    "Estoque Baixo",
+    "Reposição",
+}
+
+# Telas que leem o banco deste computador e ficam desabilitadas em modo cliente
+TELAS_SOMENTE_LOCAIS = {
+    "Gerar Relatório",
+    "Consolidar Filiais",
+}
+
+# Função para registrar o tempo de inicialização no console
+def registrar_inicializacao(etapa, inicio, orcamento_ms=None):
+    decorrido = (time.perf_counter() - inicio) * 1000
+    texto = f"Inicialização: {etapa} em {decorrido:.0f} ms"
+    if orcamento_ms is not None:
+        situacao = "dentro" if decorrido <= orcamento_ms else "ACIMA"
+        texto += f" ({situacao} do orçamento de {orcamento_ms} ms)"
+    print(texto)
+
+# Menu principal
+# A janela é desenhada primeiro; o banco e a planilha são preparados numa thread em segundo
+# plano, e os botões ficam desabilitados até os dados de que dependem estarem prontos.
+# inicio: time.perf_counter() do começo do processo, para medir a inicialização
+# servidor: "host:porta" do serviço de estoque (servico.py); sem ele, usa o banco local
+def iniciar_aplicativo(planilha_path, inicio=None, servidor=None):
+    global estoque
+    inicio = inicio or time.perf_counter()
+    if servidor:
+        from cliente import ClienteEstoque
+        estoque = ClienteEstoque(servidor)
+
+    root = ttk.Window(themename="litera")  # Escolha o tema desejado
+    aplicar_estilos()  # Aplicar os estilos
+    root.title("Controle de Estoque - Clínica Odontológica")
+    root.geometry("800x650")
+
+    centralizar_janela(root)
+
+    titulo = ttk.Label(root, text="Menu Principal", font=("Arial", 18, "bold"))
+    titulo.pack(pady=20)
+
+    botoes = [
+        ("Registrar Novo Insumo", lambda: tela_registrar_insumos(root)),
+        ("Monitorar Estoque", lambda: tela_monitorar_estoque(root)),
+        ("Movimentar Estoque", lambda: tela_movimentacao_estoque(root)),
+        ("Leitura de Códigos", lambda: tela_leitura_codigos(root)),
+        ("Histórico de Movimentações", lambda: tela_historico(root)),
+        ("Alertas de Validade", lambda: tela_alertas_validade(root)),
+        ("Estoque Baixo", lambda: tela_estoque_baixo(root)),
+        ("Reposição", lambda: tela_reposicao(root)),
+        ("Gerar Relatório", lambda: tela_gerar_relatorio(root)),
+        ("Consolidar Filiais", lambda: tela_consolidar_filiais(root)),
+        ("Diagnóstico", lambda: tela_diagnostico(root))
+    ]
+
+    botoes_menu = {}
+    for texto, comando in botoes:
+        btn = ttk.Button(root, text=texto, width=30, command=comando, bootstyle=SUCCESS, state=tk.DISABLED)
+        btn.pack(pady=5)
+        botoes_menu[texto] = btn
+
+    def sair():
+        executor.encerrar()
+        estoque.encerrar()  # Garante que a última alteração chegue à planilha
+        root.quit()
+
+    btn_sair = ttk.Button(root, text="Sair", width=30, command=sair, bootstyle=DANGER)
+    btn_sair.pack(pady=5)
+    root.protocol("WM_DELETE_WINDOW", sair)
+
+    label_status = ttk.Label(root, text="Preparando o banco de dados...", bootstyle=SECONDARY)
+    label_status.pack(side=tk.BOTTOM, pady=10)
+
+    executor.vincular(root)
+
+    # Sincronização em segundo plano: primeiro o esquema do banco, depois a planilha
+    def habilitar(todas):
+        for texto, btn in botoes_menu.items():
+            if estoque.remoto and texto in TELAS_SOMENTE_LOCAIS:
+                continue
+            if todas or texto not in TELAS_DEPENDENTES_DA_PLANILHA:
+                btn.config(state=tk.NORMAL)
+
+    def banco_pronto(_):
+        habilitar(False)
+        label_status.config(text="Sincronizando a planilha...")
+        executor.executar(carregar_planilha_para_banco, planilha_path,
+                          ao_concluir=planilha_sincronizada, ao_falhar=sincronizacao_falhou)
+
+    def planilha_sincronizada(resultado):
+        habilitar(True)
+        label_status.config(text=f"Planilha sincronizada: {resultado.resumo()}")
+        registrar_inicializacao("dados sincronizados", inicio)
+        executor.executar(manutencao_periodica, ao_concluir=manutencao_feita,
+                          ao_falhar=lambda erro: print(f"Erro na manutenção do banco: {erro}"))
+
+    # Arquivamento do histórico antigo e ANALYZE, no máximo uma vez por semana (arquivamento.py)
+    def manutencao_periodica():
+        import arquivamento
+        return arquivamento.manutencao_periodica()
+
+    def manutencao_feita(resultado):
+        if resultado is not None:
+            print("Manutenção do banco: " + "; ".join(resultado.etapas))
+
+    def sincronizacao_falhou(erro):
+        print(f"Erro ao sincronizar a planilha: {erro}")
+        habilitar(True)
+        label_status.config(text=f"Erro ao sincronizar a planilha: {erro}", bootstyle=DANGER)
+
+    # Modo cliente: a planilha é do serviço; baixa a lista de itens e os alertas numa só requisição
+    def servico_conectado(resultado):
+        itens, alertas = resultado
+        habilitar(True)
+        label_status.config(text=f"Conectado ao {estoque.descricao}: {itens} itens, {alertas} alertas de validade")
+        registrar_inicializacao("dados sincronizados", inicio)
+
+    def servico_indisponivel(erro):
+        print(f"Erro ao conectar ao serviço de estoque: {erro}")
+        label_status.config(text=f"Serviço de estoque indisponível: {erro}", bootstyle=DANGER)
+        root.after(5000, conectar_servico)
+
+    def conectar_servico():
+        label_status.config(text=f"Conectando ao {estoque.descricao}...", bootstyle=SECONDARY)
+        executor.executar(estoque.sincronizar, ao_concluir=servico_conectado, ao_falhar=servico_indisponivel)
+
+    def janela_desenhada():
+        registrar_inicializacao("menu principal desenhado", inicio, ORCAMENTO_INICIO_MS)
+        if estoque.remoto:
+            conectar_servico()
+        else:
+            executor.executar(banco.criar_tabelas, ao_concluir=banco_pronto, ao_falhar=sincronizacao_falhou)
+
+    # Só começa a sincronizar depois que o menu foi desenhado
+    root.after_idle(lambda: root.after(0, janela_desenhada))
+
+    root.mainloop()
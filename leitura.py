@@ -0,0 +1,111 @@
+from collections import namedtuple
+
+# Sessão de leitura de códigos de barras
+# O leitor funciona como teclado: digita o código e um Enter. Cada leitura é resolvida em
+# memória (código do item no índice do autocompletar ou código de barras do fabricante, lido do
+# banco ao abrir a tela) e soma unidades ao item na sessão. Nada é gravado até a sessão ser
+# lançada, de uma vez, por movimentacoes.aplicar_movimentacoes.
+#
+# Uma leitura pode trazer a quantidade antes de um "*": "12*7891234567890" = 12 unidades.
+
+SEPARADOR_QUANTIDADE = "*"
+
+# Resultado de uma leitura: chave da linha na sessão (código do item, ou o texto lido se ele não
+# estiver cadastrado), código do item (None se desconhecido), nome, unidades lidas e total da linha
+Leitura = namedtuple("Leitura", "chave codigo nome quantidade total")
+
+class SessaoLeitura:
+    def __init__(self, indice, codigos_barras=()):
+        self.indice = indice  # autocompletar.IndiceInsumos
+        self.barras = dict(codigos_barras)  # código de barras -> código do item
+        self.contagens = {}  # código do item -> unidades, na ordem da primeira leitura
+        self.desconhecidos = {}  # texto lido sem item associado -> unidades
+        self._leituras = []  # (chave, conhecido, unidades), para desfazer
+
+    def __len__(self):
+        return len(self.contagens) + len(self.desconhecidos)
+
+    @property
+    def unidades(self):
+        return sum(self.contagens.values())
+
+    def carregar_codigos_barras(self, pares):
+        self.barras = dict(pares)
+
+    # Código do item lido, ou None
+    def resolver(self, texto):
+        if texto in self.indice:
+            return texto
+        codigo = self.barras.get(texto)
+        if codigo is not None and codigo in self.indice:
+            return codigo
+        return None
+
+    # Separa "quantidade*código"; a quantidade padrão é 1
+    @staticmethod
+    def _interpretar(texto):
+        texto = texto.strip()
+        quantidade, separador, resto = texto.partition(SEPARADOR_QUANTIDADE)
+        if separador and quantidade.strip().isdigit():
+            texto, quantidade = resto.strip(), int(quantidade)
+            if quantidade <= 0:
+                raise ValueError("Quantidade inválida")
+        else:
+            quantidade = 1
+        if not texto:
+            raise ValueError("Leitura vazia")
+        return texto, quantidade
+
+    # Função para registrar uma leitura; retorna a Leitura (ValueError se o texto for inválido)
+    def registrar(self, texto):
+        texto, quantidade = self._interpretar(texto)
+        codigo = self.resolver(texto)
+        if codigo is None:
+            self.desconhecidos[texto] = self.desconhecidos.get(texto, 0) + quantidade
+            self._leituras.append((texto, False, quantidade))
+            return Leitura(texto, None, None, quantidade, self.desconhecidos[texto])
+        self.contagens[codigo] = self.contagens.get(codigo, 0) + quantidade
+        self._leituras.append((codigo, True, quantidade))
+        return Leitura(codigo, codigo, self.indice.nome(codigo), quantidade, self.contagens[codigo])
+
+    def total(self, chave, conhecido=True):
+        return (self.contagens if conhecido else self.desconhecidos).get(chave, 0)
+
+    def _subtrair(self, contagens, chave, quantidade):
+        restante = contagens.get(chave, 0) - quantidade
+        if restante > 0:
+            contagens[chave] = restante
+        else:
+            contagens.pop(chave, None)
+
+    # Função para desfazer a última leitura; retorna (chave, conhecido) da linha alterada ou None
+    def desfazer(self):
+        while self._leituras:
+            chave, conhecido, quantidade = self._leituras.pop()
+            contagens = self.contagens if conhecido else self.desconhecidos
+            if chave in contagens:  # a linha pode ter sido removida depois da leitura
+                self._subtrair(contagens, chave, quantidade)
+                return chave, conhecido
+        return None
+
+    def remover(self, chave, conhecido=True):
+        (self.contagens if conhecido else self.desconhecidos).pop(chave, None)
+
+    # Função para associar um texto lido desconhecido a um item: as unidades já lidas passam
+    # para a linha do item e as próximas leituras já saem resolvidas
+    def associar(self, barras, codigo):
+        self.barras[barras] = codigo
+        quantidade = self.desconhecidos.pop(barras, 0)
+        if quantidade:
+            self.contagens[codigo] = self.contagens.get(codigo, 0) + quantidade
+        self._leituras = [(codigo, True, unidades) if (chave, conhecido) == (barras, False) else (chave, conhecido, unidades)
+                          for chave, conhecido, unidades in self._leituras]
+
+    # Linhas (codigo, tipo, quantidade) para movimentacoes.aplicar_movimentacoes
+    def linhas(self, tipo):
+        return [(codigo, tipo, quantidade) for codigo, quantidade in self.contagens.items()]
+
+    def limpar(self):
+        self.contagens.clear()
+        self.desconhecidos.clear()
+        self._leituras.clear()
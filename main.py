@@ -1,644 +1,234 @@
-import tkinter as tk
-import ttkbootstrap as ttk
-from ttkbootstrap.constants import *
-import sqlite3
-from tkinter import messagebox
-import pandas as pd
-from datetime import datetime, timedelta
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-
-# Adaptadores personalizados para datetime
-def adapt_datetime(dt):
-    return dt.isoformat()
-
-def convert_datetime(s):
-    return datetime.fromisoformat(s.decode())
-
-sqlite3.register_adapter(datetime, adapt_datetime)
-sqlite3.register_converter("datetime", convert_datetime)
-
-# Função para carregar dados da planilha para o banco de dados
-def carregar_planilha_para_banco(planilha_path):
-    df = pd.read_excel(planilha_path, sheet_name="Página1")
-
-    conexao = sqlite3.connect("estoque_dental.db", detect_types=sqlite3.PARSE_DECLTYPES)
-    cursor = conexao.cursor()
-
-    # Tabela de insumos
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS insumos (
-            codigo TEXT PRIMARY KEY,
-            nome TEXT NOT NULL,
-            quantidade INTEGER NOT NULL,
-            validade TEXT,
-            localizacao TEXT,
-            observacao TEXT
-        )
-    ''')
-
-    # Tabela de histórico de movimentações
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS historico (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            insumo_codigo TEXT NOT NULL,
-            tipo TEXT NOT NULL,
-            quantidade INTEGER NOT NULL,
-            data datetime NOT NULL,
-            FOREIGN KEY (insumo_codigo) REFERENCES insumos (codigo)
-        )
-    ''')
-
-    # Inserir os dados da planilha na tabela de insumos
-    for _, linha in df.iterrows():
-        try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO insumos (codigo, nome, quantidade, validade, localizacao, observacao)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                linha["CÓDIGO"],
-                linha["ÍTEM"],
-                int(linha["QUANTIDADE"]) if str(linha["QUANTIDADE"]).isdigit() else 0,
-                str(linha["VALIDADE"]) if pd.notna(linha["VALIDADE"]) else "INDETERMINADO",
-                linha["ESTANTE/PRATELEIRA"],
-                linha["OBSERVAÇÃO"] if pd.notna(linha["OBSERVAÇÃO"]) else None
-            ))
-        except Exception as e:
-            print(f"Erro ao inserir linha {linha}: {e}")
-
-    conexao.commit()
-    conexao.close()
-
-# Função para exportar os dados do banco para a planilha Excel
-def exportar_para_excel():
-    conexao = sqlite3.connect("estoque_dental.db")
-    cursor = conexao.cursor()
-
-    # Buscar dados da tabela de insumos
-    cursor.execute("SELECT * FROM insumos")
-    dados = cursor.fetchall()
-
-    # Criar um DataFrame com os dados
-    df = pd.DataFrame(dados, columns=["CÓDIGO", "ÍTEM", "QUANTIDADE", "VALIDADE", "ESTANTE/PRATELEIRA", "OBSERVAÇÃO"])
-
-    # Exportar para a planilha
-    nome_arquivo = "ESTOQUE_ATUALIZADO.xlsx"
-    df.to_excel(nome_arquivo, index=False, sheet_name="Página1")
-    messagebox.showinfo("Sucesso", f"Planilha exportada: {nome_arquivo}")
-    conexao.close()
-
-# Função para converter as datas de validade corretamente (ignorando o tempo)
-def converter_data(data):
+import time
+
+INICIO = time.perf_counter()  # medida do tempo de inicialização da interface
+
+import argparse
+import sys
+
+import banco
+
+# Ponto de entrada do aplicativo
+# Sem argumentos abre a interface gráfica; com um subcomando roda em modo texto, sem Tk,
+# para tarefas agendadas (exportação noturna, alertas, relatórios):
+#
+#   python main.py importar ESTOQUE.xlsx
+#   python main.py consolidar planilhas_filiais --relatorio erros_filiais.csv
+#   python main.py exportar --arquivo ESTOQUE_ATUALIZADO.xlsx
+#   python main.py exportar --formato completa --arquivo ESTOQUE_COMPLETO.xlsx --inicio 01/01/2025
+#   python main.py exportar --formato csv --pasta contabilidade
+#   python main.py relatorio --inicio 01/01/2025 --fim 31/12/2025
+#   python main.py alertas --dias 30
+#   python main.py movimentar 123 saida 2
+#   python main.py manutencao --meses 24
+#   python main.py movimentar 123 entrada 50 --lote L2301 --validade 31/12/2026
+#   python main.py servico --endereco 0.0.0.0 --porta 8765
+#
+# Com várias estações, uma roda o serviço (dona do banco) e as outras abrem a interface com
+# python main.py --servidor 192.168.0.10:8765 (veja servico.py).
+# Cada subcomando importa só o que usa (pandas, reportlab, Tk), para iniciar rápido.
+
+# Caminho relativo da planilha
+PLANILHA_PADRAO = "ESTOQUE.xlsx"
+
+# Função para converter uma data DD/MM/AAAA dos argumentos para ISO
+def data_argumento(texto):
+    from validade import data_do_formulario
     try:
-        return datetime.strptime(data, "%Y-%m-%d %H:%M:%S").date()  # Ignora o tempo
+        return data_do_formulario(texto)
     except ValueError:
-        try:
-            return datetime.strptime(data, "%Y-%m-%d").date()  # Apenas a data
-        except ValueError:
-            return None
-
-# Função para centralizar a janela
-def centralizar_janela(root):
-    root.update_idletasks()
-    largura_janela = root.winfo_width()
-    altura_janela = root.winfo_height()
-    largura_tela = root.winfo_screenwidth()
-    altura_tela = root.winfo_screenheight()
-
-    x = (largura_tela // 2) - (largura_janela // 2)
-    y = (altura_tela // 2) - (altura_janela // 2)
-    root.geometry(f'{largura_janela}x{altura_janela}+{x}+{y}')
-
-# Função para registrar novos insumos manualmente
-def tela_registrar_insumos(root):
-    root.withdraw()
-    janela = ttk.Toplevel()
-    janela.title("Registrar Novo Insumo")
-    janela.geometry("800x600")
-
-    centralizar_janela(janela)
-
-    campos = [
-        ("Código do Insumo", "codigo"),
-        ("Nome do Insumo", "nome"),
-        ("Quantidade Inicial", "quantidade"),
-        ("Validade (DD/MM/AAAA)", "validade"),
-        ("Localização", "localizacao"),
-        ("Observação", "observacao")
-    ]
-
-    entradas = {}
-    for texto, chave in campos:
-        label = ttk.Label(janela, text=texto)
-        label.pack()
-        entrada = ttk.Entry(janela)
-        entrada.pack()
-        entradas[chave] = entrada
-
-    def salvar_insumo():
-        dados = {chave: entradas[chave].get().strip() for chave in entradas}
-
-        if not dados["codigo"] or not dados["nome"] or not dados["quantidade"].isdigit():
-            messagebox.showerror("Erro", "Preencha todos os campos obrigatórios corretamente!")
-            return
-
-        # Validar a data de validade
-        if dados["validade"]:
-            try:
-                datetime.strptime(dados["validade"], "%d/%m/%Y")
-            except ValueError:
-                messagebox.showerror("Erro", "Formato de data inválido! Use DD/MM/AAAA.")
-                return
-
-        conexao = sqlite3.connect("estoque_dental.db")
-        cursor = conexao.cursor()
-        try:
-            cursor.execute('''
-                INSERT INTO insumos (codigo, nome, quantidade, validade, localizacao, observacao)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                dados["codigo"],
-                dados["nome"],
-                int(dados["quantidade"]),
-                dados["validade"] if dados["validade"] else "INDETERMINADO",
-                dados["localizacao"],
-                dados["observacao"]
-            ))
-            conexao.commit()
-            messagebox.showinfo("Sucesso", "Insumo cadastrado com sucesso!")
-            exportar_para_excel()  # Atualizar a planilha Excel
-        except sqlite3.Error as e:
-            messagebox.showerror("Erro de Banco de Dados", str(e))
-        finally:
-            conexao.close()
-
-        janela.destroy()
-        root.deiconify()
-
-    btn_salvar = ttk.Button(janela, text="Salvar", command=salvar_insumo, bootstyle=SUCCESS)
-    btn_salvar.pack(pady=10)
-    btn_cancelar = ttk.Button(janela, text="Cancelar", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=DANGER)
-    btn_cancelar.pack(pady=5)
-
-# Função para editar um insumo
-def editar_insumo(rowid, carregar_dados, conexao):
-    cursor = conexao.cursor()
-    
-    cursor.execute("SELECT rowid, * FROM insumos WHERE rowid = ?", (rowid,))
-    insumo = cursor.fetchone()
-    
-    if insumo:
-        janela_editar = ttk.Toplevel()
-        janela_editar.title("Editar Insumo")
-        janela_editar.geometry("400x400")
-        centralizar_janela(janela_editar)
-
-        campos = [
-            ("Código do Insumo", "codigo", insumo[1]),
-            ("Nome do Insumo", "nome", insumo[2]),
-            ("Quantidade", "quantidade", insumo[3]),
-            ("Validade (DD/MM/AAAA)", "validade", insumo[4]),
-            ("Localização", "localizacao", insumo[5]),
-            ("Observação", "observacao", insumo[6])
-        ]
-
-        entradas = {}
-        for texto, chave, valor in campos:
-            label = ttk.Label(janela_editar, text=texto)
-            label.pack()
-            entrada = ttk.Entry(janela_editar)
-            entrada.insert(0, str(valor))  # Convertendo o valor para string
-            entrada.pack()
-            entradas[chave] = entrada
-
-        def salvar_edicao():
-            dados = {chave: entradas[chave].get().strip() for chave in entradas}
-
-            if not dados["nome"] or not dados["quantidade"].isdigit():
-                messagebox.showerror("Erro", "Preencha todos os campos obrigatórios corretamente!")
-                return
-
-            # Validar a data de validade
-            if dados["validade"]:
-                try:
-                    datetime.strptime(dados["validade"], "%d/%m/%Y")
-                except ValueError:
-                    messagebox.showerror("Erro", "Formato de data inválido! Use DD/MM/AAAA.")
-                    return
-
-            try:
-                cursor.execute('''
-                    UPDATE insumos
-                    SET codigo = ?, nome = ?, quantidade = ?, validade = ?, localizacao = ?, observacao = ?
-                    WHERE rowid = ?
-                ''', (
-                    dados["codigo"] if dados["codigo"] else None,
-                    dados["nome"],
-                    int(dados["quantidade"]),
-                    dados["validade"] if dados["validade"] else "INDETERMINADO",
-                    dados["localizacao"],
-                    dados["observacao"],
-                    rowid
-                ))
-                conexao.commit()
-                messagebox.showinfo("Sucesso", "Insumo editado com sucesso!")
-                exportar_para_excel()  # Atualizar a planilha Excel
-                carregar_dados()  # Atualizar os dados na tabela de monitoramento
-            except sqlite3.Error as e:
-                messagebox.showerror("Erro de Banco de Dados", str(e))
-            finally:
-                janela_editar.destroy()
-                carregar_dados()  # Recarregar dados na tabela de monitoramento
-
-        btn_salvar = ttk.Button(janela_editar, text="Salvar", command=salvar_edicao, bootstyle=SUCCESS)
-        btn_salvar.pack(pady=10)
-        btn_cancelar = ttk.Button(janela_editar, text="Cancelar", command=janela_editar.destroy, bootstyle=DANGER)
-        btn_cancelar.pack(pady=5)
+        raise argparse.ArgumentTypeError(f"data inválida: {texto} (use DD/MM/AAAA)")
+
+def comando_importar(args):
+    from importacao import importar_planilha
+
+    resultado = importar_planilha(args.planilha, forcar=args.forcar)
+    print(f"Importação de {args.planilha}: {resultado.resumo()}")
+    for linha, motivo in resultado.linhas_rejeitadas:
+        print(f"Linha {linha} rejeitada: {motivo}")
+    return 0
+
+def comando_consolidar(args):
+    import consolidacao
+
+    resultado = consolidacao.consolidar_filiais(args.pasta, aba=args.aba, processos=args.processos)
+    for arquivo in resultado.arquivos:
+        print(f"{arquivo.arquivo} ({arquivo.filial}): {arquivo.itens} itens - {arquivo.situacao()}")
+    for nome_arquivo, _, linha, motivo in resultado.linhas_relatorio():
+        if linha != "":
+            print(f"{nome_arquivo}, linha {linha} rejeitada: {motivo}")
+    print(resultado.resumo())
+    if args.relatorio:
+        print(f"Relatório de erros: {consolidacao.gravar_relatorio(resultado, args.relatorio)}")
+    # Código de saída 1 quando algum arquivo não pôde ser consolidado
+    return 1 if resultado.com_erro else 0
+
+def comando_exportar(args):
+    import exportacao
+
+    if args.formato == "estoque":
+        print(f"Planilha exportada: {exportacao.exportar_para_excel(args.arquivo)}")
+    elif args.formato == "completa":
+        print(f"Planilha exportada: {exportacao.exportar_pasta_trabalho(args.arquivo, args.inicio, args.fim)}")
     else:
-        messagebox.showerror("Erro", "Insumo não encontrado!")
-
-# Função para excluir um insumo
-def excluir_insumo(rowid, carregar_dados, conexao):
-    if messagebox.askokcancel("Confirmação", "Tem certeza de que deseja excluir este insumo?"):
-        cursor = conexao.cursor()
-
+        # Sem o pyarrow a exportação em Parquet falha antes de gravar qualquer arquivo
         try:
-            cursor.execute("DELETE FROM insumos WHERE rowid = ?", (rowid,))
-            conexao.commit()
-            messagebox.showinfo("Sucesso", "Insumo excluído com sucesso!")
-            exportar_para_excel()  # Atualizar a planilha Excel
-            carregar_dados()  # Atualizar os dados na tabela de monitoramento
-        except sqlite3.Error as e:
-            messagebox.showerror("Erro de Banco de Dados", str(e))
-        finally:
-            carregar_dados()  # Recarregar dados na tabela de monitoramento
-
-# Função para monitorar estoque (atualizado)
-def tela_monitorar_estoque(root):
-    root.withdraw()
-    janela = ttk.Toplevel()
-    janela.title("Monitorar Estoque")
-    janela.geometry("800x600")
-
-    centralizar_janela(janela)
-
-    titulo = ttk.Label(janela, text="Estoque Atual", font=("Arial", 18, "bold"))
-    titulo.pack(pady=10)
-
-    frame_tabela = ttk.Frame(janela)
-    frame_tabela.pack(fill=tk.BOTH, expand=True)
-
-    colunas = ("Código", "Nome", "Quantidade", "Validade", "Localização", "Observação")
-    tabela = ttk.Treeview(frame_tabela, columns=colunas, show="headings")
-    for col in colunas:
-        tabela.heading(col, text=col)
-        tabela.column(col, width=120)
-    tabela.pack(fill=tk.BOTH, expand=True, pady=10)
-
-    conexao = sqlite3.connect("estoque_dental.db")
-
-    def carregar_dados():
-        tabela.delete(*tabela.get_children())
-        cursor = conexao.cursor()
-        cursor.execute("SELECT rowid, * FROM insumos")
-        for linha in cursor.fetchall():
-            quantidade = linha[3]
-            if quantidade >= 20:
-                cor = "#d4edda"  # Verde Claro
-                tag = "verde"
-            elif quantidade > 10:
-                cor = "#fff3cd"  # Amarelo Claro
-                tag = "amarelo"
-            else:
-                cor = "#f8d7da"  # Vermelho Claro
-                tag = "vermelho"
-            tabela.insert("", tk.END, values=linha[1:], tags=(tag,))  # Removendo rowid da exibição
-            tabela.tag_configure(tag, background=cor)
-
-    carregar_dados()
-
-    def editar_selecionado():
-        item_selecionado = tabela.selection()
-        if item_selecionado:
-            rowid = tabela.item(item_selecionado)["values"][-1]
-            editar_insumo(rowid, carregar_dados, conexao)
-        else:
-            messagebox.showerror("Erro", "Selecione um insumo para editar!")
-
-    def excluir_selecionado():
-        item_selecionado = tabela.selection()
-        if item_selecionado:
-            rowid = tabela.item(item_selecionado)["values"][-1]
-            excluir_insumo(rowid, carregar_dados, conexao)
-        else:
-            messagebox.showerror("Erro", "Selecione um insumo para excluir!")
-
-    btn_editar = ttk.Button(janela, text="Editar Insumo", command=editar_selecionado, bootstyle=SUCCESS)
-    btn_editar.pack(pady=5)
-    btn_excluir = ttk.Button(janela, text="Excluir Insumo", command=excluir_selecionado, bootstyle=DANGER)
-    btn_excluir.pack(pady=5)
-    btn_voltar = ttk.Button(janela, text="Voltar", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=SECONDARY)
-    btn_voltar.pack(pady=10)
-
-    # Filtro de busca
-    filtro_label = ttk.Label(janela, text="Buscar Insumo:")
-    filtro_label.pack()
-    filtro_entrada = ttk.Entry(janela)
-    filtro_entrada.pack()
-
-    def filtrar_dados():
-        busca = filtro_entrada.get().lower()
-        tabela.delete(*tabela.get_children())
-        cursor = conexao.cursor()
-        cursor.execute("SELECT rowid, * FROM insumos WHERE LOWER(nome) LIKE ?", ('%' + busca + '%',))
-        for linha in cursor.fetchall():
-            quantidade = linha[3]
-            if quantidade >= 20:
-                cor = "#d4edda"  # Verde Claro
-                tag = "verde"
-            elif quantidade > 10:
-                cor = "#fff3cd"  # Amarelo Claro
-                tag = "amarelo"
-            else:
-                cor = "#f8d7da"  # Vermelho Claro
-                tag = "vermelho"
-            tabela.insert("", tk.END, values=linha[1:], tags=(tag,))  # Removendo rowid da exibição
-            tabela.tag_configure(tag, background=cor)
-
-    btn_filtrar = ttk.Button(janela, text="Buscar", command=filtrar_dados, bootstyle=INFO)
-    btn_filtrar.pack(pady=5)
-
-    janela.protocol("WM_DELETE_WINDOW", lambda: [conexao.close(), root.deiconify()])
-
-# Função para movimentação de estoque
-def tela_movimentacao_estoque(root):
-    root.withdraw()
-    janela = ttk.Toplevel()
-    janela.title("Movimentação de Estoque")
-    janela.geometry("800x600")
-
-    centralizar_janela(janela)
-
-    titulo = ttk.Label(janela, text="Registrar Movimentação de Estoque", font=("Arial", 18, "bold"))
-    titulo.pack(pady=10)
-
-    frame_selecao = ttk.Frame(janela)
-    frame_selecao.pack(pady=10)
-    label_insumo = ttk.Label(frame_selecao, text="Selecionar Insumo:")
-    label_insumo.pack(side=tk.LEFT, padx=5)
-    combo_insumos = ttk.Combobox(frame_selecao, state="readonly", width=30)
-    combo_insumos.pack(side=tk.LEFT, padx=5)
-
-    def carregar_insumos():
-        conexao = sqlite3.connect("estoque_dental.db")
-        cursor = conexao.cursor()
-        cursor.execute("SELECT codigo, nome FROM insumos")
-        insumos = cursor.fetchall()
-        conexao.close()
-        combo_insumos['values'] = [f"{codigo} - {nome}" for codigo, nome in insumos]
-
-    carregar_insumos()
-
-    frame_quantidade = ttk.Frame(janela)
-    frame_quantidade.pack(pady=10)
-    label_quantidade = ttk.Label(frame_quantidade, text="Quantidade:")
-    label_quantidade.pack(side=tk.LEFT, padx=5)
-    entrada_quantidade = ttk.Entry(frame_quantidade, width=10)
-    entrada_quantidade.pack(side=tk.LEFT, padx=5)
-
-    # Registrar entrada
-    def registrar_entrada():
-        if not combo_insumos.get() or not entrada_quantidade.get().isdigit():
-            messagebox.showerror("Erro", "Preencha todos os campos corretamente!")
-            return
-
-        quantidade = int(entrada_quantidade.get())
-        codigo = combo_insumos.get().split(" - ")[0]
-
-        conexao = sqlite3.connect("estoque_dental.db")
-        cursor = conexao.cursor()
-        cursor.execute("UPDATE insumos SET quantidade = quantidade + ? WHERE codigo = ?", (quantidade, codigo))
-        cursor.execute('''
-            INSERT INTO historico (insumo_codigo, tipo, quantidade, data)
-            VALUES (?, ?, ?, ?)
-        ''', (codigo, "Entrada", quantidade, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conexao.commit()
-        conexao.close()
-        messagebox.showinfo("Sucesso", "Entrada registrada com sucesso!")
-        carregar_insumos()
-
-    # Registrar saída
-    def registrar_saida():
-        if not combo_insumos.get() or not entrada_quantidade.get().isdigit():
-            messagebox.showerror("Erro", "Preencha todos os campos corretamente!")
-            return
-
-        quantidade = int(entrada_quantidade.get())
-        codigo = combo_insumos.get().split(" - ")[0]
-
-        conexao = sqlite3.connect("estoque_dental.db")
-        cursor = conexao.cursor()
-        cursor.execute("SELECT quantidade FROM insumos WHERE codigo = ?", (codigo,))
-        quantidade_atual = cursor.fetchone()[0]
-
-        if quantidade > quantidade_atual:
-            messagebox.showerror("Erro", "Quantidade em estoque insuficiente!")
-            conexao.close()
-            return
-
-        cursor.execute("UPDATE insumos SET quantidade = quantidade - ? WHERE codigo = ?", (quantidade, codigo))
-        cursor.execute('''
-            INSERT INTO historico (insumo_codigo, tipo, quantidade, data)
-            VALUES (?, ?, ?, ?)
-        ''', (codigo, "Saída", quantidade, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conexao.commit()
-        conexao.close()
-        messagebox.showinfo("Sucesso", "Saída registrada com sucesso!")
-        carregar_insumos()
-
-    btn_entrada = ttk.Button(janela, text="Registrar Entrada", command=registrar_entrada, bootstyle=SUCCESS)
-    btn_entrada.pack(pady=5)
-    btn_saida = ttk.Button(janela, text="Registrar Saída", command=registrar_saida, bootstyle=DANGER)
-    btn_saida.pack(pady=5)
-
-    btn_voltar = ttk.Button(janela, text="Voltar", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=SECONDARY)
-    btn_voltar.pack(pady=10)
-
-# Função para histórico de movimentações
-def tela_historico(root):
-    root.withdraw()
-    janela = ttk.Toplevel()
-    janela.title("Histórico de Movimentações")
-    janela.geometry("800x600")
-
-    centralizar_janela(janela)
-
-    titulo = ttk.Label(janela, text="Histórico de Movimentações", font=("Arial", 18, "bold"))
-    titulo.pack(pady=10)
-
-    frame_tabela = ttk.Frame(janela)
-    frame_tabela.pack(fill=tk.BOTH, expand=True)
-
-    colunas = ("ID", "Código do Insumo", "Nome do Insumo", "Tipo", "Quantidade", "Data")
-    tabela = ttk.Treeview(frame_tabela, columns=colunas, show="headings")
-    for col in colunas:
-        tabela.heading(col, text=col)
-        tabela.column(col, width=120)
-    tabela.pack(fill=tk.BOTH, expand=True, pady=10)
-
-    def carregar_historico():
-        tabela.delete(*tabela.get_children())
-        conexao = sqlite3.connect("estoque_dental.db")
-        cursor = conexao.cursor()
-        cursor.execute('''
-            SELECT historico.id, historico.insumo_codigo, insumos.nome, historico.tipo, historico.quantidade, historico.data 
-            FROM historico 
-            JOIN insumos ON historico.insumo_codigo = insumos.codigo 
-            ORDER BY historico.data DESC
-        ''')
-        for linha in cursor.fetchall():
-            tabela.insert("", tk.END, values=linha)
-        conexao.close()
-
-    carregar_historico()
-
-    btn_voltar = ttk.Button(janela, text="Voltar", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=SECONDARY)
-    btn_voltar.pack(pady=10)
-
-# Função para verificar validade
-def tela_alertas_validade(root):
-    root.withdraw()
-    janela = ttk.Toplevel()
-    janela.title("Alertas de Validade")
-    janela.geometry("800x600")
-
-    centralizar_janela(janela)
-
-    titulo = ttk.Label(janela, text="Itens Vencidos ou Próximos da Validade", font=("Arial", 18, "bold"))
-    titulo.pack(pady=10)
-
-    frame_tabela = ttk.Frame(janela)
-    frame_tabela.pack(fill=tk.BOTH, expand=True)
-
-    colunas = ("Código", "Nome", "Quantidade", "Validade", "Localização")
-    tabela = ttk.Treeview(frame_tabela, columns=colunas, show="headings")
-    for col in colunas:
-        tabela.heading(col, text=col)
-        tabela.column(col, width=120)
-    tabela.pack(fill=tk.BOTH, expand=True, pady=10)
-
-    def carregar_alertas():
-        tabela.delete(*tabela.get_children())
-        hoje = datetime.now().date()  # Converte a data de hoje para o formato date (sem tempo)
-        alerta_prazo = hoje + timedelta(days=30)  # Itens próximos a vencer em 30 dias
-        conexao = sqlite3.connect("estoque_dental.db")
-        cursor = conexao.cursor()
-        cursor.execute("SELECT * FROM insumos WHERE validade != 'INDETERMINADO'")
-        for linha in cursor.fetchall():
-            validade = converter_data(linha[3])  # Convertendo a data de validade
-            if validade and (validade < hoje or validade <= alerta_prazo):
-                tabela.insert("", tk.END, values=linha[:5])
-        conexao.close()
-
-    carregar_alertas()
-
-    btn_voltar = ttk.Button(janela, text="Voltar", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=SECONDARY)
-    btn_voltar.pack(pady=10)
-
-def gerar_relatorio_pdf():
-    conexao = sqlite3.connect("estoque_dental.db")
-    cursor = conexao.cursor()
-    
-    cursor.execute('''
-        SELECT historico.id, historico.insumo_codigo, insumos.nome, historico.tipo, historico.quantidade, historico.data 
-        FROM historico 
-        JOIN insumos ON historico.insumo_codigo = insumos.codigo 
-        ORDER BY historico.data DESC
-    ''')
-    
-    movimentacoes = cursor.fetchall()
-    conexao.close()
-
-    nome_arquivo = "relatorio_movimentacoes.pdf"
-    c = canvas.Canvas(nome_arquivo, pagesize=letter)
-    largura, altura = letter
-
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(30, altura - 30, "Relatório de Movimentações de Estoque")
-
-    c.setFont("Helvetica", 12)
-    linha = altura - 60
-    for movimentacao in movimentacoes:
-        texto = f"ID: {movimentacao[0]} | Código: {movimentacao[1]} | Nome: {movimentacao[2]} | Tipo: {movimentacao[3]} | Quantidade: {movimentacao[4]} | Data: {movimentacao[5]}"
-        c.drawString(30, linha, texto)
-        linha -= 20
-        if linha < 40:
-            c.showPage()
-            c.setFont("Helvetica", 12)
-            linha = altura - 40
-
-    c.save()
-    messagebox.showinfo("Sucesso", f"Relatório gerado: {nome_arquivo}")
-
-def tela_gerar_relatorio(root):
-    root.withdraw()
-    janela = ttk.Toplevel()
-    janela.title("Gerar Relatório")
-    janela.geometry("800x600")
-
-    centralizar_janela(janela)
-
-    label = ttk.Label(janela, text="Deseja gerar o relatório de todas as movimentações em PDF?")
-    label.pack(pady=20)
-
-    def confirmar_gerar_relatorio():
-        gerar_relatorio_pdf()
-        janela.destroy()
-        root.deiconify()
-
-    btn_sim = ttk.Button(janela, text="Sim", command=confirmar_gerar_relatorio, bootstyle=SUCCESS)
-    btn_sim.pack(pady=5)
-
-    btn_nao = ttk.Button(janela, text="Não", command=lambda: [janela.destroy(), root.deiconify()], bootstyle=DANGER)
-    btn_nao.pack(pady=5)
-
-# Aplicar estilo ao aplicativo
-def aplicar_estilos():
-    estilo = ttk.Style()
-    estilo.theme_use('litera')  # Escolha o tema desejado
-
-# Menu principal
-def iniciar_aplicativo(planilha_path):
-    carregar_planilha_para_banco(planilha_path)
-
-    root = ttk.Window(themename="litera")  # Escolha o tema desejado
-    aplicar_estilos()  # Aplicar os estilos
-    root.title("Controle de Estoque - Clínica Odontológica")
-    root.geometry("800x600")
-
-    centralizar_janela(root)
-
-    titulo = ttk.Label(root, text="Menu Principal", font=("Arial", 18, "bold"))
-    titulo.pack(pady=20)
-
-    botoes = [
-        ("Registrar Novo Insumo", lambda: tela_registrar_insumos(root)),
-        ("Monitorar Estoque", lambda: tela_monitorar_estoque(root)),
-        ("Movimentar Estoque", lambda: tela_movimentacao_estoque(root)),
-        ("Histórico de Movimentações", lambda: tela_historico(root)),
-        ("Alertas de Validade", lambda: tela_alertas_validade(root)),
-        ("Gerar Relatório", lambda: tela_gerar_relatorio(root))
-    ]
-
-    for texto, comando in botoes:
-        btn = ttk.Button(root, text=texto, width=30, command=comando, bootstyle=SUCCESS)
-        btn.pack(pady=5)
-
-    btn_sair = ttk.Button(root, text="Sair", width=30, command=root.quit, bootstyle=DANGER)
-    btn_sair.pack(pady=5)
-
-    root.mainloop()
+            arquivos = exportacao.exportar_dados(args.pasta, args.formato, args.inicio, args.fim)
+        except RuntimeError as e:
+            print(f"Erro: {e}", file=sys.stderr)
+            return 1
+        for nome_arquivo in arquivos:
+            print(f"Arquivo exportado: {nome_arquivo}")
+    return 0
+
+def comando_relatorio(args):
+    import relatorios
+
+    def progresso(feitas, total):
+        print(f"\r{feitas}/{total} movimentações", end="", file=sys.stderr, flush=True)
+
+    nome_arquivo = relatorios.gerar_relatorio_pdf(args.arquivo, args.inicio, args.fim, args.codigo, args.tipo,
+                                                  progresso=progresso if sys.stderr.isatty() else None)
+    if sys.stderr.isatty():
+        print(file=sys.stderr)
+    print(f"Relatório gerado: {nome_arquivo}")
+    return 0
+
+def comando_alertas(args):
+    from validade import formatar_validade
+
+    alertas = banco.buscar_alertas_validade(args.dias)
+    for alerta in alertas:
+        lote = f"  lote {alerta.lote}" if alerta.lote else ""
+        print(f"{formatar_validade(alerta.validade)}  {alerta.codigo}  {alerta.nome}{lote}  "
+              f"(quantidade: {alerta.quantidade}, local: {alerta.localizacao or '-'})")
+    print(f"{len(alertas)} lotes vencidos ou vencendo nos próximos {args.dias} dias")
+    # Código de saída 1 quando há alertas, para o agendador poder avisar
+    return 1 if alertas and args.codigo_saida else 0
+
+def comando_estoque_baixo(args):
+    itens = banco.listar_estoque_baixo()
+    for item in itens:
+        situacao = "BAIXO" if item.situacao == banco.ESTOQUE_BAIXO else "atenção"
+        print(f"{situacao:7}  {item.codigo}  {item.nome}  (quantidade: {item.quantidade}, "
+              f"mínimo: {item.estoque_minimo}, alvo: {item.estoque_alvo}, repor: {item.estoque_alvo - item.quantidade})")
+    print(f"{len(itens)} itens abaixo do estoque alvo")
+    # Código de saída 1 quando algum item está no mínimo ou abaixo dele, para o agendador poder avisar
+    baixos = any(item.situacao == banco.ESTOQUE_BAIXO for item in itens)
+    return 1 if baixos and args.codigo_saida else 0
+
+def comando_movimentar(args):
+    import movimentacoes
+
+    tipo = movimentacoes.ENTRADA if args.tipo == "entrada" else movimentacoes.SAIDA
+    resultado = movimentacoes.aplicar_movimentacoes([(args.codigo, tipo, args.quantidade, args.lote, args.validade)])[0]
+    if not resultado.aplicada:
+        print(f"Movimentação recusada: {resultado.motivo}", file=sys.stderr)
+        return 1
+    print(f"{tipo} de {args.quantidade} registrada para {args.codigo}. Saldo: {resultado.saldo}")
+    return 0
+
+def comando_manutencao(args):
+    import arquivamento
+
+    vacuum = {"auto": "auto", "sempre": True, "nunca": False}[args.vacuum]
+    meses = args.meses if args.meses is not None else arquivamento.MESES_HISTORICO_ATIVO
+    resultado = arquivamento.manutencao(None if args.sem_arquivar else meses, vacuum)
+    for etapa in resultado.etapas:
+        print(etapa)
+    return 0
+
+def comando_servico(args):
+    import servico
+
+    servico.servir(args.endereco, args.porta)
+    return 0
+
+# Função para montar o interpretador de argumentos
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Controle de Estoque - Clínica Odontológica")
+    parser.add_argument("--banco", default=banco.CAMINHO_BANCO, help="arquivo do banco de dados")
+    parser.add_argument("--planilha", default=PLANILHA_PADRAO, help="planilha importada ao abrir a interface")
+    parser.add_argument("--servidor", help="host:porta do serviço de estoque (interface em modo cliente)")
+    subparsers = parser.add_subparsers(dest="comando", metavar="comando")
+
+    importar = subparsers.add_parser("importar", help="importar a planilha de estoque")
+    importar.add_argument("planilha", nargs="?", default=PLANILHA_PADRAO)
+    importar.add_argument("--forcar", action="store_true", help="reimportar mesmo se a planilha não mudou")
+    importar.set_defaults(funcao=comando_importar)
+
+    consolidar = subparsers.add_parser("consolidar", help="consolidar as planilhas das filiais de uma pasta")
+    consolidar.add_argument("pasta")
+    consolidar.add_argument("--aba", default="Página1", help="aba lida de cada planilha (sem ela, a primeira)")
+    consolidar.add_argument("--processos", type=int, help="processos de leitura (padrão: um por núcleo)")
+    consolidar.add_argument("--relatorio", help="arquivo CSV com os erros de cada planilha")
+    consolidar.set_defaults(funcao=comando_consolidar)
+
+    exportar = subparsers.add_parser("exportar", help="exportar o estoque para Excel, CSV ou Parquet")
+    exportar.add_argument("--formato", choices=["estoque", "completa", "csv", "parquet"], default="estoque",
+                          help="estoque: planilha no formato do ESTOQUE.xlsx; completa: estoque, histórico e "
+                               "alertas; csv/parquet: dados brutos de insumos e histórico")
+    exportar.add_argument("--arquivo", help="planilha gerada (estoque e completa)")
+    exportar.add_argument("--pasta", default="exportacao", help="pasta dos arquivos csv/parquet")
+    exportar.add_argument("--inicio", type=data_argumento, help="início do histórico exportado (DD/MM/AAAA)")
+    exportar.add_argument("--fim", type=data_argumento, help="fim do histórico exportado (DD/MM/AAAA)")
+    exportar.set_defaults(funcao=comando_exportar)
+
+    relatorio = subparsers.add_parser("relatorio", help="gerar o relatório de movimentações em PDF")
+    relatorio.add_argument("--arquivo", default="relatorio_movimentacoes.pdf")
+    relatorio.add_argument("--inicio", type=data_argumento, help="data inicial (DD/MM/AAAA)")
+    relatorio.add_argument("--fim", type=data_argumento, help="data final (DD/MM/AAAA)")
+    relatorio.add_argument("--codigo", help="código do insumo")
+    relatorio.add_argument("--tipo", choices=["Entrada", "Saída"])
+    relatorio.set_defaults(funcao=comando_relatorio)
+
+    alertas = subparsers.add_parser("alertas", help="listar itens vencidos ou próximos da validade")
+    alertas.add_argument("--dias", type=int, default=banco.DIAS_ALERTA_VALIDADE)
+    alertas.add_argument("--codigo-saida", action="store_true", help="terminar com código 1 se houver alertas")
+    alertas.set_defaults(funcao=comando_alertas)
+
+    estoque_baixo = subparsers.add_parser("estoque-baixo", help="listar itens abaixo do estoque alvo")
+    estoque_baixo.add_argument("--codigo-saida", action="store_true",
+                               help="terminar com código 1 se algum item estiver no estoque mínimo")
+    estoque_baixo.set_defaults(funcao=comando_estoque_baixo)
+
+    movimentar = subparsers.add_parser("movimentar", help="registrar uma entrada ou saída")
+    movimentar.add_argument("codigo")
+    movimentar.add_argument("tipo", choices=["entrada", "saida"])
+    movimentar.add_argument("quantidade", type=int)
+    movimentar.add_argument("--lote", help="lote da entrada ou da saída (saída sem lote: o que vence primeiro)")
+    movimentar.add_argument("--validade", type=data_argumento, help="validade do lote na entrada (DD/MM/AAAA)")
+    movimentar.set_defaults(funcao=comando_movimentar)
+
+    manutencao = subparsers.add_parser("manutencao", help="arquivar o histórico antigo e otimizar o banco")
+    manutencao.add_argument("--meses", type=int, help="meses de histórico mantidos no banco principal (padrão: 24)")
+    manutencao.add_argument("--sem-arquivar", action="store_true", help="só ANALYZE/VACUUM, sem arquivar")
+    manutencao.add_argument("--vacuum", choices=["auto", "sempre", "nunca"], default="auto",
+                            help="auto: só quando boa parte do arquivo estiver livre")
+    manutencao.set_defaults(funcao=comando_manutencao)
+
+    servico = subparsers.add_parser("servico", help="rodar o serviço de estoque para as outras estações")
+    servico.add_argument("--endereco", default="127.0.0.1", help="use 0.0.0.0 para aceitar as outras estações da rede")
+    servico.add_argument("--porta", type=int, default=8765)
+    servico.set_defaults(funcao=comando_servico)
+
+    return parser
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    if args.comando == "exportar" and args.arquivo is None:
+        args.arquivo = "ESTOQUE_COMPLETO.xlsx" if args.formato == "completa" else "ESTOQUE_ATUALIZADO.xlsx"
+    banco.CAMINHO_BANCO = args.banco
+
+    if args.comando is None:
+        from interface import iniciar_aplicativo
+        iniciar_aplicativo(args.planilha, inicio=INICIO, servidor=args.servidor)
+        return 0
 
-# Caminho relativo da planilha
-planilha_path = "ESTOQUE.xlsx"
-iniciar_aplicativo(planilha_path)
+    try:
+        banco.criar_tabelas()
+        return args.funcao(args)
+    finally:
+        banco.fechar_conexao()
+
+if __name__ == "__main__":
+    sys.exit(main())
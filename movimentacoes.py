@@ -0,0 +1,169 @@
+from collections import namedtuple
+from datetime import datetime
+
+import banco
+import eventos
+
+# Motor de movimentações de estoque
+# Aplica uma ou várias entradas/saídas numa única transação. A saída usa um UPDATE condicional
+# (WHERE quantidade >= ?), então o estoque nunca fica negativo, mesmo com duas estações
+# lançando saídas do mesmo item ao mesmo tempo.
+#
+# Lotes (tabela insumo_lotes): uma entrada com lote soma ao lote (criando-o com a validade
+# informada); uma saída com lote tira só daquele lote; uma saída sem lote consome primeiro o que
+# vence primeiro (FEFO), entre os lotes do item e o estoque sem lote (validade do item). Cada
+# lote consumido vira uma linha do histórico com o número do lote.
+
+ENTRADA = "Entrada"
+SAIDA = "Saída"
+
+# Uma linha da guia de movimentação (lote e validade são opcionais; a validade só vale na entrada)
+LinhaMovimentacao = namedtuple("LinhaMovimentacao", "codigo tipo quantidade lote validade", defaults=(None, None))
+
+# Resultado de cada linha: aplicada ou não, o motivo da recusa e o saldo após a linha
+ResultadoMovimentacao = namedtuple("ResultadoMovimentacao", "linha aplicada motivo saldo")
+
+# Motivos de recusa
+INSUMO_INEXISTENTE = "Insumo não encontrado"
+ESTOQUE_INSUFICIENTE = "Quantidade em estoque insuficiente"
+QUANTIDADE_INVALIDA = "Quantidade inválida"
+TIPO_INVALIDO = "Tipo de movimentação inválido"
+LOTE_INSUFICIENTE = "Quantidade insuficiente no lote"
+GUIA_CANCELADA = "Não lançada: outra linha da guia foi recusada"
+
+class _GuiaRecusada(Exception):
+    pass
+
+# Função para aplicar uma linha
+# Retorna (motivo da recusa ou None, saldo, nome do item, [(lote, quantidade)] movimentados)
+def _aplicar_linha(cursor, linha):
+    if linha.tipo not in (ENTRADA, SAIDA):
+        return TIPO_INVALIDO, None, None, []
+    if not isinstance(linha.quantidade, int) or linha.quantidade <= 0:
+        return QUANTIDADE_INVALIDA, None, None, []
+
+    if linha.tipo == ENTRADA:
+        cursor.execute("UPDATE insumos SET quantidade = quantidade + ? WHERE codigo = ?",
+                       (linha.quantidade, linha.codigo))
+    elif linha.lote and not _tem_no_lote(cursor, linha):
+        cursor.execute("SELECT quantidade, nome FROM insumos WHERE codigo = ?", (linha.codigo,))
+        atual = cursor.fetchone()
+        if atual is None:
+            return INSUMO_INEXISTENTE, None, None, []
+        return LOTE_INSUFICIENTE, atual[0], atual[1], []
+    else:
+        cursor.execute("UPDATE insumos SET quantidade = quantidade - ? WHERE codigo = ? AND quantidade >= ?",
+                       (linha.quantidade, linha.codigo, linha.quantidade))
+
+    alterou = cursor.rowcount > 0
+
+    cursor.execute("SELECT quantidade, nome, validade FROM insumos WHERE codigo = ?", (linha.codigo,))
+    atual = cursor.fetchone()
+    if atual is None:
+        return INSUMO_INEXISTENTE, None, None, []
+    if not alterou:
+        return ESTOQUE_INSUFICIENTE, atual[0], atual[1], []
+
+    if linha.tipo == ENTRADA:
+        if linha.lote:
+            cursor.execute('''
+                INSERT INTO insumo_lotes (insumo_codigo, lote, validade, quantidade) VALUES (?, ?, ?, ?)
+                ON CONFLICT (insumo_codigo, lote) DO UPDATE SET
+                    quantidade = quantidade + excluded.quantidade,
+                    validade = COALESCE(excluded.validade, validade)
+            ''', (linha.codigo, linha.lote, linha.validade, linha.quantidade))
+        consumos = [(linha.lote or None, linha.quantidade)]
+    elif linha.lote:
+        cursor.execute("UPDATE insumo_lotes SET quantidade = quantidade - ? WHERE insumo_codigo = ? AND lote = ?",
+                       (linha.quantidade, linha.codigo, linha.lote))
+        consumos = [(linha.lote, linha.quantidade)]
+    else:
+        consumos = _consumir_fefo(cursor, linha.codigo, linha.quantidade, atual[0] + linha.quantidade, atual[2])
+    if linha.tipo == SAIDA:
+        cursor.execute("DELETE FROM insumo_lotes WHERE insumo_codigo = ? AND quantidade = 0", (linha.codigo,))
+    return None, atual[0], atual[1], consumos
+
+def _tem_no_lote(cursor, linha):
+    cursor.execute("SELECT quantidade FROM insumo_lotes WHERE insumo_codigo = ? AND lote = ?", (linha.codigo, linha.lote))
+    no_lote = cursor.fetchone()
+    return no_lote is not None and no_lote[0] >= linha.quantidade
+
+# Consome `quantidade` do item na ordem de validade: os lotes e o estoque sem lote (o que o total
+# anterior tinha além da soma dos lotes, com a validade do item); sem validade fica por último
+# Retorna [(lote ou None, quantidade)] na ordem consumida
+def _consumir_fefo(cursor, codigo, quantidade, total_anterior, validade_item):
+    cursor.execute("SELECT validade, id, lote, quantidade FROM insumo_lotes WHERE insumo_codigo = ? AND quantidade > 0",
+                   (codigo,))
+    lotes = cursor.fetchall()
+    sem_lote = total_anterior - sum(lote[3] for lote in lotes)
+    if sem_lote > 0:
+        lotes.append((validade_item, 0, None, sem_lote))  # id 0: em validades iguais, sai antes dos lotes
+    lotes.sort(key=lambda lote: (lote[0] is None, lote[0] or "", lote[1]))
+
+    consumos = []
+    restante = quantidade
+    for _, id_lote, lote, disponivel in lotes:
+        if not restante:
+            break
+        usado = min(disponivel, restante)
+        if id_lote:
+            cursor.execute("UPDATE insumo_lotes SET quantidade = quantidade - ? WHERE id = ?", (usado, id_lote))
+        consumos.append((lote, usado))
+        restante -= usado
+    return consumos
+
+# Função para aplicar uma guia de movimentações numa única transação
+# linhas: LinhaMovimentacao (ou tuplas codigo, tipo, quantidade[, lote, validade])
+# parcial=False: se qualquer linha for recusada, nada é gravado (a guia inteira volta)
+# parcial=True: grava as linhas aceitas e recusa só as demais
+# Retorna um ResultadoMovimentacao por linha, na mesma ordem
+def aplicar_movimentacoes(linhas, parcial=False, data=None, conexao=None):
+    linhas = [LinhaMovimentacao(*linha) for linha in linhas]
+    data = (data or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+    resultados = []
+
+    try:
+        with banco.transacao(conexao) as conexao:
+            cursor = conexao.cursor()
+            historico, nomes = [], {}
+            for linha in linhas:
+                motivo, saldo, nome, consumos = _aplicar_linha(cursor, linha)
+                resultados.append(ResultadoMovimentacao(linha, motivo is None, motivo, saldo))
+                if motivo is None:
+                    historico.extend((linha.codigo, linha.tipo, quantidade, data, lote) for lote, quantidade in consumos)
+                    nomes[linha.codigo] = nome
+
+            if not parcial and not all(resultado.aplicada for resultado in resultados):
+                raise _GuiaRecusada()
+
+            cursor.executemany('''
+                INSERT INTO historico (insumo_codigo, tipo, quantidade, data, lote)
+                VALUES (?, ?, ?, ?, ?)
+            ''', historico)
+            if historico and eventos.tem_assinantes():
+                banco.notificar(_lancadas(cursor, historico, resultados, nomes), conexao)
+    except _GuiaRecusada:
+        resultados = [
+            resultado if not resultado.aplicada else ResultadoMovimentacao(resultado.linha, False, GUIA_CANCELADA, None)
+            for resultado in resultados
+        ]
+
+    return resultados
+
+# Evento das movimentações gravadas pela guia
+# A transação reserva a escrita (BEGIN IMMEDIATE), então os ids do AUTOINCREMENT da guia são
+# consecutivos e terminam no último id inserido
+def _lancadas(cursor, historico, resultados, nomes):
+    ultimo = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+    primeiro = ultimo - len(historico) + 1
+    movimentacoes = [banco.Movimentacao(primeiro + i, codigo, nomes[codigo], tipo, quantidade, data, lote)
+                     for i, (codigo, tipo, quantidade, data, lote) in enumerate(historico)]
+    saldos = {resultado.linha.codigo: resultado.saldo for resultado in resultados if resultado.aplicada}
+    return eventos.MovimentacoesLancadas(saldos, movimentacoes)
+
+# Atalhos para uma única movimentação; retornam o ResultadoMovimentacao
+def registrar_entrada(codigo, quantidade, lote=None, validade=None, conexao=None):
+    return aplicar_movimentacoes([(codigo, ENTRADA, quantidade, lote, validade)], conexao=conexao)[0]
+
+def registrar_saida(codigo, quantidade, lote=None, conexao=None):
+    return aplicar_movimentacoes([(codigo, SAIDA, quantidade, lote)], conexao=conexao)[0]
@@ -0,0 +1,97 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import banco
+from instrumentacao import medido
+
+# Previsão de reposição
+# Para cada item: consumo diário médio (média simples e média ponderada exponencialmente),
+# dias de estoque restantes, data prevista de ruptura e quantidade sugerida para repor.
+# O cálculo é vetorizado sobre todos os itens de uma vez (uma matriz dia x item) a partir do
+# agregado consumo_diario, e o resultado fica guardado em previsao_reposicao.
+
+# Dias de histórico considerados
+JANELA_DIAS = 90
+# Dias da média simples (os mais recentes da janela)
+JANELA_MEDIA = 30
+# Meia-vida (em dias) da média ponderada: consumo recente pesa mais
+MEIA_VIDA_DIAS = 7
+# Dias entre o pedido e a chegada da reposição, e dias de consumo que a reposição deve cobrir
+PRAZO_REPOSICAO_DIAS = banco.PRAZO_REPOSICAO_DIAS
+COBERTURA_DIAS = banco.COBERTURA_DIAS
+
+# Função para calcular a previsão de um conjunto de itens
+# insumos: DataFrame (codigo, quantidade); consumo: DataFrame (insumo_codigo, dia, saidas)
+# Retorna um DataFrame com uma linha por item, nas colunas de previsao_reposicao
+def calcular_previsao(insumos, consumo, hoje):
+    hoje = pd.Timestamp(hoje)
+    dias = pd.date_range(end=hoje, periods=JANELA_DIAS, freq="D")
+    codigos = pd.Index(insumos["codigo"], name="insumo_codigo")
+
+    # Matriz dia x item com as saídas (0 nos dias sem movimentação)
+    saidas = consumo.pivot_table(index="dia", columns="insumo_codigo", values="saidas", aggfunc="sum")
+    saidas.index = pd.to_datetime(saidas.index)
+    saidas = saidas.reindex(index=dias, columns=codigos).fillna(0.0)
+
+    media = saidas.iloc[-JANELA_MEDIA:].mean()
+    ponderada = saidas.ewm(halflife=MEIA_VIDA_DIAS).mean().iloc[-1]
+    # A maior das duas taxas: reage a um aumento recente sem esquecer o consumo do mês
+    taxa = np.maximum(media, ponderada)
+
+    quantidade = pd.Series(insumos["quantidade"].to_numpy(), index=codigos)
+    dias_restantes = (quantidade / taxa).where(taxa > 0)
+    data_ruptura = (hoje + pd.to_timedelta(np.floor(dias_restantes), unit="D")).dt.strftime("%Y-%m-%d")
+    reposicao = np.ceil(taxa * (PRAZO_REPOSICAO_DIAS + COBERTURA_DIAS) - quantidade).clip(lower=0)
+
+    return pd.DataFrame({
+        "insumo_codigo": codigos,
+        "quantidade": quantidade.to_numpy(),
+        "media_diaria": media.to_numpy(),
+        "media_ponderada": ponderada.to_numpy(),
+        "dias_restantes": dias_restantes.round(1).to_numpy(),
+        "data_ruptura": data_ruptura.to_numpy(),
+        "reposicao_sugerida": reposicao.astype("int64").to_numpy(),
+    })
+
+# Função para atualizar a previsão guardada
+# Uma vez por dia (a janela anda) recalcula todos os itens; nas demais vezes só os itens
+# marcados como alterados desde a última atualização. Retorna quantos itens foram recalculados.
+@medido("Previsão")
+def atualizar_previsao(hoje=None, completa=False, conexao=None):
+    hoje = hoje or datetime.now().date()
+    inicio = (pd.Timestamp(hoje) - pd.Timedelta(days=JANELA_DIAS - 1)).strftime("%Y-%m-%d")
+
+    # Tudo numa transação: uma movimentação lançada durante o cálculo espera e fica pendente
+    # para a próxima atualização, em vez de ser descartada
+    with banco.transacao(conexao) as conexao:
+        controle = conexao.execute("SELECT dia FROM previsao_controle WHERE id = 1").fetchone()
+        completa = completa or controle is None or controle[0] != hoje.isoformat()
+        pendentes = "" if completa else "AND {} IN (SELECT insumo_codigo FROM previsao_pendentes)"
+        if not completa and conexao.execute("SELECT 1 FROM previsao_pendentes LIMIT 1").fetchone() is None:
+            return 0
+
+        insumos = pd.read_sql_query(
+            f"SELECT codigo, quantidade FROM insumos WHERE codigo IS NOT NULL {pendentes.format('codigo')}",
+            conexao)
+        consumo = pd.read_sql_query(f'''
+            SELECT insumo_codigo, dia, saidas FROM consumo_diario
+            WHERE dia >= ? AND saidas > 0 {pendentes.format('insumo_codigo')}
+        ''', conexao, params=(inicio,))
+        previsao = calcular_previsao(insumos, consumo, hoje)
+
+        if completa:
+            conexao.execute("DELETE FROM previsao_reposicao")
+        else:
+            # Itens excluídos ou com o código alterado saem da previsão
+            conexao.execute("DELETE FROM previsao_reposicao WHERE insumo_codigo IN (SELECT insumo_codigo FROM previsao_pendentes)")
+        conexao.executemany('''
+            INSERT INTO previsao_reposicao (insumo_codigo, quantidade, media_diaria, media_ponderada,
+                                            dias_restantes, data_ruptura, reposicao_sugerida)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', previsao.astype(object).where(previsao.notna(), None).itertuples(index=False, name=None))
+        conexao.execute("DELETE FROM previsao_pendentes")
+        conexao.execute("INSERT OR REPLACE INTO previsao_controle (id, dia) VALUES (1, ?)", (hoje.isoformat(),))
+
+    return len(previsao)
@@ -0,0 +1,242 @@
+import zlib
+from datetime import datetime
+from functools import lru_cache
+
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+import banco
+from exportacao import gravar_atomicamente
+from instrumentacao import medido
+from movimentacoes import ENTRADA, SAIDA
+from validade import formatar_validade
+
+# Relatório de movimentações em PDF
+# As linhas vêm do banco em lotes (banco.iterar_historico) e cada página vai para o arquivo
+# assim que fica pronta, então um relatório de vários anos não carrega na memória nem o
+# histórico inteiro nem o PDF inteiro.
+# Pode rodar numa thread de trabalho: informa o progresso e para quando `cancelado` for
+# sinalizado, sem deixar um arquivo pela metade.
+
+ARQUIVO_RELATORIO = "relatorio_movimentacoes.pdf"
+
+TAMANHO_PAGINA = landscape(A4)
+MARGEM = 36
+ALTURA_LINHA = 16
+FONTE = "Helvetica"
+FONTE_NEGRITO = "Helvetica-Bold"
+TAMANHO_FONTE = 9
+
+# Colunas da tabela: (título, largura em pontos, alinhamento)
+COLUNAS_RELATORIO = [
+    ("ID", 60, "direita"),
+    ("Código", 110, "esquerda"),
+    ("Nome do Insumo", 260, "esquerda"),
+    ("Tipo", 70, "esquerda"),
+    ("Quantidade", 80, "direita"),
+    ("Data", 110, "esquerda"),
+    ("Lote", 70, "esquerda"),
+]
+
+# Progresso informado a cada tantas linhas desenhadas
+INTERVALO_PROGRESSO = 200
+
+class RelatorioCancelado(Exception):
+    pass
+
+# Função para cortar um texto que não cabe na coluna
+# Os mesmos nomes se repetem em milhares de linhas, então o resultado fica em cache
+@lru_cache(maxsize=4096)
+def ajustar_texto(texto, largura, fonte=FONTE, tamanho=TAMANHO_FONTE):
+    if stringWidth(texto, fonte, tamanho) <= largura:
+        return texto
+    # Busca binária pelo maior prefixo que cabe junto com as reticências
+    menor, maior = 0, len(texto)
+    while menor < maior:
+        meio = (menor + maior + 1) // 2
+        if stringWidth(texto[:meio] + "…", fonte, tamanho) <= largura:
+            menor = meio
+        else:
+            maior = meio - 1
+    return texto[:menor] + "…"
+
+# Função para descrever os filtros aplicados, no cabeçalho do relatório
+def descrever_filtros(inicio=None, fim=None, codigo=None, tipo=None):
+    partes = []
+    if inicio or fim:
+        de = formatar_validade(inicio) if inicio else "início"
+        ate = formatar_validade(fim) if fim else "hoje"
+        partes.append(f"Período: {de} a {ate}")
+    if codigo:
+        partes.append(f"Código: {codigo}")
+    if tipo:
+        partes.append(f"Tipo: {tipo}")
+    return " | ".join(partes) or "Todas as movimentações"
+
+# Escreve um PDF página a página num arquivo aberto
+# O canvas do reportlab guarda o conteúdo de todas as páginas até o save(); aqui cada página
+# é comprimida e gravada ao terminar, e só ficam na memória os deslocamentos dos objetos.
+# Usa só as fontes padrão do PDF (sem embutir), com os textos em WinAnsi (cp1252).
+class _EscritorPdf:
+    FONTES = {FONTE: b"F1", FONTE_NEGRITO: b"F2"}
+    CATALOGO, PAGINAS = 1, 2
+
+    def __init__(self, arquivo, tamanho_pagina):
+        self.arquivo = arquivo
+        self.largura, self.altura = tamanho_pagina
+        self.deslocamentos = {}  # número do objeto -> posição no arquivo
+        self.ultimo_objeto = self.PAGINAS
+        self.paginas = []
+        self.conteudo = []
+        self.fonte_atual = (FONTE, TAMANHO_FONTE)
+        self.arquivo.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._objeto(self.CATALOGO, b"<< /Type /Catalog /Pages %d 0 R >>" % self.PAGINAS)
+        self.recursos = b" ".join(
+            b"/%s %d 0 R" % (apelido, self._novo_objeto(
+                b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % nome.encode()))
+            for nome, apelido in self.FONTES.items())
+
+    def _objeto(self, numero, corpo):
+        self.deslocamentos[numero] = self.arquivo.tell()
+        self.arquivo.write(b"%d 0 obj\n%s\nendobj\n" % (numero, corpo))
+
+    def _novo_objeto(self, corpo):
+        self.ultimo_objeto += 1
+        self._objeto(self.ultimo_objeto, corpo)
+        return self.ultimo_objeto
+
+    def fonte(self, nome, tamanho):
+        self.fonte_atual = (nome, tamanho)
+
+    # alinhamento: "esquerda" (x é o início), "direita" (x é o fim) ou "centro"
+    def texto(self, x, y, texto, alinhamento="esquerda"):
+        nome, tamanho = self.fonte_atual
+        if alinhamento != "esquerda":
+            largura = stringWidth(texto, nome, tamanho)
+            x -= largura if alinhamento == "direita" else largura / 2
+        codificado = texto.encode("cp1252", "replace").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+        self.conteudo.append(b"BT /%s %g Tf %.2f %.2f Td (%s) Tj ET" % (self.FONTES[nome], tamanho, x, y, codificado))
+
+    def linha(self, x1, y1, x2, y2):
+        self.conteudo.append(b"%.2f %.2f m %.2f %.2f l S" % (x1, y1, x2, y2))
+
+    def terminar_pagina(self):
+        fluxo = zlib.compress(b"\n".join(self.conteudo))
+        self.conteudo = []
+        conteudo = self._novo_objeto(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(fluxo), fluxo))
+        self.paginas.append(self._novo_objeto(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %g %g] /Resources << /Font << %s >> >> /Contents %d 0 R >>"
+            % (self.PAGINAS, self.largura, self.altura, self.recursos, conteudo)))
+
+    def terminar(self):
+        if self.conteudo or not self.paginas:
+            self.terminar_pagina()
+        filhos = b" ".join(b"%d 0 R" % pagina for pagina in self.paginas)
+        self._objeto(self.PAGINAS, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (filhos, len(self.paginas)))
+        inicio_xref = self.arquivo.tell()
+        total = self.ultimo_objeto + 1
+        self.arquivo.write(b"xref\n0 %d\n0000000000 65535 f \n" % total)
+        for numero in range(1, total):
+            self.arquivo.write(b"%010d 00000 n \n" % self.deslocamentos[numero])
+        self.arquivo.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                           % (total, self.CATALOGO, inicio_xref))
+
+# Desenha o relatório página a página
+class _DesenhoRelatorio:
+    def __init__(self, arquivo, descricao):
+        self.pdf = _EscritorPdf(arquivo, TAMANHO_PAGINA)
+        self.largura, self.altura = TAMANHO_PAGINA
+        self.descricao = descricao
+        self.gerado_em = datetime.now().strftime("%d/%m/%Y %H:%M")
+        self.pagina = 0
+        self.y = 0
+        self.totais_pagina = {ENTRADA: 0, SAIDA: 0}
+
+    def _celulas(self, valores, fonte):
+        self.pdf.fonte(fonte, TAMANHO_FONTE)
+        x = MARGEM
+        for valor, (_, largura, alinhamento) in zip(valores, COLUNAS_RELATORIO):
+            texto = ajustar_texto("" if valor is None else str(valor), largura - 6, fonte)
+            self.pdf.texto(x + largura - 6 if alinhamento == "direita" else x, self.y, texto, alinhamento)
+            x += largura
+        self.y -= ALTURA_LINHA
+
+    def _linha_horizontal(self):
+        self.pdf.linha(MARGEM, self.y + ALTURA_LINHA - 4, self.largura - MARGEM, self.y + ALTURA_LINHA - 4)
+
+    def nova_pagina(self):
+        if self.pagina:
+            self.fechar_pagina()
+            self.pdf.terminar_pagina()
+        self.pagina += 1
+        self.totais_pagina = {ENTRADA: 0, SAIDA: 0}
+        topo = self.altura - MARGEM
+        self.pdf.fonte(FONTE_NEGRITO, 14)
+        self.pdf.texto(MARGEM, topo, "Relatório de Movimentações de Estoque")
+        self.pdf.fonte(FONTE, TAMANHO_FONTE)
+        self.pdf.texto(self.largura - MARGEM, topo, f"Gerado em {self.gerado_em}", "direita")
+        self.pdf.texto(MARGEM, topo - 16, self.descricao)
+        self.y = topo - 40
+        self._celulas([titulo for titulo, _, _ in COLUNAS_RELATORIO], FONTE_NEGRITO)
+        self._linha_horizontal()
+
+    def fechar_pagina(self):
+        self._linha_horizontal()
+        self._celulas(["", "", "Subtotal da página", "",
+                       f"+{self.totais_pagina[ENTRADA]} / -{self.totais_pagina[SAIDA]}", ""], FONTE_NEGRITO)
+        self.pdf.fonte(FONTE, TAMANHO_FONTE)
+        self.pdf.texto(self.largura / 2, MARGEM / 2, f"Página {self.pagina}", "centro")
+
+    def movimentacao(self, mov):
+        # Reserva espaço para o subtotal no pé da página
+        if self.pagina == 0 or self.y < MARGEM + 2 * ALTURA_LINHA:
+            self.nova_pagina()
+        data = datetime.strptime(mov.data, "%Y-%m-%d %H:%M:%S").strftime("%d/%m/%Y %H:%M")
+        self._celulas([mov.id, mov.insumo_codigo, mov.nome, mov.tipo, mov.quantidade, data, mov.lote or ""], FONTE)
+        if mov.tipo in self.totais_pagina:
+            self.totais_pagina[mov.tipo] += mov.quantidade
+
+    def totais(self, quantidade, entradas, saidas):
+        if self.pagina == 0 or self.y < MARGEM + 6 * ALTURA_LINHA:
+            self.nova_pagina()
+        self.fechar_pagina()
+        self.y -= ALTURA_LINHA
+        self.pdf.fonte(FONTE_NEGRITO, 11)
+        for texto in (f"Movimentações: {quantidade}",
+                      f"Total de entradas: {entradas}",
+                      f"Total de saídas: {saidas}",
+                      f"Saldo do período: {entradas - saidas:+d}"):
+            self.pdf.texto(MARGEM, self.y, texto)
+            self.y -= ALTURA_LINHA
+        self.pdf.terminar()
+
+# Função para gerar o relatório de movimentações em PDF
+# progresso(feitas, total) é chamado periodicamente; cancelado é um threading.Event (opcional)
+# Lança RelatorioCancelado se for cancelado; nesse caso o arquivo de destino não é alterado
+@medido("Relatório")
+def gerar_relatorio_pdf(nome_arquivo=ARQUIVO_RELATORIO, inicio=None, fim=None, codigo=None, tipo=None,
+                        progresso=None, cancelado=None):
+    total = banco.contar_historico(inicio, fim, codigo, tipo)
+    descricao = descrever_filtros(inicio, fim, codigo, tipo)
+
+    def escrever(caminho):
+        with open(caminho, "wb") as arquivo:
+            desenho = _DesenhoRelatorio(arquivo, descricao)
+            feitas = entradas = saidas = 0
+            for mov in banco.iterar_historico(inicio, fim, codigo, tipo):
+                if cancelado is not None and cancelado.is_set():
+                    raise RelatorioCancelado()
+                desenho.movimentacao(mov)
+                feitas += 1
+                if mov.tipo == ENTRADA:
+                    entradas += mov.quantidade
+                elif mov.tipo == SAIDA:
+                    saidas += mov.quantidade
+                if progresso is not None and feitas % INTERVALO_PROGRESSO == 0:
+                    progresso(feitas, total)
+            desenho.totais(feitas, entradas, saidas)
+        if progresso is not None:
+            progresso(feitas, total)
+
+    gravar_atomicamente(nome_arquivo, escrever)
+    return nome_arquivo
@@ -0,0 +1,342 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import banco
+import instrumentacao
+import movimentacoes
+from exportacao import ExportadorPlanilha
+
+# Serviço de estoque: um pequeno servidor HTTP/JSON dono do banco de dados
+# Com várias estações (recepção, salas de atendimento), só o computador do serviço abre o
+# estoque_dental.db; as outras usam a interface em modo cliente (cliente.py), em vez de abrir o
+# arquivo por uma pasta compartilhada da rede, onde o SQLite trava ou corrompe.
+#
+#   python main.py servico --endereco 0.0.0.0 --porta 8765
+#   python main.py --servidor 192.168.0.10:8765
+#
+# Rotas (corpo e respostas em JSON):
+#   GET    /versao                         versão da lista de itens
+#   GET    /insumos                        lista de itens; ETag = versão (If-None-Match -> 304)
+#   GET    /insumos/<rowid>                um item
+#   POST   /insumos                        cadastrar um item (devolve o item gravado, com a situação do estoque)
+#   PUT    /insumos/<rowid>                alterar um item (idem; níveis de estoque omitidos ficam como estão)
+#   DELETE /insumos/<rowid>                excluir um item
+#   POST   /movimentacoes                  aplicar uma guia {"linhas": [[codigo, tipo, qtd, lote, validade], ...],
+#                                          "parcial": false} (lote e validade opcionais)
+#   GET    /historico?inicio=&fim=&codigo=&tipo=&apos_data=&apos_id=&limite=   (inicio e fim: AAAA-MM-DD)
+#   GET    /alertas?dias=30                um alerta por lote (lote null = estoque sem lote do item)
+#   GET    /lotes?codigo=                  lotes com saldo do item, na ordem de validade
+#   GET    /estoque_baixo                  itens abaixo do estoque alvo, dos mais críticos para os menos
+#   GET    /previsao                       previsão de reposição guardada
+#   POST   /previsao/atualizar             recalcula a previsão dos itens alterados
+#   GET    /codigos_barras                 pares [barras, codigo do insumo]
+#   POST   /codigos_barras                 associar {"barras": ..., "codigo": ...}
+#   POST   /lote                           várias requisições numa só ida e volta:
+#                                          {"requisicoes": [{"metodo": "GET", "caminho": "/insumos"}, ...]}
+#
+# As conexões HTTP ficam abertas entre requisições (keep-alive), cada uma atendida por uma thread
+# com a sua própria conexão com o banco.
+
+ENDERECO_PADRAO = "127.0.0.1"
+PORTA_PADRAO = 8765
+
+# Erro de uma requisição, devolvido ao cliente como {"erro": mensagem}
+class ErroRequisicao(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+# Exportação da planilha depois das alterações (criado por servir())
+exportador = None
+
+def _alterado():
+    if exportador is not None:
+        exportador.agendar()
+
+def _parametro(consulta, nome, conversao=str):
+    valor = consulta.get(nome, [None])[0]
+    if valor in (None, ""):
+        return None
+    try:
+        return conversao(valor)
+    except ValueError:
+        raise ErroRequisicao(HTTPStatus.BAD_REQUEST, f"Parâmetro inválido: {nome}")
+
+def _campos_insumo(corpo):
+    try:
+        niveis = [None if corpo.get(nome) is None else int(corpo[nome]) for nome in ("estoque_minimo", "estoque_alvo")]
+        return (corpo.get("codigo"), corpo["nome"], int(corpo["quantidade"]), corpo.get("validade"),
+                corpo.get("localizacao"), corpo.get("observacao"), *niveis)
+    except (KeyError, TypeError, ValueError):
+        raise ErroRequisicao(HTTPStatus.BAD_REQUEST, "Informe nome e quantidade do insumo")
+
+# Data ISO (AAAA-MM-DD) de um parâmetro da URL; outro formato vira ValueError (400 em _parametro)
+def _data_iso(valor):
+    return date.fromisoformat(valor).isoformat()
+
+def _rowid(partes):
+    return int(partes[1])
+
+# Rotas: cada função recebe (partes do caminho, parâmetros da URL, corpo, cabeçalhos) e
+# devolve (status, corpo da resposta, cabeçalhos extras)
+
+def rota_versao(partes, consulta, corpo, cabecalhos):
+    return HTTPStatus.OK, {"versao": banco.versao_insumos()}, {}
+
+def rota_listar_insumos(partes, consulta, corpo, cabecalhos):
+    # A versão é lida antes da lista: se houver uma gravação entre as duas leituras, a lista é a
+    # mais nova e o cliente só baixa de novo na próxima vez, nunca fica com dados velhos
+    versao = banco.versao_insumos()
+    etag = f'"{versao}"'
+    if cabecalhos.get("If-None-Match") == etag:
+        return HTTPStatus.NOT_MODIFIED, None, {"ETag": etag}
+    insumos = [list(insumo) for insumo in banco.listar_insumos()]
+    return HTTPStatus.OK, {"versao": versao, "insumos": insumos}, {"ETag": etag}
+
+def rota_obter_insumo(partes, consulta, corpo, cabecalhos):
+    insumo = banco.obter_insumo(_rowid(partes))
+    if insumo is None:
+        raise ErroRequisicao(HTTPStatus.NOT_FOUND, "Insumo não encontrado")
+    return HTTPStatus.OK, list(insumo), {}
+
+# O item gravado volta na resposta, para o evento do cliente levar a situação calculada no banco
+def rota_inserir_insumo(partes, consulta, corpo, cabecalhos):
+    rowid = banco.inserir_insumo(*_campos_insumo(corpo))
+    _alterado()
+    return HTTPStatus.CREATED, {"rowid": rowid, "versao": banco.versao_insumos(),
+                                "insumo": list(banco.obter_insumo(rowid))}, {}
+
+def rota_atualizar_insumo(partes, consulta, corpo, cabecalhos):
+    rowid = _rowid(partes)
+    banco.atualizar_insumo(rowid, *_campos_insumo(corpo))
+    _alterado()
+    insumo = banco.obter_insumo(rowid)
+    return HTTPStatus.OK, {"versao": banco.versao_insumos(), "insumo": insumo and list(insumo)}, {}
+
+def rota_excluir_insumo(partes, consulta, corpo, cabecalhos):
+    banco.excluir_insumo(_rowid(partes))
+    _alterado()
+    return HTTPStatus.OK, {"versao": banco.versao_insumos()}, {}
+
+def rota_movimentacoes(partes, consulta, corpo, cabecalhos):
+    try:
+        linhas = [movimentacoes.LinhaMovimentacao(*linha) for linha in corpo["linhas"]]
+    except (KeyError, TypeError):
+        raise ErroRequisicao(HTTPStatus.BAD_REQUEST, "Informe as linhas da guia")
+    resultados = movimentacoes.aplicar_movimentacoes(linhas, parcial=bool(corpo.get("parcial")))
+    if any(resultado.aplicada for resultado in resultados):
+        _alterado()
+    return HTTPStatus.OK, {
+        "resultados": [[resultado.aplicada, resultado.motivo, resultado.saldo] for resultado in resultados],
+    }, {}
+
+def rota_historico(partes, consulta, corpo, cabecalhos):
+    apos = None
+    if _parametro(consulta, "apos_id", int) is not None:
+        apos = banco.Movimentacao(_parametro(consulta, "apos_id", int), None, None, None, None,
+                                  _parametro(consulta, "apos_data"))
+    pagina = banco.listar_historico(
+        inicio=_parametro(consulta, "inicio", _data_iso), fim=_parametro(consulta, "fim", _data_iso),
+        codigo=_parametro(consulta, "codigo"), tipo=_parametro(consulta, "tipo"),
+        apos=apos, limite=_parametro(consulta, "limite", int))
+    return HTTPStatus.OK, [list(linha) for linha in pagina], {}
+
+def rota_alertas(partes, consulta, corpo, cabecalhos):
+    dias = _parametro(consulta, "dias", int)
+    alertas = banco.buscar_alertas_validade(banco.DIAS_ALERTA_VALIDADE if dias is None else dias)
+    return HTTPStatus.OK, [list(alerta) for alerta in alertas], {}
+
+def rota_lotes(partes, consulta, corpo, cabecalhos):
+    codigo = _parametro(consulta, "codigo")
+    if codigo is None:
+        raise ErroRequisicao(HTTPStatus.BAD_REQUEST, "Informe o código do item")
+    return HTTPStatus.OK, [list(lote) for lote in banco.listar_lotes(codigo)], {}
+
+def rota_estoque_baixo(partes, consulta, corpo, cabecalhos):
+    return HTTPStatus.OK, [list(insumo) for insumo in banco.listar_estoque_baixo()], {}
+
+def rota_previsao(partes, consulta, corpo, cabecalhos):
+    return HTTPStatus.OK, [list(item) for item in banco.listar_previsao_reposicao()], {}
+
+def rota_atualizar_previsao(partes, consulta, corpo, cabecalhos):
+    import previsao  # pandas só quando a previsão é calculada
+    return HTTPStatus.OK, {"recalculados": previsao.atualizar_previsao()}, {}
+
+def rota_listar_codigos_barras(partes, consulta, corpo, cabecalhos):
+    return HTTPStatus.OK, [list(par) for par in banco.listar_codigos_barras()], {}
+
+def rota_associar_codigo_barras(partes, consulta, corpo, cabecalhos):
+    try:
+        barras, codigo = str(corpo["barras"]), corpo["codigo"]
+    except (KeyError, TypeError):
+        raise ErroRequisicao(HTTPStatus.BAD_REQUEST, "Informe o código de barras e o código do insumo")
+    banco.associar_codigo_barras(barras, codigo)
+    return HTTPStatus.OK, {}, {}
+
+def rota_lote(partes, consulta, corpo, cabecalhos):
+    respostas = []
+    for requisicao in (corpo or {}).get("requisicoes", []):
+        status, resposta, extras = executar(requisicao.get("metodo", "GET"), requisicao.get("caminho", ""),
+                                            requisicao.get("corpo"), requisicao.get("cabecalhos") or {})
+        respostas.append({"status": int(status), "corpo": resposta, "cabecalhos": extras})
+    return HTTPStatus.OK, {"respostas": respostas}, {}
+
+# (método, caminho com "*" no lugar dos números) -> rota
+ROTAS = {
+    ("GET", "versao"): rota_versao,
+    ("GET", "insumos"): rota_listar_insumos,
+    ("GET", "insumos/*"): rota_obter_insumo,
+    ("POST", "insumos"): rota_inserir_insumo,
+    ("PUT", "insumos/*"): rota_atualizar_insumo,
+    ("DELETE", "insumos/*"): rota_excluir_insumo,
+    ("POST", "movimentacoes"): rota_movimentacoes,
+    ("GET", "historico"): rota_historico,
+    ("GET", "alertas"): rota_alertas,
+    ("GET", "lotes"): rota_lotes,
+    ("GET", "estoque_baixo"): rota_estoque_baixo,
+    ("GET", "previsao"): rota_previsao,
+    ("POST", "previsao/atualizar"): rota_atualizar_previsao,
+    ("GET", "codigos_barras"): rota_listar_codigos_barras,
+    ("POST", "codigos_barras"): rota_associar_codigo_barras,
+    ("POST", "lote"): rota_lote,
+}
+
+# Gravações repetidas pelo cliente
+# Cada POST/PUT/DELETE do cliente leva um identificador próprio (cabeçalho X-Requisicao). Se a
+# conexão cair depois da gravação, o cliente repete a requisição com o mesmo identificador e
+# recebe a resposta guardada, sem gravar de novo (uma guia não é lançada duas vezes).
+CABECALHO_REQUISICAO = "X-Requisicao"
+RESPOSTAS_GUARDADAS = 1000
+
+_respostas = OrderedDict()  # identificador -> [threading.Event, resposta]
+_trava_respostas = threading.Lock()
+
+def _executar_uma_vez(identificador, metodo, caminho, corpo, cabecalhos):
+    with _trava_respostas:
+        registro = _respostas.get(identificador)
+        repetida = registro is not None
+        if not repetida:
+            registro = _respostas[identificador] = [threading.Event(), None]
+            while len(_respostas) > RESPOSTAS_GUARDADAS:
+                _respostas.popitem(last=False)
+    if repetida:
+        registro[0].wait()  # a original pode ainda estar em andamento
+        return registro[1]
+    try:
+        registro[1] = executar(metodo, caminho, corpo, cabecalhos)
+    finally:
+        if registro[1] is None:
+            registro[1] = HTTPStatus.INTERNAL_SERVER_ERROR, {"erro": "Requisição interrompida"}, {}
+        registro[0].set()
+    return registro[1]
+
+# Função para atender uma requisição (também usada por cada item de /lote)
+# Erros viram status HTTP: dados inválidos 400, inexistente 404, conflito no banco 409
+def executar(metodo, caminho, corpo, cabecalhos):
+    url = urlsplit(caminho)
+    partes = [parte for parte in url.path.split("/") if parte]
+    padrao = "/".join("*" if parte.isdigit() else parte for parte in partes)
+    rota = ROTAS.get((metodo, padrao))
+    if rota is None:
+        return HTTPStatus.NOT_FOUND, {"erro": f"Rota inexistente: {metodo} {url.path}"}, {}
+    inicio = time.perf_counter()
+    try:
+        return rota(partes, parse_qs(url.query), corpo, cabecalhos)
+    except ErroRequisicao as e:
+        return e.status, {"erro": str(e)}, {}
+    except sqlite3.IntegrityError as e:
+        return HTTPStatus.CONFLICT, {"erro": str(e)}, {}
+    except sqlite3.Error as e:
+        print(f"Erro no banco ao atender {metodo} {url.path}: {e}")
+        return HTTPStatus.INTERNAL_SERVER_ERROR, {"erro": str(e)}, {}
+    except Exception as e:
+        # Qualquer outra falha responde 500: sem resposta, o cliente repetiria a requisição
+        print(f"Erro ao atender {metodo} {url.path}: {type(e).__name__}: {e}")
+        return HTTPStatus.INTERNAL_SERVER_ERROR, {"erro": f"Erro interno: {e}"}, {}
+    finally:
+        instrumentacao.registrar("Serviço", f"{metodo} /{padrao}", (time.perf_counter() - inicio) * 1000)
+
+class ManipuladorEstoque(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # mantém a conexão aberta entre requisições (keep-alive)
+    server_version = "EstoqueDental/1"
+    # Cabeçalhos e corpo saem em escritas separadas; sem isto o Nagle segura a segunda por ~40 ms
+    disable_nagle_algorithm = True
+
+    def _atender(self, metodo):
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        corpo = None
+        if tamanho:
+            try:
+                corpo = json.loads(self.rfile.read(tamanho))
+            except ValueError:
+                self._responder(HTTPStatus.BAD_REQUEST, {"erro": "Corpo JSON inválido"}, {})
+                return
+        identificador = self.headers.get(CABECALHO_REQUISICAO)
+        if metodo != "GET" and identificador:
+            self._responder(*_executar_uma_vez(identificador, metodo, self.path, corpo, self.headers))
+        else:
+            self._responder(*executar(metodo, self.path, corpo, self.headers))
+
+    def _responder(self, status, resposta, extras):
+        dados = b"" if resposta is None else json.dumps(resposta, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        for nome, valor in extras.items():
+            self.send_header(nome, valor)
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        if dados:
+            self.wfile.write(dados)
+
+    def do_GET(self):
+        self._atender("GET")
+
+    def do_POST(self):
+        self._atender("POST")
+
+    def do_PUT(self):
+        self._atender("PUT")
+
+    def do_DELETE(self):
+        self._atender("DELETE")
+
+    # Cada conexão é atendida por uma thread; a conexão com o banco dela fecha junto
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            banco.fechar_conexao()
+
+    def log_message(self, formato, *args):
+        pass  # os tempos ficam na instrumentação (categoria "Serviço")
+
+# Função para criar o servidor (porta 0 = qualquer porta livre, útil em testes)
+def criar_servidor(endereco=ENDERECO_PADRAO, porta=PORTA_PADRAO):
+    banco.criar_tabelas()
+    banco.fechar_conexao()
+    servidor = ThreadingHTTPServer((endereco, porta), ManipuladorEstoque)
+    servidor.daemon_threads = True
+    return servidor
+
+# Função para rodar o serviço até Ctrl+C
+def servir(endereco=ENDERECO_PADRAO, porta=PORTA_PADRAO):
+    global exportador
+    exportador = ExportadorPlanilha()
+    servidor = criar_servidor(endereco, porta)
+    print(f"Serviço de estoque em http://{servidor.server_address[0]}:{servidor.server_address[1]} "
+          f"(banco: {banco.CAMINHO_BANCO})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        exportador.descarregar()
@@ -0,0 +1,246 @@
+import tkinter as tk
+import ttkbootstrap as ttk
+
+from instrumentacao import medido
+
+# Tabela com rolagem virtual
+# Em vez de inserir todas as linhas no Treeview, a tabela mostra apenas as linhas visíveis e
+# busca na fonte de dados somente a janela visível mais uma margem de pré-carregamento.
+#
+# A fonte de dados precisa oferecer:
+#   contar() -> total de linhas
+#   buscar(inicio, limite) -> linhas a partir da posição `inicio`
+#   chave(linha) -> identificador único da linha
+#   ordenar(indice_coluna, decrescente) -> True se a coluna pode ser ordenada
+# e, opcionalmente, paginação por chave (keyset), usada ao rolar para linhas vizinhas
+# quando o atributo paginacao_por_chave é verdadeiro:
+#   buscar_apos(linha, limite) / buscar_antes(linha, limite)
+#
+# A primeira tela de uma fonte nova pode ser buscada fora da thread da interface:
+# preparar_fonte() na thread do Tk, carregar_inicio() numa thread de trabalho e o resultado
+# entregue a definir_fonte(fonte, carga).
+class TabelaVirtual:
+    def __init__(self, master, colunas, fonte, formatar, margem=50, largura_coluna=120):
+        self.colunas = colunas
+        self.fonte = fonte
+        self.formatar = formatar  # linha -> (valores, tags)
+        self.margem = margem
+
+        self.frame = ttk.Frame(master)
+        self.tabela = ttk.Treeview(self.frame, columns=colunas, show="headings", selectmode="browse")
+        for col in colunas:
+            self.tabela.heading(col, text=col, command=lambda c=col: self.ordenar(c))
+            self.tabela.column(col, width=largura_coluna)
+        self.barra = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self._rolar)
+        self.barra.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tabela.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self._total = 0
+        self._inicio = 0
+        self._visiveis = 20
+        self._buffer = []
+        self._buffer_inicio = 0
+        self._itens = []  # Itens do Treeview reaproveitados a cada rolagem
+        self._linhas_por_item = {}
+        self._selecionada = None
+        self._ordem = None
+
+        self.tabela.bind("<Configure>", self._redimensionar)
+        self.tabela.bind("<<TreeviewSelect>>", self._ao_selecionar)
+        self.tabela.bind("<MouseWheel>", lambda e: self.rolar(-1 if e.delta > 0 else 1, "units") or "break")
+        self.tabela.bind("<Button-4>", lambda e: self.rolar(-1, "units") or "break")
+        self.tabela.bind("<Button-5>", lambda e: self.rolar(1, "units") or "break")
+        self.tabela.bind("<Up>", lambda e: self._mover_selecao(-1))
+        self.tabela.bind("<Down>", lambda e: self._mover_selecao(1))
+        self.tabela.bind("<Prior>", lambda e: self._mover_selecao(-self._visiveis))
+        self.tabela.bind("<Next>", lambda e: self._mover_selecao(self._visiveis))
+        self.tabela.bind("<Home>", lambda e: self._mover_selecao(-self._total))
+        self.tabela.bind("<End>", lambda e: self._mover_selecao(self._total))
+
+    def pack(self, **opcoes):
+        self.frame.pack(**opcoes)
+
+    def tag_configure(self, tag, **opcoes):
+        self.tabela.tag_configure(tag, **opcoes)
+
+    # Aplica à fonte a ordenação atual da tabela e devolve quantas linhas a primeira tela usa
+    def preparar_fonte(self, fonte):
+        if self._ordem:
+            fonte.ordenar(*self._ordem)
+        return self._visiveis + self.margem
+
+    # Busca o total e as primeiras linhas de uma fonte preparada (pode rodar em qualquer thread)
+    @staticmethod
+    def carregar_inicio(fonte, limite):
+        return fonte.contar(), fonte.buscar(0, limite)
+
+    # Troca a fonte de dados (por exemplo, ao aplicar um filtro) e volta ao topo
+    # carga: (total, primeiras linhas) já buscados por carregar_inicio, se houver
+    def definir_fonte(self, fonte, carga=None):
+        if carga is None:
+            self.preparar_fonte(fonte)
+        self.fonte = fonte
+        if carga is None:
+            self.recarregar(manter_posicao=False)
+            return
+        self._total, self._buffer = carga
+        self._buffer = list(self._buffer)
+        self._buffer_inicio = 0
+        self._mostrar(0)
+
+    # Descarta as linhas em memória e busca de novo a janela visível
+    def recarregar(self, manter_posicao=True):
+        self._total = self.fonte.contar()
+        self._buffer = []
+        self._buffer_inicio = 0
+        if not manter_posicao:
+            self._inicio = 0
+        self._mostrar(self._inicio)
+
+    # Substitui as linhas em memória para as quais substituir(linha) devolve uma nova linha
+    # (alterações avisadas por eventos.py), sem consultar a fonte; redesenha só se alguma mudou
+    # Retorna quantas linhas foram substituídas
+    def substituir_linhas(self, substituir):
+        substituidas = 0
+        for posicao, linha in enumerate(self._buffer):
+            nova = substituir(linha)
+            if nova is not None:
+                self._buffer[posicao] = nova
+                substituidas += 1
+        if substituidas:
+            self._mostrar(self._inicio)
+        return substituidas
+
+    # Tira da tabela a linha com esta chave, se estiver em memória (retorna False se não estiver:
+    # a posição das demais é desconhecida e a tabela precisa ser recarregada)
+    def remover_linha(self, chave):
+        for posicao, linha in enumerate(self._buffer):
+            if self.fonte.chave(linha) == chave:
+                del self._buffer[posicao]
+                self._total -= 1
+                self._mostrar(self._inicio)
+                return True
+        return False
+
+    # Linha (tupla vinda da fonte) atualmente selecionada, ou None
+    def linha_selecionada(self):
+        selecao = self.tabela.selection()
+        if selecao:
+            return self._linhas_por_item.get(selecao[0])
+        return None
+
+    # Ordenação pelo cabeçalho: feita pela fonte (ORDER BY no banco), não em memória
+    def ordenar(self, coluna):
+        indice = self.colunas.index(coluna)
+        decrescente = self._ordem == (indice, False)
+        if not self.fonte.ordenar(indice, decrescente):
+            return
+        self._ordem = (indice, decrescente)
+        for i, col in enumerate(self.colunas):
+            seta = (" ▼" if decrescente else " ▲") if i == indice else ""
+            self.tabela.heading(col, text=col + seta)
+        self.recarregar(manter_posicao=False)
+
+    def rolar(self, quantidade, unidade):
+        if unidade == "pages":
+            quantidade *= self._visiveis
+        self._mostrar(self._inicio + quantidade)
+
+    def _rolar(self, acao, *args):
+        if acao == "moveto":
+            self._mostrar(int(float(args[0]) * self._total))
+        elif acao == "scroll":
+            self.rolar(int(args[0]), args[1])
+
+    def _redimensionar(self, event):
+        altura_linha = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        visiveis = max(1, (event.height - altura_linha) // altura_linha)
+        if visiveis != self._visiveis:
+            self._visiveis = visiveis
+            self._mostrar(self._inicio)
+
+    def _ao_selecionar(self, event):
+        linha = self.linha_selecionada()
+        if linha is not None:
+            self._selecionada = self.fonte.chave(linha)
+
+    def _mover_selecao(self, passos):
+        selecao = self.tabela.selection()
+        atual = self._itens.index(selecao[0]) if selecao and selecao[0] in self._itens else -1
+        posicao = min(max(self._inicio + atual + passos, 0), max(self._total - 1, 0))
+        if posicao < self._inicio:
+            self._mostrar(posicao)
+        elif posicao >= self._inicio + self._visiveis:
+            self._mostrar(posicao - self._visiveis + 1)
+        indice = posicao - self._inicio
+        if 0 <= indice < len(self._itens):
+            item = self._itens[indice]
+            self.tabela.selection_set(item)
+            self.tabela.focus(item)
+        return "break"
+
+    def _por_chave(self):
+        return getattr(self.fonte, "paginacao_por_chave", False)
+
+    # Garante que as linhas [inicio, fim) estejam em memória, buscando o mínimo possível
+    def _garantir(self, inicio, fim):
+        buffer_fim = self._buffer_inicio + len(self._buffer)
+        if self._buffer and self._buffer_inicio <= inicio and fim <= buffer_fim:
+            return
+
+        if self._buffer and self._buffer_inicio <= inicio <= buffer_fim and self._por_chave():
+            # Rolagem para baixo: continua a partir da última linha carregada
+            self._buffer.extend(self.fonte.buscar_apos(self._buffer[-1], fim - buffer_fim + self.margem))
+        elif self._buffer and self._buffer_inicio <= fim <= buffer_fim and self._por_chave():
+            # Rolagem para cima: continua a partir da primeira linha carregada
+            novas = self.fonte.buscar_antes(self._buffer[0], self._buffer_inicio - inicio + self.margem)
+            self._buffer[:0] = novas
+            self._buffer_inicio -= len(novas)
+
+        buffer_fim = self._buffer_inicio + len(self._buffer)
+        if not self._buffer or self._buffer_inicio > inicio or buffer_fim < min(fim, self._total) or self._buffer_inicio < 0:
+            # Salto (barra de rolagem arrastada) ou dados alterados: busca por posição
+            self._buffer_inicio = max(0, inicio - self.margem)
+            self._buffer = self.fonte.buscar(self._buffer_inicio, fim - self._buffer_inicio + self.margem)
+
+        # Limita o que fica em memória à janela visível mais as margens
+        limite_inicio = max(self._buffer_inicio, inicio - 2 * self.margem)
+        limite_fim = fim + 2 * self.margem
+        self._buffer = self._buffer[limite_inicio - self._buffer_inicio:limite_fim - self._buffer_inicio]
+        self._buffer_inicio = limite_inicio
+
+    @medido("Tela", "tabela virtual: atualizar linhas visíveis")
+    def _mostrar(self, inicio):
+        inicio = min(max(inicio, 0), max(self._total - self._visiveis, 0))
+        fim = min(inicio + self._visiveis, self._total)
+        self._inicio = inicio
+        if fim > inicio:
+            self._garantir(inicio, fim)
+        linhas = self._buffer[inicio - self._buffer_inicio:fim - self._buffer_inicio]
+
+        self._linhas_por_item = {}
+        selecionar = None
+        for i, linha in enumerate(linhas):
+            valores, tags = self.formatar(linha)
+            if i < len(self._itens):
+                item = self._itens[i]
+                self.tabela.item(item, values=valores, tags=tags)
+            else:
+                item = self.tabela.insert("", tk.END, values=valores, tags=tags)
+                self._itens.append(item)
+            self._linhas_por_item[item] = linha
+            if self._selecionada is not None and self.fonte.chave(linha) == self._selecionada:
+                selecionar = item
+        if len(self._itens) > len(linhas):
+            self.tabela.delete(*self._itens[len(linhas):])
+            del self._itens[len(linhas):]
+
+        if selecionar:
+            self.tabela.selection_set(selecionar)
+        elif self.tabela.selection():
+            self.tabela.selection_set(())
+
+        if self._total:
+            self.barra.set(inicio / self._total, fim / self._total)
+        else:
+            self.barra.set(0, 1)
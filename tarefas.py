@@ -0,0 +1,162 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import tkinter as tk
+import ttkbootstrap as ttk
+
+import eventos
+
+# Executor de tarefas em segundo plano para a interface
+# Consultas, exportações e relatórios rodam num pool de threads; o resultado (ou o erro) volta
+# para a thread do Tk por um único laço de root.after, que chama ao_concluir/ao_falhar/ao_progresso.
+# Assim nenhuma operação lenta roda dentro de um callback de botão e a janela não congela.
+# Cada thread do pool usa a sua própria conexão com o banco (banco.obter_conexao). Os eventos de
+# alteração (eventos.py) publicados pelas tarefas também são entregues por esse laço.
+
+TRABALHADORES = 4
+INTERVALO_VERIFICACAO = 50  # ms entre verificações das tarefas em andamento
+
+# Uma tarefa enviada ao executor
+# cancelar() descarta o resultado; se a função recebeu `cancelado`, ela também pode parar antes
+class Tarefa:
+    def __init__(self, ao_concluir, ao_falhar, ao_progresso, dono, indicador):
+        self.cancelado = threading.Event()
+        self.futuro = None
+        self.ao_concluir = ao_concluir
+        self.ao_falhar = ao_falhar
+        self.ao_progresso = ao_progresso
+        self.dono = dono
+        self.indicador = indicador
+        self._progresso = None
+        self._progresso_entregue = None
+
+    def cancelar(self):
+        self.cancelado.set()
+        if self.futuro is not None:
+            self.futuro.cancel()
+
+    @property
+    def cancelada(self):
+        return self.cancelado.is_set()
+
+    def concluida(self):
+        return self.futuro is not None and self.futuro.done()
+
+    # Chamado pela thread de trabalho; só o valor mais recente é entregue à interface
+    def informar_progresso(self, *valores):
+        self._progresso = valores
+
+class ExecutorTarefas:
+    def __init__(self, trabalhadores=TRABALHADORES, intervalo=INTERVALO_VERIFICACAO):
+        self._pool = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="tarefa")
+        self._intervalo = intervalo
+        self._root = None
+        self._tarefas = []
+        self._verificacao = None
+
+    # Janela principal usada para agendar as verificações (root.after)
+    def vincular(self, root):
+        self._root = root
+
+    # Executa funcao(*args, **kwargs) numa thread do pool
+    # ao_concluir(resultado) / ao_falhar(erro): chamados na thread do Tk
+    # ao_progresso(*valores): a função recebe progresso=... e a interface recebe o último valor
+    # cancelavel: a função recebe cancelado=threading.Event, sinalizado por Tarefa.cancelar()
+    # dono: widget da tela; se ela for fechada antes do fim, o resultado é descartado
+    # indicador: IndicadorOcupado exibido enquanto a tarefa roda
+    def executar(self, funcao, *args, ao_concluir=None, ao_falhar=None, ao_progresso=None,
+                 cancelavel=False, dono=None, indicador=None, **kwargs):
+        tarefa = Tarefa(ao_concluir, ao_falhar, ao_progresso, dono, indicador)
+        if cancelavel:
+            kwargs["cancelado"] = tarefa.cancelado
+        if ao_progresso is not None:
+            kwargs["progresso"] = tarefa.informar_progresso
+        if indicador is not None:
+            indicador.iniciar()
+        tarefa.futuro = self._pool.submit(funcao, *args, **kwargs)
+        self._tarefas.append(tarefa)
+        self._agendar_verificacao()
+        return tarefa
+
+    # Cancela as tarefas pendentes e libera o pool (ao fechar o aplicativo)
+    def encerrar(self):
+        for tarefa in self._tarefas:
+            tarefa.cancelar()
+        self._tarefas = []
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _agendar_verificacao(self):
+        if self._verificacao is None and self._root is not None:
+            self._verificacao = self._root.after(self._intervalo, self._verificar)
+
+    def _verificar(self):
+        self._verificacao = None
+        # Alterações gravadas pelas tarefas chegam às telas antes do ao_concluir de cada uma
+        eventos.entregar_pendentes()
+        # Tarefas criadas pelos callbacks abaixo entram direto na nova lista
+        tarefas, self._tarefas = self._tarefas, []
+        for tarefa in tarefas:
+            if tarefa.concluida():
+                self._entregar(tarefa)
+            else:
+                self._entregar_progresso(tarefa)
+                self._tarefas.append(tarefa)
+        if self._tarefas:
+            self._agendar_verificacao()
+
+    def _dono_ativo(self, tarefa):
+        if tarefa.dono is None:
+            return True
+        try:
+            return bool(tarefa.dono.winfo_exists())
+        except tk.TclError:
+            return False
+
+    def _entregar_progresso(self, tarefa):
+        progresso = tarefa._progresso
+        if tarefa.ao_progresso is None or progresso is None or progresso is tarefa._progresso_entregue:
+            return
+        tarefa._progresso_entregue = progresso
+        if not tarefa.cancelada and self._dono_ativo(tarefa):
+            tarefa.ao_progresso(*progresso)
+
+    def _entregar(self, tarefa):
+        if tarefa.indicador is not None:
+            tarefa.indicador.parar()
+        if tarefa.cancelada or not self._dono_ativo(tarefa):
+            return
+        self._entregar_progresso(tarefa)
+        erro = tarefa.futuro.exception()
+        if erro is not None:
+            if tarefa.ao_falhar is not None:
+                tarefa.ao_falhar(erro)
+            else:
+                print(f"Erro em tarefa de segundo plano: {erro}")
+        elif tarefa.ao_concluir is not None:
+            tarefa.ao_concluir(tarefa.futuro.result())
+
+# Indicador de "ocupado" de uma tela: barra de progresso indeterminada e cursor de espera
+# Conta as tarefas em andamento, então várias tarefas podem compartilhar o mesmo indicador
+class IndicadorOcupado:
+    def __init__(self, janela, **opcoes_pack):
+        self.janela = janela
+        self.barra = ttk.Progressbar(janela, mode="indeterminate", length=200, bootstyle="info-striped")
+        self.opcoes_pack = opcoes_pack or {"side": tk.BOTTOM, "pady": 5}
+        self.em_andamento = 0
+
+    def iniciar(self):
+        self.em_andamento += 1
+        if self.em_andamento == 1:
+            self.barra.pack(**self.opcoes_pack)
+            self.barra.start(15)
+            self.janela.config(cursor="watch")
+
+    def parar(self):
+        self.em_andamento = max(0, self.em_andamento - 1)
+        if self.em_andamento == 0:
+            try:
+                self.barra.stop()
+                self.barra.pack_forget()
+                self.janela.config(cursor="")
+            except tk.TclError:
+                pass  # tela já fechada
@@ -0,0 +1,154 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import banco
+import movimentacoes
+import servico
+from cliente import ClienteEstoque, ConflitoServico, ErroServico
+
+# Testes do serviço de estoque: um servidor de verdade em localhost (porta livre), sobre um
+# banco temporário, usado pelo cliente da interface
+class TesteServico(unittest.TestCase):
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.caminho_anterior = banco.CAMINHO_BANCO
+        banco.CAMINHO_BANCO = os.path.join(self.pasta.name, "estoque.db")
+        self.servidor = servico.criar_servidor(porta=0)
+        self.thread = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+        self.thread.start()
+        self.cliente = ClienteEstoque(f"127.0.0.1:{self.servidor.server_address[1]}")
+
+    def tearDown(self):
+        self.cliente.encerrar()
+        self.servidor.shutdown()
+        self.servidor.server_close()
+        banco.fechar_conexao()
+        banco.CAMINHO_BANCO = self.caminho_anterior
+        self.pasta.cleanup()
+
+    def test_lista_com_etag(self):
+        self.cliente.inserir_insumo("A1", "Luva", 10, None, "Armário 1", None)
+        self.cliente.inserir_insumo("B2", "Máscara", 3, "2030-01-31", None, None)
+
+        insumos = self.cliente.listar_insumos()
+        self.assertEqual([insumo.codigo for insumo in insumos], ["A1", "B2"])
+        etag = self.cliente._cache[0]
+
+        # Lista inalterada: 304, sem corpo, e o cliente devolve a cópia local
+        status, _, corpo = self.cliente._requisitar("GET", "/insumos", cabecalhos={"If-None-Match": etag})
+        self.assertEqual((status, corpo), (304, None))
+        self.assertIs(self.cliente.listar_insumos(), insumos)
+
+        # Uma alteração muda a versão e a lista é baixada de novo
+        self.cliente.atualizar_insumo(insumos[0].rowid, "A1", "Luva P", 10, None, "Armário 1", None)
+        self.assertNotEqual(self.cliente._requisitar("GET", "/insumos", cabecalhos={"If-None-Match": etag})[0], 304)
+        self.assertEqual(self.cliente.listar_insumos()[0].nome, "Luva P")
+
+    def test_guia_de_movimentacoes(self):
+        self.cliente.inserir_insumo("A1", "Luva", 10, None, None, None)
+        self.cliente.inserir_insumo("B2", "Máscara", 5, None, None, None)
+
+        resultados = self.cliente.aplicar_movimentacoes([
+            ("A1", movimentacoes.SAIDA, 4),
+            ("B2", movimentacoes.ENTRADA, 2),
+        ])
+        self.assertEqual([(resultado.aplicada, resultado.saldo) for resultado in resultados], [(True, 6), (True, 7)])
+
+        # Uma linha recusada cancela a guia inteira
+        resultados = self.cliente.aplicar_movimentacoes([
+            ("A1", movimentacoes.SAIDA, 1),
+            ("B2", movimentacoes.SAIDA, 50),
+        ])
+        self.assertFalse(any(resultado.aplicada for resultado in resultados))
+        self.assertEqual(resultados[1].motivo, movimentacoes.ESTOQUE_INSUFICIENTE)
+
+        historico = self.cliente.listar_historico()
+        self.assertEqual(sorted((mov.insumo_codigo, mov.tipo, mov.quantidade) for mov in historico),
+                         [("A1", movimentacoes.SAIDA, 4), ("B2", movimentacoes.ENTRADA, 2)])
+
+    def test_erros(self):
+        self.cliente.inserir_insumo("A1", "Luva", 10, None, None, None)
+
+        # Código repetido: 409
+        with self.assertRaises(ConflitoServico):
+            self.cliente.inserir_insumo("A1", "Outra luva", 1, None, None, None)
+
+        # Sem nome: 400
+        status, _, corpo = self.cliente._requisitar("POST", "/insumos", {"codigo": "C3", "quantidade": 1})
+        self.assertEqual(status, 400)
+        self.assertIn("erro", corpo)
+
+        # Data fora do formato ISO: 400, e a conexão continua respondendo
+        status, _, corpo = self.cliente._requisitar("GET", "/historico?fim=31/12/2024")
+        self.assertEqual(status, 400)
+        with self.assertRaises(ErroServico):
+            self.cliente.listar_historico(inicio="01/01/2024")
+        self.assertEqual(self.cliente.listar_historico(inicio="2024-01-01", fim="2024-12-31"), [])
+
+    # A conexão cai depois de o serviço gravar a guia: o cliente repete a requisição e a guia
+    # não é lançada duas vezes
+    def test_guia_repetida_apos_queda_da_conexao(self):
+        self.cliente.inserir_insumo("A1", "Luva", 10, None, None, None)
+
+        responder = servico.ManipuladorEstoque._responder
+        quedas = []
+
+        def responder_com_queda(manipulador, status, resposta, extras):
+            if manipulador.path == "/movimentacoes" and not quedas:
+                quedas.append(manipulador.path)
+                manipulador.close_connection = True  # fecha sem responder
+                return
+            responder(manipulador, status, resposta, extras)
+
+        servico.ManipuladorEstoque._responder = responder_com_queda
+        try:
+            resultados = self.cliente.aplicar_movimentacoes([("A1", movimentacoes.SAIDA, 3)])
+        finally:
+            servico.ManipuladorEstoque._responder = responder
+
+        self.assertEqual(quedas, ["/movimentacoes"])
+        self.assertEqual((resultados[0].aplicada, resultados[0].saldo), (True, 7))
+        self.assertEqual(self.cliente.listar_insumos()[0].quantidade, 7)
+        self.assertEqual(len(self.cliente.listar_historico()), 1)
+
+    # A resposta chega cortada (IncompleteRead): o cliente repete, e se cortar de novo
+    # a falha vira ErroServico, que as telas tratam
+    def test_resposta_cortada(self):
+        self.cliente.inserir_insumo("A1", "Luva", 10, None, None, None)
+
+        responder = servico.ManipuladorEstoque._responder
+        cortes = []
+
+        def responder_cortado(manipulador, status, resposta, extras):
+            if manipulador.path.startswith("/historico") and len(cortes) < limite:
+                cortes.append(manipulador.path)
+                manipulador.send_response(status)
+                manipulador.send_header("Content-Length", "1000")
+                manipulador.end_headers()
+                manipulador.wfile.write(b'{"movimentacoes": [')
+                manipulador.close_connection = True
+                return
+            responder(manipulador, status, resposta, extras)
+
+        servico.ManipuladorEstoque._responder = responder_cortado
+        try:
+            limite = 1
+            self.assertEqual(self.cliente.listar_historico(), [])
+            self.assertEqual(len(cortes), 1)
+
+            limite = 3
+            with self.assertRaises(ErroServico):
+                self.cliente.listar_historico()
+            self.assertEqual(len(cortes), 3)
+        finally:
+            servico.ManipuladorEstoque._responder = responder
+
+        self.assertEqual(self.cliente.listar_historico(), [])
+
+if __name__ == "__main__":
+    unittest.main()
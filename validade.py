@@ -0,0 +1,68 @@
+import calendar
+import re
+from datetime import datetime
+
+# Datas de validade
+# No banco a validade é guardada no formato ISO (AAAA-MM-DD), ou NULL quando indeterminada.
+# As funções abaixo convertem os formatos encontrados na planilha e nos formulários.
+
+# Formatos de data completa aceitos, na ordem em que são testados
+FORMATOS_VALIDADE = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y"]
+
+# Validades só com mês e ano ("02/26", "nov/31") valem até o último dia do mês
+PADRAO_MES_ANO = re.compile(r"^(\d{1,2}|[a-zç]{3})/(\d{2}|\d{4})$")
+MESES = {
+    "jan": 1, "fev": 2, "mar": 3, "abr": 4, "mai": 5, "jun": 6,
+    "jul": 7, "ago": 8, "set": 9, "out": 10, "nov": 11, "dez": 12,
+}
+
+# Formato exibido nas telas e pedido nos formulários
+FORMATO_EXIBICAO = "%d/%m/%Y"
+TEXTO_INDETERMINADO = "INDETERMINADO"
+
+# Função para converter uma validade "mês/ano" no último dia do mês
+def ultimo_dia_do_mes(mes, ano):
+    if ano < 100:
+        ano += 2000
+    return datetime(ano, mes, calendar.monthrange(ano, mes)[1]).date()
+
+# Função para converter uma validade em qualquer formato conhecido para ISO (ou None)
+def normalizar_validade(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    texto = str(valor).strip()
+    for formato in FORMATOS_VALIDADE:
+        try:
+            return datetime.strptime(texto, formato).date().isoformat()
+        except ValueError:
+            pass
+    correspondencia = PADRAO_MES_ANO.match(texto.lower())
+    if correspondencia:
+        mes, ano = correspondencia.groups()
+        mes = MESES.get(mes) if not mes.isdigit() else int(mes)
+        if mes and 1 <= mes <= 12:
+            return ultimo_dia_do_mes(mes, int(ano)).isoformat()
+    # "INDETERMINADO", "X", vazio ou texto não reconhecido
+    return None
+
+# Função para exibir uma validade ISO como DD/MM/AAAA
+def formatar_validade(iso):
+    if not iso:
+        return TEXTO_INDETERMINADO
+    return datetime.strptime(iso, "%Y-%m-%d").strftime(FORMATO_EXIBICAO)
+
+# Função para converter uma data digitada num formulário (DD/MM/AAAA) para ISO, ou None se vazia
+# Lança ValueError se a data for inválida
+def data_do_formulario(texto):
+    texto = texto.strip()
+    if not texto:
+        return None
+    return datetime.strptime(texto, FORMATO_EXIBICAO).date().isoformat()
+
+# Função para converter a validade digitada num formulário (DD/MM/AAAA, vazio ou INDETERMINADO)
+def validade_do_formulario(texto):
+    if texto.strip().upper() == TEXTO_INDETERMINADO:
+        return None
+    return data_do_formulario(texto)